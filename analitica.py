@@ -0,0 +1,154 @@
+# ======================================================
+# analitica.py — velocidad de venta y punto de reposición 🇨🇱
+# La base agrupa las ventas de la ventana por producto; los totales llegan
+# como arreglos NumPy (uno por columna) y todos los productos se calculan
+# de una sola pasada vectorizada.
+# ======================================================
+from datetime import date
+
+import numpy as np
+from sqlalchemy import func, insert, select
+
+from extensions import db
+from helpers import dia_local
+from modelos import HistorialInventario, InventarioArchivado, Producto, VentaDiaria, ReposicionProducto
+from tiempo import hora_actual, local_date
+
+VENTANA_DIAS = 28        # Días de historia para la media móvil
+PLAZO_REPOSICION = 7     # Días que tarda en llegar un pedido
+DIAS_OBJETIVO = 14       # Días de venta que debe cubrir cada pedido
+Z_SERVICIO = 1.65        # ~95 % de probabilidad de no quedar sin stock durante el plazo
+
+
+# ======================================================
+# 📥 CARGA COLUMNAR
+# ======================================================
+def _columnas(stmt, tipos):
+    """Ejecuta un SELECT y devuelve un arreglo NumPy por columna."""
+    filas = db.session.execute(stmt).all()
+    n = len(filas)
+    return [
+        np.fromiter((f[i] for f in filas), dtype=tipo, count=n)
+        for i, tipo in enumerate(tipos)
+    ]
+
+
+def _alta(ids, hoy: date):
+    """
+    Día (ordinal) en que cada producto empezó a moverse: su primera venta o
+    su primera entrada de inventario, lo que ocurra antes. Producto.fecha no
+    sirve: el cambio de día la pone en hoy para todos. Con entradas ya
+    archivadas el producto es anterior a cualquier ventana.
+    """
+    alta = np.full(len(ids), hoy.toordinal(), dtype=np.int64)
+    primeras = [
+        select(VentaDiaria.producto_id, func.min(VentaDiaria.dia)).group_by(VentaDiaria.producto_id),
+        select(HistorialInventario.producto_id, func.min(dia_local(HistorialInventario.fecha)))
+        .where(HistorialInventario.fecha.isnot(None))
+        .group_by(HistorialInventario.producto_id),
+    ]
+    for stmt in primeras:
+        pid, dia = _columnas(stmt, (np.int64, object))
+        dia = np.fromiter((d.toordinal() for d in dia), dtype=np.int64, count=len(dia))
+        fila = np.searchsorted(ids, pid)
+        valido = fila < len(ids)
+        valido[valido] = ids[fila[valido]] == pid[valido]
+        np.minimum.at(alta, fila[valido], dia[valido])
+    (archivados,) = _columnas(select(InventarioArchivado.producto_id), (np.int64,))
+    alta[np.isin(ids, archivados)] = 1
+    return alta
+
+
+def _productos(hoy: date):
+    """ids (ordenados), stock y día de alta (ordinal) de todos los productos."""
+    ids, stock = _columnas(
+        select(Producto.id, Producto.unidades_restantes).order_by(Producto.id),
+        (np.int64, object),
+    )
+    stock = np.fromiter((s or 0 for s in stock), dtype=np.int64, count=len(stock))
+    return ids, stock, _alta(ids, hoy)
+
+
+# ======================================================
+# 🧮 CÁLCULO VECTORIZADO
+# ======================================================
+def calcular_reposicion(hoy: date = None, ventana: int = VENTANA_DIAS, plazo: int = PLAZO_REPOSICION,
+                        objetivo: int = DIAS_OBJETIVO) -> int:
+    """
+    Recalcula reposicion_producto para todos los productos y hace commit.
+    Lee de venta_diaria solo la ventana pedida, ya agrupada por producto.
+    Devuelve cuántos productos se analizaron.
+    """
+    hoy = hoy or local_date()
+    desde = date.fromordinal(hoy.toordinal() - ventana + 1)
+
+    ids, stock, alta = _productos(hoy)
+    n = len(ids)
+
+    # 📊 Suma y suma de cuadrados por producto en la base: viajan n filas, no n × días
+    pid, suma, suma_cuadrados = _columnas(
+        select(
+            VentaDiaria.producto_id,
+            func.sum(VentaDiaria.unidades),
+            func.sum(VentaDiaria.unidades * VentaDiaria.unidades),
+        )
+        .where(VentaDiaria.dia >= desde, VentaDiaria.dia <= hoy)
+        .group_by(VentaDiaria.producto_id),
+        (np.int64, np.float64, np.float64),
+    )
+    totales = np.zeros(n)
+    cuadrados = np.zeros(n)
+    fila = np.searchsorted(ids, pid)
+    valido = fila < n
+    valido[valido] = ids[fila[valido]] == pid[valido]
+    totales[fila[valido]] = suma[valido]
+    cuadrados[fila[valido]] = suma_cuadrados[valido]
+
+    # 🆕 Los productos nuevos solo promedian desde su primera venta o entrada
+    # (los días sin fila en venta_diaria cuentan como cero ventas)
+    dias_activos = np.clip(hoy.toordinal() - alta + 1, 1, ventana)
+    velocidad = totales / dias_activos
+    desviacion = np.sqrt(np.maximum(cuadrados / dias_activos - velocidad ** 2, 0.0))
+
+    punto_reorden = np.ceil(velocidad * plazo + Z_SERVICIO * desviacion * np.sqrt(plazo))
+    vende = velocidad > 0
+    cobertura = np.divide(np.maximum(stock, 0), velocidad, out=np.full(n, np.nan), where=vende)
+    sugerido = np.where(vende, np.maximum(np.ceil(punto_reorden + velocidad * objetivo - stock), 0), 0)
+
+    # 💾 Reemplazar el análisis anterior
+    ahora = hora_actual()
+    db.session.query(ReposicionProducto).delete()
+    if n:
+        db.session.execute(insert(ReposicionProducto), [
+            {
+                "producto_id": int(i),
+                "velocidad": round(float(v), 3),
+                "dias_cobertura": None if np.isnan(c) else round(float(c), 1),
+                "punto_reorden": int(p),
+                "sugerido": int(s),
+                "calculado": ahora,
+            }
+            for i, v, c, p, s in zip(ids, velocidad, cobertura, punto_reorden, sugerido)
+        ])
+    db.session.commit()
+    return n
+
+
+# ======================================================
+# 📖 LECTURAS (índice y panel)
+# ======================================================
+def reposicion_por_producto() -> dict:
+    """{producto_id: ReposicionProducto} del último análisis (una consulta)."""
+    return {r.producto_id: r for r in ReposicionProducto.query}
+
+
+def productos_por_reponer(limite: int = 10) -> list:
+    """Productos con reposición sugerida, los que se agotan antes primero."""
+    return (
+        db.session.query(Producto, ReposicionProducto)
+        .join(ReposicionProducto, ReposicionProducto.producto_id == Producto.id)
+        .filter(ReposicionProducto.sugerido > 0)
+        .order_by(ReposicionProducto.dias_cobertura.asc(), Producto.id)
+        .limit(limite)
+        .all()
+    )
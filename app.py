@@ -7,6 +7,7 @@ import os
 import time
 from flask import Flask
 from flask_migrate import Migrate
+from sqlalchemy import event
 from sqlalchemy.exc import OperationalError
 from extensions import db  # ✅ instancia global de SQLAlchemy
 from tiempo import hora_actual, to_hora_chile as hora_chile  # ✅ módulo de hora
@@ -52,6 +53,22 @@ app.config["VALID_PASS"] = "198409"
 db.init_app(app)
 migrate = Migrate(app, db)
 
+# 🔒 SQLite local: cada transacción toma el bloqueo de escritura al empezar
+#    (BEGIN IMMEDIATE) y espera hasta 30 s si otro request lo tiene. Sin esto,
+#    dos requests que leen y luego escriben chocan al subir el bloqueo y uno
+#    falla al instante con "database is locked".
+if DATABASE_URL.startswith("sqlite"):
+    with app.app_context():
+        @event.listens_for(db.engine, "connect")
+        def _sqlite_connect(conexion, _registro):
+            conexion.isolation_level = None  # El BEGIN lo emite el evento de abajo
+            conexion.execute("PRAGMA busy_timeout = 30000")
+
+        @event.listens_for(db.engine, "begin")
+        def _sqlite_begin(conexion):
+            # Directo al driver, como el BEGIN implícito de psycopg2: no cuenta como consulta
+            conexion.connection.driver_connection.execute("BEGIN IMMEDIATE")
+
 # ======================================================
 # 📦 Modelos y rutas
 # ======================================================
@@ -62,6 +79,18 @@ app.register_blueprint(app_rutas)
 # Asegurar que el blueprint herede la configuración
 app_rutas.config = app.config
 
+# ======================================================
+# 🧰 Comandos de consola (flask <comando>)
+# ======================================================
+from comandos import registrar_comandos
+registrar_comandos(app)
+
+# ======================================================
+# 📏 Consultas SQL por request (log y cabeceras de depuración)
+# ======================================================
+from instrumentacion import registrar_instrumentacion
+registrar_instrumentacion(app)
+
 # ======================================================
 # 🚫 Manejador de error 404
 # ======================================================
@@ -83,6 +112,18 @@ with app.app_context():
             print(f"⚠️ Intento {i+1} fallido al conectar con Neon: {e}")
             time.sleep(5)
 
+# ======================================================
+# ⚡ Índices en memoria: códigos y búsqueda (cada worker los carga al arrancar)
+# ======================================================
+from indice_codigos import cargar_indice_codigos
+from busqueda import cargar_indice_busqueda
+with app.app_context():
+    try:
+        cargar_indice_codigos()
+        cargar_indice_busqueda()
+    except OperationalError as e:
+        print(f"⚠️ Índices en memoria no cargados (se cargarán en el primer uso): {e}")
+
 # ======================================================
 # ▶️ Punto de entrada
 # ======================================================
@@ -0,0 +1,124 @@
+# ======================================================
+# benchmark_conciliacion.py — Conciliación de stock 🇨🇱
+# Uso: python benchmark_conciliacion.py   (usa una base SQLite temporal)
+# Carga un millón de ventas y el historial de miles de productos con sus
+# contadores al día, descuadra algunos a propósito y comprueba que
+# conciliar_stock() encuentre exactamente esos y los corrija.
+# ======================================================
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# ⚠️ Nunca apuntar a Neon: se fuerza una base local desechable
+_tmp = tempfile.mkdtemp(prefix="aitana_conc_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'conciliacion.db')}"
+
+from app import app, db
+from conciliacion import conciliar_stock
+from modelos import HistorialInventario, InventarioArchivado, Producto, Venta
+from tiempo import local_date
+
+PRODUCTOS = 5000
+VENTAS = 1_000_000
+DIAS = 365
+
+print("===============================================")
+print("   🧾 BENCHMARK DE CONCILIACIÓN DE STOCK")
+print("===============================================")
+
+hoy = local_date()
+inicio = datetime.combine(hoy - timedelta(days=DIAS - 1), datetime.min.time()).replace(hour=10)
+
+with app.app_context():
+    # 🕒 Historial: 40 entradas de 50 unidades por producto; las 10 primeras ya archivadas
+    historial, archivado = [], []
+    for pid in range(1, PRODUCTOS + 1):
+        archivado.append({"producto_id": pid, "cantidad": 500, "valor_total": 500 * 1000})
+        for n in range(30):
+            historial.append({"producto_id": pid, "cantidad": 50, "valor_total": 50 * 1000,
+                              "fecha": inicio + timedelta(days=n * 12)})
+
+    # 💵 Ventas repartidas hasta ayer; las últimas 1000 (productos 1-1000) son de hoy
+    ventas, vendidas, hoy_u, hoy_v = [], [0] * (PRODUCTOS + 1), [0] * (PRODUCTOS + 1), [0.0] * (PRODUCTOS + 1)
+    for n in range(VENTAS):
+        pid = n % PRODUCTOS + 1
+        cantidad = n % 3 + 1
+        fecha = inicio + timedelta(days=(n * (DIAS - 1)) // VENTAS, minutes=n % 600)
+        if n >= VENTAS - 1000:
+            fecha = datetime.combine(hoy, datetime.min.time()).replace(hour=9, minute=n % 60)
+            hoy_u[pid] += cantidad
+            hoy_v[pid] += cantidad * 1200
+        vendidas[pid] += cantidad
+        ventas.append({"producto_id": pid, "cantidad": cantidad, "ingreso": cantidad * 1200, "fecha": fecha})
+
+    productos = [{
+        "codigo": f"C{pid:05d}", "nombre": f"CONCILIA {pid}", "valor_unitario": 1000, "interes": 20,
+        "stock_inicial": 2000, "unidades_restantes": 2000 - vendidas[pid],
+        "vendidas_dia": hoy_u[pid], "valor_vendido_dia": hoy_v[pid], "fecha": hoy,
+    } for pid in range(1, PRODUCTOS + 1)]
+
+    # 🎯 Descuadres conocidos
+    productos[0]["unidades_restantes"] += 3          # Stock de más
+    productos[1]["vendidas_dia"] += 2                # Contador del día inflado
+    productos[2]["valor_vendido_dia"] -= 1200        # Valor del día de menos
+    productos[3]["stock_inicial"] -= 50              # Entrada no sumada
+    historial = [h for h in historial if h["producto_id"] != 5]   # Vendió sin entradas → revisar
+    archivado = [a for a in archivado if a["producto_id"] != 5]
+    historial = [h for h in historial if h["producto_id"] != 6]   # Con stock y sin libro ni ventas → revisar
+    archivado = [a for a in archivado if a["producto_id"] != 6]
+    ventas = [v for v in ventas if v["producto_id"] != 6]
+    productos[5]["unidades_restantes"], productos[5]["vendidas_dia"], productos[5]["valor_vendido_dia"] = 2000, 0, 0
+    descuadrados = {1, 2, 3, 4, 5, 6}
+
+    db.session.execute(Producto.__table__.insert(), productos)
+    db.session.execute(HistorialInventario.__table__.insert(), historial)
+    db.session.execute(InventarioArchivado.__table__.insert(), archivado)
+    db.session.execute(Venta.__table__.insert(), ventas)
+    db.session.commit()
+    print(f"\n  📦 {PRODUCTOS} productos, {len(ventas)} ventas, {len(historial)} entradas de historial")
+
+    fallos = 0
+
+    t0 = time.perf_counter()
+    resultado = conciliar_stock()
+    seg = time.perf_counter() - t0
+    encontrados = {d["producto_id"] for d in resultado["diferencias"]}
+    ok = encontrados == descuadrados
+    fallos += 0 if ok else 1
+    print(f"  {'✅' if ok else '❌'} Conciliación en {seg:.2f}s → {len(encontrados)} productos con diferencias")
+    db.session.rollback()
+
+    t0 = time.perf_counter()
+    resultado = conciliar_stock(corregir=True)
+    db.session.commit()
+    seg = time.perf_counter() - t0
+    print(f"  ⏱️ Conciliación con corrección en {seg:.2f}s → {resultado['corregidos']} productos corregidos")
+
+    r = {p.id: p for p in Producto.query.filter(Producto.id <= 6)}
+    restantes = conciliar_stock()["diferencias"]
+    casos = [
+        ("Stock de más corregido", r[1].unidades_restantes == 2000 - vendidas[1]),
+        ("Contador del día corregido", r[2].vendidas_dia == hoy_u[2]),
+        ("Valor del día corregido", abs(r[3].valor_vendido_dia - hoy_v[3]) < 0.005),
+        ("Entrada faltante sumada a stock_inicial", r[4].stock_inicial == 2000),
+        ("Stock esperado negativo: se informa y no se toca",
+         r[5].stock_inicial == 2000 and r[5].unidades_restantes == 2000 - vendidas[5]),
+        ("Sin libro de entradas: se informa y no se deja en cero",
+         r[6].stock_inicial == 2000 and r[6].unidades_restantes == 2000),
+        ("Solo quedan los productos a revisar",
+         [d["producto_id"] for d in restantes] == [5, 6] and all(d["revisar"] for d in restantes)),
+    ]
+    print()
+    for nombre, ok in casos:
+        fallos += 0 if ok else 1
+        print(f"  {'✅' if ok else '❌'} {nombre}")
+
+print("===============================================")
+if fallos:
+    print(f"  ❌ Benchmark con {fallos} fallo(s).")
+    print("===============================================")
+    sys.exit(1)
+print("  ✅ Conciliación correcta.")
+print("===============================================")
@@ -0,0 +1,118 @@
+# ======================================================
+# benchmark_liquidacion.py — Consultas de la liquidación por rango 🇨🇱
+# Uso: python benchmark_liquidacion.py   (usa una base SQLite temporal)
+# Comprueba que el número de consultas no crece con el largo del rango.
+# ======================================================
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# ⚠️ Nunca apuntar a Neon: se fuerza una base local desechable
+_tmp = tempfile.mkdtemp(prefix="aitana_liq_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'liquidacion.db')}"
+
+from sqlalchemy import event, func
+
+from app import app, db
+from helpers import liquidacion_por_rango, reconstruir_caja
+from modelos import Producto, Venta, MovimientoCaja, LiquidacionProducto
+from tiempo import CHILE_TZ, local_date
+
+DIAS = 365
+RANGOS = (1, 7, 30, 90, 365)
+
+print("===============================================")
+print("   📊 BENCHMARK DE LIQUIDACIÓN POR RANGO")
+print("===============================================")
+
+sentencias = []
+
+
+def _registrar(conn, cursor, statement, parameters, context, executemany):
+    sentencias.append(statement)
+
+
+hoy = local_date()
+inicio_datos = hoy - timedelta(days=DIAS - 1)
+
+cliente = app.test_client()
+with cliente.session_transaction() as sesion:
+    sesion["usuario"] = app.config["VALID_USER"]
+cliente.get("/")  # Calentamiento: el primer request del día hace el cambio de día
+
+with app.app_context():
+    producto = Producto(
+        codigo="L00001", nombre="LIQ 1", valor_unitario=1000, interes=20,
+        stock_inicial=100000, unidades_restantes=100000, fecha=hoy,
+    )
+    db.session.add(producto)
+    db.session.flush()
+
+    # Caja de apertura el día antes del primer dato
+    db.session.add(LiquidacionProducto(
+        fecha=inicio_datos - timedelta(days=1), caja_anterior=5000, ventas_dia=0,
+        entradas=0, salidas=0, caja_dia=5000, caja_total=5000, inventario_total=0,
+    ))
+
+    ventas, movimientos = [], []
+    for n in range(DIAS):
+        dia = inicio_datos + timedelta(days=n)
+        for h in (9, 13, 18):
+            ventas.append({
+                "producto_id": producto.id, "cantidad": 1, "ingreso": 1200.0,
+                "fecha": datetime(dia.year, dia.month, dia.day, h, tzinfo=CHILE_TZ),
+            })
+        movimientos.append({"tipo": "entrada", "monto": 300.0, "descripcion": "bench",
+                            "fecha": datetime(dia.year, dia.month, dia.day, 10, tzinfo=CHILE_TZ)})
+        movimientos.append({"tipo": "salida", "monto": 100.0, "descripcion": "bench",
+                            "fecha": datetime(dia.year, dia.month, dia.day, 20, tzinfo=CHILE_TZ)})
+    db.session.execute(Venta.__table__.insert(), ventas)
+    db.session.execute(MovimientoCaja.__table__.insert(), movimientos)
+    db.session.commit()
+    reconstruir_caja()  # Los datos se cargaron directo: se arma el libro de caja
+
+    conteos, fallos = {}, 0
+    print()
+    for dias in RANGOS:
+        fi = hoy - timedelta(days=dias - 1)
+        sentencias.clear()
+        event.listen(db.engine, "before_cursor_execute", _registrar)
+        t0 = time.perf_counter()
+        try:
+            r = cliente.post("/liquidacion", data={"fecha_inicio": fi.isoformat(), "fecha_fin": hoy.isoformat()})
+        finally:
+            event.remove(db.engine, "before_cursor_execute", _registrar)
+        ms = (time.perf_counter() - t0) * 1000
+        conteos[dias] = len(sentencias)
+        ok = r.status_code == 200
+        fallos += 0 if ok else 1
+        print(f"  {'✅' if ok else '❌'} {dias:>3} días → HTTP {r.status_code} | "
+              f"{len(sentencias)} consultas | {ms:.1f} ms")
+
+    # La caja del último día debe ser la caja inicial + todo lo movido en el año
+    filas = liquidacion_por_rango(inicio_datos, hoy)
+    esperado = 5000 + DIAS * (3 * 1200.0 + 300.0 - 100.0)
+    ok = abs(filas[-1]["caja_dia"] - esperado) < 0.01 and len(filas) == DIAS
+    fallos += 0 if ok else 1
+    print(f"\n  {'✅' if ok else '❌'} Caja encadenada: {filas[-1]['caja_dia']:.2f} (esperada {esperado:.2f})")
+
+    total = db.session.query(func.sum(Venta.ingreso)).scalar()
+    ok = abs(sum(f["ventas_dia"] for f in filas) - total) < 0.01
+    fallos += 0 if ok else 1
+    print(f"  {'✅' if ok else '❌'} Ventas del rango = suma de Venta ({total:.2f})")
+
+    if len(set(conteos.values())) != 1:
+        fallos += 1
+        print(f"  ❌ El número de consultas depende del rango: {conteos}")
+    else:
+        print(f"  ✅ Mismo número de consultas para todos los rangos ({conteos[RANGOS[0]]}).")
+
+print("===============================================")
+if fallos:
+    print(f"  ❌ Benchmark con {fallos} fallo(s).")
+    print("===============================================")
+    sys.exit(1)
+print("  ✅ Liquidación por rango con consultas constantes.")
+print("===============================================")
@@ -0,0 +1,90 @@
+# ======================================================
+# benchmark_reposicion.py — Análisis de velocidad y reposición 🇨🇱
+# Uso: python benchmark_reposicion.py   (usa una base SQLite temporal)
+# Carga un año de ventas diarias de miles de productos, mide
+# calcular_reposicion() y comprueba el resultado contra casos conocidos.
+# ======================================================
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# ⚠️ Nunca apuntar a Neon: se fuerza una base local desechable
+_tmp = tempfile.mkdtemp(prefix="aitana_repo_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'reposicion.db')}"
+
+from app import app, db
+from analitica import calcular_reposicion
+from modelos import HistorialInventario, Producto, VentaDiaria, ReposicionProducto
+from tiempo import local_date
+
+PRODUCTOS = 3000
+DIAS = 365
+
+print("===============================================")
+print("   🔁 BENCHMARK DE REPOSICIÓN SUGERIDA")
+print("===============================================")
+
+hoy = local_date()
+inicio = hoy - timedelta(days=DIAS - 1)
+
+with app.app_context():
+    # Producto 1: 4 unidades todos los días y 10 en stock → cobertura 2.5 días
+    # Producto 2: sin ventas → no se sugiere reponer
+    # Producto 3: primera entrada hace 7 días, 7 unidades diarias → velocidad 7 (no 7·7/365)
+    # Todos con fecha = hoy, como los deja el cambio de día
+    productos = [{
+        "codigo": f"R{i:05d}", "nombre": f"REPO {i}", "valor_unitario": 1000, "interes": 20,
+        "stock_inicial": 500, "unidades_restantes": 500, "fecha": hoy,
+    } for i in range(1, PRODUCTOS + 1)]
+    productos[0]["unidades_restantes"] = 10
+    db.session.execute(Producto.__table__.insert(), productos)
+    db.session.execute(HistorialInventario.__table__.insert(), [{
+        "producto_id": pid, "cantidad": 500, "valor_total": 500 * 1000,
+        "fecha": datetime.combine(hoy - timedelta(days=6) if pid == 3 else inicio, datetime.min.time()).replace(hour=9),
+    } for pid in range(1, PRODUCTOS + 1)])
+
+    filas = []
+    for pid in range(1, PRODUCTOS + 1):
+        if pid == 2:
+            continue
+        for n in range(DIAS):
+            dia = inicio + timedelta(days=n)
+            if pid == 3 and dia < hoy - timedelta(days=6):
+                continue
+            unidades = 4 if pid == 1 else 7 if pid == 3 else (pid + n) % 5
+            filas.append({"producto_id": pid, "dia": dia, "unidades": unidades, "ingreso": unidades * 1200})
+    db.session.execute(VentaDiaria.__table__.insert(), filas)
+    db.session.commit()
+    print(f"\n  📦 {PRODUCTOS} productos, {len(filas)} filas de venta_diaria ({DIAS} días)")
+
+    fallos = 0
+    for ventana in (28, DIAS):
+        t0 = time.perf_counter()
+        n = calcular_reposicion(hoy, ventana=ventana)
+        seg = time.perf_counter() - t0
+        ok = n == PRODUCTOS
+        fallos += 0 if ok else 1
+        print(f"  {'✅' if ok else '❌'} Ventana {ventana:>3} días → {n} productos en {seg:.2f}s")
+
+    r = {x.producto_id: x for x in ReposicionProducto.query.filter(ReposicionProducto.producto_id <= 3)}
+    casos = [
+        ("Velocidad constante", r[1].velocidad == 4 and r[1].dias_cobertura == 2.5),
+        ("Punto de reorden sin variación = velocidad × plazo", r[1].punto_reorden == 28),
+        ("Pedido sugerido = reorden + 14 días − stock", r[1].sugerido == 28 + 56 - 10),
+        ("Sin ventas no se repone", r[2].velocidad == 0 and r[2].dias_cobertura is None and r[2].sugerido == 0),
+        ("Producto nuevo promedia solo sus días", abs(r[3].velocidad - 7) < 1e-9),
+    ]
+    print()
+    for nombre, ok in casos:
+        fallos += 0 if ok else 1
+        print(f"  {'✅' if ok else '❌'} {nombre}")
+
+print("===============================================")
+if fallos:
+    print(f"  ❌ Benchmark con {fallos} fallo(s).")
+    print("===============================================")
+    sys.exit(1)
+print("  ✅ Reposición calculada correctamente.")
+print("===============================================")
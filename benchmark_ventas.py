@@ -0,0 +1,134 @@
+# ======================================================
+# benchmark_ventas.py — Ventas concurrentes contra una base local 🇨🇱
+# Uso:
+#   python benchmark_ventas.py                      (SQLite temporal)
+#   BENCH_DATABASE_URL=postgresql://... python benchmark_ventas.py   (⚠️ la base se vacía)
+#   python benchmark_ventas.py --hilos 8 --ventas 2000 --stock 1500
+# ======================================================
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+parser = argparse.ArgumentParser(description="Benchmark de /vender con varios clientes a la vez")
+parser.add_argument("--hilos", type=int, default=8, help="Clientes simultáneos")
+parser.add_argument("--ventas", type=int, default=2000, help="Intentos de venta en total")
+parser.add_argument("--productos", type=int, default=5, help="Productos entre los que se reparten")
+parser.add_argument("--stock", type=int, default=300, help="Stock inicial de cada producto")
+args = parser.parse_args()
+
+# ⚠️ Nunca apuntar a Neon: base local (o la indicada en BENCH_DATABASE_URL)
+_tmp = tempfile.mkdtemp(prefix="aitana_bench_")
+os.environ["DATABASE_URL"] = os.environ.get(
+    "BENCH_DATABASE_URL", f"sqlite:///{os.path.join(_tmp, 'benchmark.db')}"
+)
+
+from sqlalchemy import func
+
+from app import app, db
+from modelos import Producto, Venta, VentaDiaria, Liquidacion, LiquidacionProducto
+from tiempo import local_date
+
+print("===============================================")
+print("     🏁 BENCHMARK DE VENTAS CONCURRENTES")
+print("===============================================")
+
+with app.app_context():
+    print(f"  Base: {db.engine.url.render_as_string(hide_password=True)}")
+    db.drop_all()
+    db.create_all()
+    for i in range(args.productos):
+        db.session.add(Producto(
+            codigo=f"B{i:05d}",
+            nombre=f"BENCH {i}",
+            valor_unitario=1000,
+            interes=19,
+            stock_inicial=args.stock,
+            unidades_restantes=args.stock,
+            fecha=local_date(),
+        ))
+    db.session.commit()
+    ids = [p.id for p in Producto.query.order_by(Producto.id)]
+
+
+def _cliente():
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion["usuario"] = app.config["VALID_USER"]
+    return cliente
+
+
+def _trabajo(n_hilo):
+    cliente = _cliente()
+    vendidas, rechazadas, errores = {}, 0, 0
+    for k in range(n_hilo, args.ventas, args.hilos):
+        pid = ids[k % len(ids)]
+        cantidad = 1 + k % 3
+        r = cliente.post(f"/vender/{pid}", json={"cantidad": cantidad})
+        data = r.get_json(silent=True) or {}
+        if data.get("success"):
+            vendidas[pid] = vendidas.get(pid, 0) + cantidad
+        elif r.status_code == 400:
+            rechazadas += 1
+        else:
+            errores += 1
+    return vendidas, rechazadas, errores
+
+
+_cliente().get("/")  # Calentamiento (cambio de día y conexiones)
+
+inicio = time.perf_counter()
+with ThreadPoolExecutor(max_workers=args.hilos) as pool:
+    resultados = list(pool.map(_trabajo, range(args.hilos)))
+duracion = time.perf_counter() - inicio
+
+vendidas = {pid: 0 for pid in ids}
+rechazadas = errores = 0
+for v, r, e in resultados:
+    for pid, cant in v.items():
+        vendidas[pid] += cant
+    rechazadas += r
+    errores += e
+
+aceptadas = args.ventas - rechazadas - errores
+print(f"\n  🧵 Hilos: {args.hilos} | Intentos: {args.ventas} | Duración: {duracion:.2f}s")
+print(f"  🛒 Ventas aceptadas: {aceptadas} | Sin stock: {rechazadas} | Errores: {errores}")
+print(f"  ⚡ {aceptadas / duracion:.1f} ventas/s ({args.ventas / duracion:.1f} intentos/s)")
+
+fallos = errores
+with app.app_context():
+    hoy = local_date()
+    print("\n  📦 Stock final por producto:")
+    for p in Producto.query.order_by(Producto.id):
+        esperado = args.stock - vendidas[p.id]
+        en_ventas = db.session.query(func.coalesce(func.sum(Venta.cantidad), 0)) \
+            .filter(Venta.producto_id == p.id).scalar()
+        diario = db.session.query(VentaDiaria.unidades).filter_by(producto_id=p.id, dia=hoy).scalar() or 0
+        ok = p.unidades_restantes == esperado == args.stock - en_ventas and diario == en_ventas \
+            and p.unidades_restantes >= 0
+        fallos += 0 if ok else 1
+        print(f"   {'✅' if ok else '❌'} {p.nombre}: stock {p.unidades_restantes} "
+              f"(esperado {esperado}) | ventas {en_ventas} | contador día {diario}")
+
+    total_ventas = db.session.query(func.coalesce(func.sum(Venta.ingreso), 0)).scalar()
+    liq = Liquidacion.query.filter_by(fecha=hoy).first()
+    ok = liq is not None and abs((liq.entrada or 0) - total_ventas) < 0.01
+    fallos += 0 if ok else 1
+    print(f"   {'✅' if ok else '❌'} Liquidación del día: entrada {liq.entrada if liq else 0:.2f} "
+          f"| suma de ventas {total_ventas:.2f}")
+
+    caja = LiquidacionProducto.query.filter_by(fecha=hoy).first()
+    ok = caja is not None and abs((caja.ventas_dia or 0) - total_ventas) < 0.01 \
+        and abs((caja.caja_dia or 0) - (caja.caja_anterior or 0) - total_ventas) < 0.01
+    fallos += 0 if ok else 1
+    print(f"   {'✅' if ok else '❌'} Libro de caja: ventas {caja.ventas_dia if caja else 0:.2f} "
+          f"| caja del día {caja.caja_dia if caja else 0:.2f}")
+
+print("===============================================")
+if fallos:
+    print(f"  ❌ Benchmark con {fallos} inconsistencia(s).")
+    print("===============================================")
+    raise SystemExit(1)
+print("  ✅ Stock y totales consistentes.")
+print("===============================================")
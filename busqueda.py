@@ -0,0 +1,241 @@
+# ======================================================
+# busqueda.py — índice en memoria para buscar productos 🇨🇱
+# Cada worker lo arma al arrancar (una consulta) y lo mantiene al día con
+# los productos que crea o edita. Cada escritura de productos suma a
+# una versión en EstadoSistema; mientras haya búsquedas, un hilo revisa esa
+# versión cada REVISION_BUSQUEDA segundos y recarga solo si otro worker
+# cambió algo. Buscar no toca la base ni espera una recarga.
+# ======================================================
+import itertools
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from threading import Lock, Thread
+
+from flask import current_app
+
+from extensions import db
+from helpers import sumar_en
+from modelos import EstadoSistema, Producto
+
+MIN_BUSQUEDA = 2          # Caracteres mínimos para sugerir
+LIMITE_SUGERENCIAS = 10
+REVISION_BUSQUEDA = 30   # Segundos entre revisiones de la versión (solo si hay búsquedas)
+CLAVE_VERSION = "productos_version"
+MAX_CRUCE = 1000          # Candidatos hasta los que conviene cruzar conjuntos y ordenar
+MAX_RECORRIDO = 5000      # Productos que se recorren en orden alfabético antes de cruzar
+
+_VACIO = frozenset()
+
+
+def normalizar(texto) -> str:
+    """Minúsculas y sin tildes: 'Jabón' y 'JABON' buscan lo mismo."""
+    texto = unicodedata.normalize("NFKD", str(texto or "").lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+class _Indice:
+    """
+    Trigramas de cada palabra (para términos de 3+ letras) y prefijos de 1 y
+    2 letras (para lo que se alcanza a escribir antes); el código cuenta como
+    una palabra más. Las listas ordenadas dan los que empiezan por el texto
+    y el orden alfabético sin tener que ordenar en cada búsqueda.
+    """
+
+    def __init__(self):
+        self.productos = {}   # id → (codigo, nombre, codigo normalizado, nombre normalizado)
+        self.por_codigo = {}  # código normalizado → id
+        self.codigos = []     # [(código normalizado, id)] ordenada
+        self.nombres = []     # [(nombre normalizado, id)] ordenada
+        self.trigramas = {}   # trigrama → {ids}
+        self.prefijos = {}    # primeras 1-2 letras de una palabra → {ids}
+
+    @staticmethod
+    def _claves(codigo_n, nombre_n):
+        palabras = [codigo_n, *nombre_n.split()]
+        trigramas = {p[i:i + 3] for p in palabras for i in range(len(p) - 2)}
+        prefijos = {p[:n] for p in palabras if p for n in (1, 2)}
+        return trigramas, prefijos
+
+    def agregar(self, pid, codigo, nombre, ordenar=True):
+        """Con ordenar=False (carga completa) las listas se ordenan después con ordenar_listas()."""
+        self.quitar(pid)
+        codigo, nombre = str(codigo or ""), str(nombre or "")
+        codigo_n, nombre_n = normalizar(codigo), normalizar(nombre)
+        self.productos[pid] = (codigo, nombre, codigo_n, nombre_n)
+        self.por_codigo[codigo_n] = pid
+        if ordenar:
+            insort(self.codigos, (codigo_n, pid))
+            insort(self.nombres, (nombre_n, pid))
+        else:
+            self.codigos.append((codigo_n, pid))
+            self.nombres.append((nombre_n, pid))
+
+        trigramas, prefijos = self._claves(codigo_n, nombre_n)
+        for t in trigramas:
+            self.trigramas.setdefault(t, set()).add(pid)
+        for p in prefijos:
+            self.prefijos.setdefault(p, set()).add(pid)
+
+    def ordenar_listas(self):
+        self.codigos.sort()
+        self.nombres.sort()
+
+    def quitar(self, pid):
+        anterior = self.productos.pop(pid, None)
+        if anterior is None:
+            return
+        _, _, codigo_n, nombre_n = anterior
+        if self.por_codigo.get(codigo_n) == pid:
+            del self.por_codigo[codigo_n]
+        for lista, clave in ((self.codigos, (codigo_n, pid)), (self.nombres, (nombre_n, pid))):
+            del lista[bisect_left(lista, clave)]
+
+        trigramas, prefijos = self._claves(codigo_n, nombre_n)
+        for claves, mapa in ((trigramas, self.trigramas), (prefijos, self.prefijos)):
+            for c in claves:
+                conjunto = mapa[c]
+                conjunto.discard(pid)
+                if not conjunto:
+                    del mapa[c]
+
+    def _conjuntos(self, terminos):
+        """Conjuntos de ids que deben cumplirse todos, del más chico al más grande."""
+        conjuntos = []
+        for t in terminos:
+            if len(t) < 3:
+                conjuntos.append(self.prefijos.get(t, _VACIO))
+            else:
+                conjuntos.extend(self.trigramas.get(t[i:i + 3], _VACIO) for i in range(len(t) - 2))
+        return sorted(conjuntos, key=len)
+
+    def _completar(self, terminos, elegidos, limite):
+        """Agrega a `elegidos`, por nombre, los que contienen todos los términos."""
+        conjuntos = self._conjuntos(terminos)
+        # Trigramas sueltos pueden coincidir salteados: los términos de 4+ letras se confirman
+        largos = [t for t in terminos if len(t) > 3]
+
+        def contiene(pid):
+            _, _, codigo_n, nombre_n = self.productos[pid]
+            return all(t in nombre_n or t in codigo_n for t in largos)
+
+        # Muchos candidatos: recorrer la lista alfabética encuentra los primeros enseguida
+        if len(conjuntos[0]) > MAX_CRUCE:
+            for _, pid in itertools.islice(self.nombres, MAX_RECORRIDO):
+                if pid not in elegidos and all(pid in c for c in conjuntos) and contiene(pid):
+                    elegidos[pid] = None
+                    if len(elegidos) >= limite:
+                        return
+            if len(self.nombres) <= MAX_RECORRIDO:
+                return
+
+        # Pocos candidatos (o coincidencias muy dispersas): se cruzan y se ordenan
+        candidatos = conjuntos[0].intersection(*conjuntos[1:])
+        for _, pid in sorted((self.productos[pid][3], pid) for pid in candidatos if pid not in elegidos):
+            if contiene(pid):
+                elegidos[pid] = None
+                if len(elegidos) >= limite:
+                    return
+
+    def buscar(self, texto, limite):
+        """
+        En orden: código exacto, códigos que empiezan por el texto, nombres que
+        empiezan por el texto y el resto de los que contienen todos los términos
+        (alfabético dentro de cada grupo).
+        """
+        consulta = normalizar(texto).strip()
+        terminos = consulta.split()
+        if not terminos:
+            return []
+
+        elegidos = {}  # id → None (un dict conserva el orden de llegada)
+        if consulta in self.por_codigo:
+            elegidos[self.por_codigo[consulta]] = None
+        for lista in (self.codigos, self.nombres):
+            i = bisect_left(lista, (consulta,))
+            while len(elegidos) < limite and i < len(lista) and lista[i][0].startswith(consulta):
+                elegidos.setdefault(lista[i][1])
+                i += 1
+        if len(elegidos) < limite:
+            self._completar(terminos, elegidos, limite)
+
+        return [
+            {"id": pid, "codigo": self.productos[pid][0], "nombre": self.productos[pid][1]}
+            for pid in elegidos
+        ]
+
+
+_indice = _Indice()
+_version = None         # Versión de productos con la que se cargó el índice
+_revisado_en = None     # time.monotonic() de la última revisión (o carga)
+_candado = Lock()
+_revisando = Lock()     # Una sola revisión en curso por worker
+
+
+def _leer_version():
+    return db.session.query(EstadoSistema.version).filter(EstadoSistema.clave == CLAVE_VERSION).scalar()
+
+
+def marcar_cambio_productos():
+    """
+    Suma 1 a la versión de productos para que los demás workers recarguen
+    su índice. Llamar en la misma transacción que crea o edita productos.
+    No hace commit.
+    """
+    sumar_en(EstadoSistema, ["clave"], [{"clave": CLAVE_VERSION, "version": 1}])
+
+
+def cargar_indice_busqueda() -> int:
+    """Lee id, código y nombre de todos los productos y reemplaza el índice. Devuelve cuántos cargó."""
+    global _indice, _version, _revisado_en
+    version = _leer_version()  # Antes que los productos: un cambio posterior se verá en la próxima revisión
+    nuevo = _Indice()
+    for pid, codigo, nombre in db.session.query(Producto.id, Producto.codigo, Producto.nombre):
+        nuevo.agregar(pid, codigo, nombre, ordenar=False)
+    nuevo.ordenar_listas()
+    with _candado:
+        _indice = nuevo
+        _version = version
+        _revisado_en = time.monotonic()
+    return len(nuevo.productos)
+
+
+def _revisar(app):
+    """Hilo de fondo: recarga el índice si la versión de productos cambió."""
+    global _revisado_en
+    try:
+        with app.app_context():
+            if _leer_version() != _version:
+                cargar_indice_busqueda()
+    except Exception as e:
+        print(f"⚠️ No se pudo revisar el índice de búsqueda: {e}")
+    finally:
+        _revisado_en = time.monotonic()
+        _revisando.release()
+
+
+def _revisar_en_segundo_plano():
+    """Lanza una revisión si no hay otra en curso; la búsqueda actual no la espera."""
+    if not _revisando.acquire(blocking=False):
+        return
+    Thread(target=_revisar, args=(current_app._get_current_object(),), daemon=True).start()
+
+
+def registrar_productos(productos):
+    """Agrega o actualiza [(id, codigo, nombre)] (llamar tras el commit)."""
+    with _candado:
+        for pid, codigo, nombre in productos:
+            _indice.agregar(pid, codigo, nombre)
+
+
+def buscar_productos(texto: str, limite: int = LIMITE_SUGERENCIAS) -> list:
+    """
+    [{id, codigo, nombre}] de los productos cuyo nombre o código contiene
+    todos los términos (los de 1-2 letras, al inicio de una palabra).
+    """
+    if _revisado_en is None:
+        cargar_indice_busqueda()  # No se pudo cargar al arrancar: única carga en el request
+    elif time.monotonic() - _revisado_en > REVISION_BUSQUEDA:
+        _revisar_en_segundo_plano()
+    with _candado:
+        return _indice.buscar(texto, limite)
@@ -0,0 +1,169 @@
+# ======================================================
+# comandos.py — comandos de consola (flask <comando>) 🇨🇱
+# ======================================================
+import time
+from datetime import timedelta
+
+import click
+
+from analitica import DIAS_OBJETIVO, PLAZO_REPOSICION, VENTANA_DIAS, calcular_reposicion
+from conciliacion import conciliar_stock
+from extensions import db
+from helpers import (
+    CONTADORES_PANEL, cambio_de_dia, cerrar_rango, recalcular_estado, reconstruir_caja,
+    reconstruir_resumenes_ventas, reconstruir_ventas_diarias
+)
+from tiempo import local_date
+from idempotencia import purgar_claves_vencidas
+from retencion import LOTE_RETENCION, RETENCION_HISTORIAL, archivar_historial_vencido
+
+
+def registrar_comandos(app):
+    """Registra los comandos de mantenimiento en la CLI de Flask."""
+
+    # ======================================================
+    # 📆 RECONSTRUIR CONTADORES DE VENTAS DIARIAS
+    # ======================================================
+    @app.cli.command("reconstruir-ventas-diarias")
+    def reconstruir_ventas_diarias_cmd():
+        """Recalcula la tabla venta_diaria (y sus resúmenes) completa desde Venta."""
+        filas = reconstruir_ventas_diarias()
+        click.echo(f"✅ Contadores diarios reconstruidos ({filas} filas).")
+
+    # ======================================================
+    # 📈 RECONSTRUIR RESÚMENES DIARIO Y MENSUAL
+    # ======================================================
+    @app.cli.command("reconstruir-resumenes")
+    def reconstruir_resumenes_cmd():
+        """Recalcula resumen_diario y venta_mensual desde venta_diaria."""
+        dias, meses = reconstruir_resumenes_ventas()
+        click.echo(f"✅ Resúmenes reconstruidos ({dias} días, {meses} filas producto/mes).")
+
+    # ======================================================
+    # 🧾 RECONSTRUIR LIBRO DE CAJA
+    # ======================================================
+    @app.cli.command("reconstruir-caja")
+    def reconstruir_caja_cmd():
+        """Recalcula el saldo acumulado de caja por día desde ventas y movimientos."""
+        dias = reconstruir_caja()
+        click.echo(f"✅ Libro de caja reconstruido ({dias} días).")
+
+    # ======================================================
+    # 🔒 CIERRE DE DÍAS (uno o un rango, completa los que faltan)
+    # ======================================================
+    @app.cli.command("cierre")
+    @click.option("--desde", type=click.DateTime(formats=["%Y-%m-%d"]), help="Primer día (YYYY-MM-DD).")
+    @click.option("--hasta", type=click.DateTime(formats=["%Y-%m-%d"]), help="Último día (por defecto, ayer).")
+    def cierre_cmd(desde, hasta):
+        """Calcula los días sin liquidación del rango y los cierra (idempotente)."""
+        hoy = local_date()
+        hasta = hasta.date() if hasta else hoy - timedelta(days=1)
+        desde = desde.date() if desde else hasta
+        if hasta > hoy:
+            raise click.BadParameter("No se puede cerrar un día futuro.", param_hint="--hasta")
+        if desde > hasta:
+            raise click.BadParameter("La fecha inicial no puede ser mayor que la final.", param_hint="--desde")
+
+        inicio = time.perf_counter()
+        creadas, cerradas = cerrar_rango(desde, hasta)
+        db.session.commit()
+        duracion = time.perf_counter() - inicio
+
+        dias = (hasta - desde).days + 1
+        click.echo(f"🔒 {desde} → {hasta}: {creadas} días completados, {cerradas} filas cerradas.")
+        click.echo(f"⚡ {dias} días en {duracion:.2f}s ({dias / max(duracion, 1e-9):.0f} días/s).")
+
+    # ======================================================
+    # 📊 RECALCULAR CONTADORES DEL PANEL
+    # ======================================================
+    @app.cli.command("reconstruir-contadores")
+    def reconstruir_contadores_cmd():
+        """Recalcula desde cero los totales del panel y el inventario valorizado."""
+        valores = recalcular_estado(CONTADORES_PANEL)
+        db.session.commit()
+        for clave, valor in valores.items():
+            click.echo(f"  {clave}: {valor}")
+        click.echo("✅ Contadores del panel recalculados.")
+
+    # ======================================================
+    # 🔁 VELOCIDAD DE VENTA Y REPOSICIÓN SUGERIDA
+    # ======================================================
+    @app.cli.command("analizar-reposicion")
+    @click.option("--ventana", default=VENTANA_DIAS, show_default=True, help="Días de historia a promediar.")
+    @click.option("--plazo", default=PLAZO_REPOSICION, show_default=True, help="Días que tarda un pedido.")
+    @click.option("--objetivo", default=DIAS_OBJETIVO, show_default=True, help="Días de venta que cubre un pedido.")
+    def analizar_reposicion_cmd(ventana, plazo, objetivo):
+        """Calcula velocidad, días de cobertura y reposición sugerida de todos los productos."""
+        if ventana < 1 or plazo < 0 or objetivo < 0:
+            raise click.BadParameter("La ventana debe ser positiva y los plazos no negativos.")
+        inicio = time.perf_counter()
+        productos = calcular_reposicion(ventana=ventana, plazo=plazo, objetivo=objetivo)
+        click.echo(f"✅ Reposición calculada para {productos} productos en {time.perf_counter() - inicio:.2f}s.")
+
+    # ======================================================
+    # 🧾 CONCILIACIÓN DE STOCK Y CONTADORES DEL DÍA
+    # ======================================================
+    @app.cli.command("conciliar-stock")
+    @click.option("--corregir", is_flag=True, help="Aplica los valores esperados a los productos con diferencias.")
+    @click.option("--mostrar", default=20, show_default=True, help="Productos con diferencias que se listan.")
+    def conciliar_stock_cmd(corregir, mostrar):
+        """Compara stock y contadores de cada producto con ventas e historial (sale con 1 si hay diferencias sin corregir)."""
+        inicio = time.perf_counter()
+        resultado = conciliar_stock(corregir=corregir)
+        db.session.commit()
+        duracion = time.perf_counter() - inicio
+
+        diferencias = resultado["diferencias"]
+        click.echo(f"🧾 {resultado['productos']} productos conciliados en {duracion:.2f}s: "
+                   f"{len(diferencias)} con diferencias.")
+        for d in diferencias[:mostrar]:
+            detalle = ", ".join(f"{campo} {actual} → {esperado}" for campo, (actual, esperado) in d["campos"].items())
+            click.echo(f"  {'⚠️' if d['revisar'] else '•'} [{d['codigo']}] {d['nombre']}: {detalle}")
+        if len(diferencias) > mostrar:
+            click.echo(f"  … y {len(diferencias) - mostrar} productos más.")
+        revisar = sum(1 for d in diferencias if d["revisar"])
+        if revisar:
+            click.echo(f"⚠️ {revisar} productos sin libro de entradas completo: revisar (no se corrigen solos).")
+
+        if corregir:
+            click.echo(f"✅ {resultado['corregidos']} productos corregidos.")
+        elif diferencias:
+            click.echo("ℹ️ Sin cambios: usa --corregir para aplicar los valores esperados.")
+            raise SystemExit(1)
+
+    # ======================================================
+    # 🌙 CAMBIO DE DÍA (programable por cron tras medianoche)
+    # ======================================================
+    @app.cli.command("cambio-dia")
+    def cambio_dia_cmd():
+        """Reinicia los contadores diarios si aún no se hizo hoy (idempotente)."""
+        if cambio_de_dia():
+            click.echo("✅ Cambio de día aplicado.")
+        else:
+            click.echo("ℹ️ El cambio de día ya estaba hecho.")
+
+    # ======================================================
+    # 🔑 PURGAR CLAVES DE IDEMPOTENCIA VENCIDAS
+    # ======================================================
+    @app.cli.command("purgar-idempotencia")
+    def purgar_idempotencia_cmd():
+        """Elimina las claves Idempotency-Key vencidas."""
+        borradas = purgar_claves_vencidas()
+        click.echo(f"🧹 {borradas} claves de idempotencia vencidas eliminadas.")
+
+    # ======================================================
+    # 🗄️ RETENCIÓN DEL HISTORIAL DE INVENTARIO (archiva y limpia)
+    # ======================================================
+    @app.cli.command("retencion")
+    @click.option("--dias", default=RETENCION_HISTORIAL.days, show_default=True,
+                  help="Días de historial que se conservan en la base.")
+    @click.option("--lote", default=LOTE_RETENCION, show_default=True, help="Filas por transacción.")
+    def retencion_cmd(dias, lote):
+        """Archiva en instance/archivo/ (jsonl.gz) y elimina el historial vencido."""
+        if dias < 1 or lote < 1:
+            raise click.BadParameter("Los días y el lote deben ser positivos.")
+        archivadas, ruta = archivar_historial_vencido(timedelta(days=dias), lote)
+        if ruta:
+            click.echo(f"🗄️ {archivadas} entradas archivadas en {ruta} y eliminadas.")
+        else:
+            click.echo("ℹ️ No hay historial vencido.")
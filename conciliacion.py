@@ -0,0 +1,151 @@
+# ======================================================
+# conciliacion.py — conciliación de stock y contadores del día 🇨🇱
+# Recalcula lo que cada producto debería tener según sus movimientos
+# (Venta, HistorialInventario e InventarioArchivado) con unas pocas
+# consultas agrupadas, informa las diferencias y, si se pide, las corrige
+# por lotes con UPDATE ... CASE. Se programa de noche: flask conciliar-stock.
+# ======================================================
+from sqlalchemy import case, func, select, update
+
+from extensions import db
+from helpers import CLAVE_INVENTARIO, dia_local, recalcular_estado, valorizar_inventario
+from modelos import HistorialInventario, InventarioArchivado, Producto, Venta
+from tiempo import day_range
+
+CAMPOS_CONCILIADOS = ("stock_inicial", "unidades_restantes", "vendidas_dia", "valor_vendido_dia")
+LOTE_CORRECCION = 1000  # Productos por UPDATE (acota los parámetros de cada sentencia)
+
+_producto = Producto.__table__
+
+
+def _esperados(productos) -> tuple:
+    """
+    ({producto_id: {campo: valor esperado}}, ids con libro de entradas) a
+    partir de cuatro agregados: entradas del historial, saldo archivado,
+    ventas totales y ventas del día de los contadores (Producto.fecha).
+    """
+    entradas = dict(db.session.execute(
+        select(HistorialInventario.producto_id, func.sum(HistorialInventario.cantidad))
+        .group_by(HistorialInventario.producto_id)
+    ).all())
+    con_libro = set(entradas)
+    for pid, cantidad in db.session.execute(select(InventarioArchivado.producto_id, InventarioArchivado.cantidad)):
+        entradas[pid] = entradas.get(pid, 0) + cantidad
+        con_libro.add(pid)
+
+    vendidas = dict(db.session.execute(
+        select(Venta.producto_id, func.sum(Venta.cantidad)).group_by(Venta.producto_id)
+    ).all())
+
+    # Normalmente todos los productos llevan el mismo día: se lee solo ese rango
+    del_dia = {}
+    dias = {p.fecha for p in productos if p.fecha}
+    if dias:
+        dia = dia_local(Venta.fecha)
+        del_dia = {
+            (pid, d): (unidades, ingreso)
+            for pid, d, unidades, ingreso in db.session.execute(
+                select(Venta.producto_id, dia, func.sum(Venta.cantidad), func.sum(Venta.ingreso))
+                .where(Venta.fecha >= day_range(min(dias))[0], Venta.fecha < day_range(max(dias))[1])
+                .group_by(Venta.producto_id, dia)
+            )
+        }
+
+    esperados = {}
+    for p in productos:
+        ingresado = int(entradas.get(p.id) or 0)
+        unidades, ingreso = del_dia.get((p.id, p.fecha), (0, 0))
+        esperados[p.id] = {
+            "stock_inicial": ingresado,
+            "unidades_restantes": ingresado - int(vendidas.get(p.id) or 0),
+            "vendidas_dia": int(unidades or 0),
+            "valor_vendido_dia": round(float(ingreso or 0), 2),
+        }
+    return esperados, con_libro
+
+
+def _sin_libro(producto, esperado, con_libro) -> bool:
+    """
+    True si el libro de entradas no alcanza para corregir el producto: no
+    tiene historial ni saldo archivado, o no explica ninguna unidad pero el
+    producto tiene stock. Corregirlo lo dejaría en cero.
+    """
+    if producto.id not in con_libro:
+        return True
+    return esperado["stock_inicial"] == 0 and (producto.unidades_restantes or 0) > 0
+
+
+def _corregir(diferencias) -> int:
+    """Aplica los valores esperados en UPDATEs por lotes. Devuelve los productos tocados."""
+    tocados = 0
+    for i in range(0, len(diferencias), LOTE_CORRECCION):
+        lote = diferencias[i:i + LOTE_CORRECCION]
+        valores = {}
+        for campo in CAMPOS_CONCILIADOS:
+            cambios = {d["producto_id"]: d["campos"][campo][1] for d in lote if campo in d["campos"]}
+            if cambios:
+                valores[campo] = case(cambios, value=_producto.c.id, else_=_producto.c[campo])
+        if not valores:
+            continue
+        tocados += db.session.execute(
+            update(_producto)
+            .where(_producto.c.id.in_([d["producto_id"] for d in lote]))
+            .values(**valores)
+        ).rowcount
+    return tocados
+
+
+def conciliar_stock(corregir: bool = False) -> dict:
+    """
+    Compara los contadores de cada producto con sus movimientos:
+      stock_inicial      = entradas del historial + inventario archivado
+      unidades_restantes = stock_inicial esperado − unidades vendidas
+      vendidas_dia / valor_vendido_dia = ventas del día de sus contadores
+    Con corregir=True bloquea los productos mientras concilia (las ventas
+    esperan), aplica los valores esperados y revaloriza el inventario. Un
+    producto sin libro de entradas (sin historial ni saldo archivado, o sin
+    ninguna entrada y con stock) o con algún esperado negativo (vendió más de
+    lo ingresado) se informa para revisar y nunca se corrige. No hace commit.
+    Devuelve {productos, diferencias: [{producto_id, codigo, nombre, campos:
+    {campo: (actual, esperado)}, revisar}], corregidos}.
+    """
+    consulta = select(
+        Producto.id, Producto.codigo, Producto.nombre, Producto.fecha,
+        *(getattr(Producto, campo) for campo in CAMPOS_CONCILIADOS),
+    ).order_by(Producto.id)
+    if corregir:
+        consulta = consulta.with_for_update()
+    productos = db.session.execute(consulta).all()
+    esperados, con_libro = _esperados(productos)
+
+    diferencias = []
+    for p in productos:
+        campos = {}
+        for campo, esperado in esperados[p.id].items():
+            actual = getattr(p, campo)
+            if campo == "valor_vendido_dia":
+                actual = round(float(actual or 0), 2)
+                distinto = abs(actual - esperado) >= 0.005
+            else:
+                actual = int(actual or 0)
+                distinto = actual != esperado
+            if distinto:
+                campos[campo] = (actual, esperado)
+        if campos:
+            diferencias.append({
+                "producto_id": p.id,
+                "codigo": p.codigo,
+                "nombre": p.nombre,
+                "campos": campos,
+                "revisar": _sin_libro(p, esperados[p.id], con_libro)
+                or any(esperado < 0 for _, esperado in campos.values()),
+            })
+
+    corregidos = 0
+    aplicables = [d for d in diferencias if not d["revisar"]]
+    if corregir and aplicables:
+        corregidos = _corregir(aplicables)
+        if any("unidades_restantes" in d["campos"] for d in aplicables):
+            recalcular_estado({CLAVE_INVENTARIO: valorizar_inventario})
+
+    return {"productos": len(productos), "diferencias": diferencias, "corregidos": corregidos}
@@ -0,0 +1,232 @@
+# ======================================================
+# exportar.py — exportación CSV / XLSX en streaming 🇨🇱
+# Las filas se leen con cursor del lado del servidor (yield_per) y se
+# escriben por trozos: la memoria no crece con la cantidad de filas.
+# ======================================================
+import csv
+import io
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select
+
+from extensions import db
+from helpers import liquidacion_por_rango
+from modelos import Producto, Venta, MovimientoCaja
+from tiempo import day_range, to_hora_chile
+
+LOTE_EXPORTACION = 1000  # Filas por viaje a la base (yield_per)
+TROZO_BYTES = 64 * 1024  # Tamaño aproximado de cada trozo enviado al navegador
+
+
+# ======================================================
+# 📋 FUENTES DE FILAS
+# ======================================================
+def _en_streaming(stmt):
+    """Ejecuta un SELECT con cursor del servidor y entrega filas de a una."""
+    resultado = db.session.execute(stmt.execution_options(yield_per=LOTE_EXPORTACION))
+    for fila in resultado:
+        yield fila
+
+
+def filas_liquidacion(desde: date, hasta: date):
+    encabezados = ["Fecha", "Caja anterior", "Ventas del día", "Entradas", "Salidas",
+                   "Caja del día", "Caja total", "Inventario"]
+
+    def filas():
+        for d in liquidacion_por_rango(desde, hasta):
+            yield [d["fecha"], d["caja_anterior"], d["ventas_dia"], d["entradas"], d["salidas"],
+                   d["caja_dia"], d["caja_total"], d["inventario"]]
+
+    return encabezados, filas()
+
+
+def filas_ventas(desde: date, hasta: date):
+    encabezados = ["ID", "Fecha", "Código", "Producto", "Cantidad", "Ingreso"]
+    start, _ = day_range(desde)
+    _, end = day_range(hasta)
+    stmt = (
+        select(Venta.id, Venta.fecha, Producto.codigo, Producto.nombre, Venta.cantidad, Venta.ingreso)
+        .join(Producto, Producto.id == Venta.producto_id)
+        .where(Venta.fecha >= start, Venta.fecha < end)
+        .order_by(Venta.fecha, Venta.id)
+    )
+
+    def filas():
+        for v in _en_streaming(stmt):
+            yield [v.id, to_hora_chile(v.fecha), v.codigo, v.nombre, v.cantidad, v.ingreso]
+
+    return encabezados, filas()
+
+
+def filas_movimientos(desde: date, hasta: date):
+    encabezados = ["ID", "Fecha", "Tipo", "Descripción", "Monto"]
+    start, _ = day_range(desde)
+    _, end = day_range(hasta)
+    stmt = (
+        select(MovimientoCaja.id, MovimientoCaja.fecha, MovimientoCaja.tipo,
+               MovimientoCaja.descripcion, MovimientoCaja.monto)
+        .where(MovimientoCaja.fecha >= start, MovimientoCaja.fecha < end)
+        .order_by(MovimientoCaja.fecha, MovimientoCaja.id)
+    )
+
+    def filas():
+        for m in _en_streaming(stmt):
+            yield [m.id, to_hora_chile(m.fecha), m.tipo, m.descripcion or "", m.monto]
+
+    return encabezados, filas()
+
+
+EXPORTACIONES = {
+    "liquidacion": filas_liquidacion,
+    "ventas": filas_ventas,
+    "movimientos": filas_movimientos,
+}
+
+
+# ======================================================
+# 🧾 CSV
+# ======================================================
+def _texto(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def _texto_csv(valor):
+    """Montos con coma decimal: con separador ';' Excel en español los lee como números."""
+    if isinstance(valor, float):
+        return f"{valor:.2f}".replace(".", ",")
+    return _texto(valor)
+
+
+def csv_en_trozos(encabezados, filas):
+    """Genera el CSV (UTF-8 con BOM, separador ';' y coma decimal para Excel en español) por trozos."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=";")
+    buffer.write("\ufeff")
+    escritor.writerow(encabezados)
+    for fila in filas:
+        escritor.writerow([_texto_csv(v) for v in fila])
+        if buffer.tell() >= TROZO_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+# ======================================================
+# 📗 XLSX (Office Open XML mínimo, escrito en streaming)
+# ======================================================
+class _SalidaZip:
+    """Destino no buscable para ZipFile: acumula lo escrito hasta que se retira."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def retirar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _workbook(hoja: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(hoja[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+def _celda(valor) -> str:
+    if valor is None:
+        return "<c/>"
+    if isinstance(valor, bool):
+        valor = "Sí" if valor else "No"
+    if isinstance(valor, (int, float)):
+        return f"<c><v>{valor}</v></c>"
+    return f'<c t="inlineStr"><is><t>{escape(str(_texto(valor)))}</t></is></c>'
+
+
+def _fila(valores) -> str:
+    return "<row>" + "".join(_celda(v) for v in valores) + "</row>"
+
+
+def xlsx_en_trozos(hoja: str, encabezados, filas):
+    """
+    Genera un XLSX de una hoja por trozos. La hoja se comprime a medida que se
+    escribe y se entrega lo que ZipFile va produciendo, sin armar el archivo en memoria.
+    """
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_DEFLATED) as libro:
+        libro.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        libro.writestr("_rels/.rels", _RELS)
+        libro.writestr("xl/workbook.xml", _workbook(hoja))
+        libro.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+
+        with libro.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as hoja_xml:
+            hoja_xml.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            hoja_xml.write(_fila(encabezados).encode("utf-8"))
+            pendiente = []
+            tamano = 0
+            for fila in filas:
+                xml = _fila(fila)
+                pendiente.append(xml)
+                tamano += len(xml)
+                if tamano >= TROZO_BYTES:
+                    hoja_xml.write("".join(pendiente).encode("utf-8"))
+                    pendiente, tamano = [], 0
+                    datos = salida.retirar()
+                    if datos:
+                        yield datos
+            hoja_xml.write("".join(pendiente).encode("utf-8"))
+            hoja_xml.write(b"</sheetData></worksheet>")
+
+    yield salida.retirar()
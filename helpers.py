@@ -2,57 +2,463 @@
 # helpers.py — versión final sincronizada 🇨🇱
 # ======================================================
 
-from datetime import date, datetime, timedelta
-from decimal import Decimal, ROUND_HALF_UP
-from sqlalchemy import func
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import case, cast, func, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import contains_eager
+from sqlalchemy.sql.expression import FunctionElement
 from extensions import db
-from modelos import Producto, Venta, MovimientoCaja, LiquidacionProducto, HistorialInventario
-from tiempo import hora_actual, local_date, day_range
+from modelos import (
+    Producto, Venta, VentaDiaria, ResumenDiario, VentaMensual, MovimientoCaja, LiquidacionProducto,
+    HistorialInventario, EstadoSistema
+)
+from tiempo import CHILE_TZ, hora_actual, local_date, day_range
+
 
 # ======================================================
-# 💼 CAJA ANTERIOR — versión definitiva robusta
+# 🗓️ DÍA LOCAL EN SQL (hora Chile)
 # ======================================================
-def obtener_caja_anterior(fecha: date) -> float:
+class dia_local(FunctionElement):
+    """
+    Fecha local chilena de una columna DateTime, calculada en la base de datos.
+    En Neon las fechas quedan guardadas en UTC (sin zona); en SQLite ya vienen
+    con la hora local de Chile.
+    """
+    type = db.Date()
+    name = "dia_local"
+    inherit_cache = True
+
+
+@compiles(dia_local)
+def _dia_local_sqlite(element, compiler, **kw):
+    return "date(%s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(dia_local, "postgresql")
+def _dia_local_postgres(element, compiler, **kw):
+    return "date(timezone('%s', timezone('UTC', %s)))" % (
+        CHILE_TZ.key, compiler.process(element.clauses, **kw)
+    )
+
+
+class primer_dia_mes(FunctionElement):
+    """Primer día del mes de una columna Date (para agrupar por mes en la base)."""
+    type = db.Date()
+    name = "primer_dia_mes"
+    inherit_cache = True
+
+
+@compiles(primer_dia_mes)
+def _primer_dia_mes_sqlite(element, compiler, **kw):
+    return "date(%s, 'start of month')" % compiler.process(element.clauses, **kw)
+
+
+@compiles(primer_dia_mes, "postgresql")
+def _primer_dia_mes_postgres(element, compiler, **kw):
+    return "CAST(date_trunc('month', %s) AS DATE)" % compiler.process(element.clauses, **kw)
+
+
+# ======================================================
+# ➕ UPSERT ACUMULATIVO (PostgreSQL / SQLite)
+# ======================================================
+def insertar_en(tabla):
+    """INSERT con soporte ON CONFLICT según el motor de la sesión."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        return pg_insert(tabla)
+    return sqlite_insert(tabla)
+
+
+def sumar_en(modelo, claves, filas):
     """
-    Devuelve la caja del día anterior o, si no existe,
-    la última caja registrada (aunque sea del mismo día).
-    Garantiza continuidad real en la caja.
+    Inserta las filas o, si la clave ya existe, suma sus valores a los actuales.
+    Todo en una sola sentencia (INSERT ... ON CONFLICT DO UPDATE).
     """
-    # 1️⃣ Buscar liquidación exacta del día anterior
-    dia_anterior = fecha - timedelta(days=1)
-    liq_anterior = LiquidacionProducto.query.filter_by(fecha=dia_anterior).first()
+    if not filas:
+        return
 
-    if liq_anterior:
-        return float(liq_anterior.caja_dia)
+    tabla = modelo.__table__
+    stmt = insertar_en(tabla)
 
-    # 2️⃣ Si no hay del día anterior, buscar la más reciente antes o igual a hoy
-    liq_previa = (
-        LiquidacionProducto.query
-        .filter(LiquidacionProducto.fecha <= fecha)
+    campos = [c for c in filas[0] if c not in claves]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=claves,
+        set_={c: func.coalesce(tabla.c[c], 0) + stmt.excluded[c] for c in campos},
+    )
+    db.session.execute(stmt, filas)
+
+# ======================================================
+# 💼 CAJA ANTERIOR — saldo acumulado (una búsqueda indexada)
+# ======================================================
+def _caja_previa(fecha: date, columna=LiquidacionProducto.caja_dia):
+    """Subconsulta: valor de cierre (caja por defecto) del último día registrado antes de la fecha."""
+    return (
+        select(columna)
+        .where(LiquidacionProducto.fecha < fecha)
         .order_by(LiquidacionProducto.fecha.desc())
-        .first()
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def _inventario_siguiente(fecha: date):
+    """Subconsulta: foto del inventario del primer día registrado después de la fecha."""
+    return (
+        select(LiquidacionProducto.inventario_total)
+        .where(LiquidacionProducto.fecha > fecha)
+        .order_by(LiquidacionProducto.fecha.asc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def obtener_caja_anterior(fecha: date) -> float:
+    """
+    Devuelve la caja con la que abre el día: el cierre del último día anterior.
+    Cada fila de LiquidacionProducto guarda el saldo acumulado hasta su día,
+    así que basta con una sola búsqueda por el índice de fecha.
+    """
+    return float(db.session.query(_caja_previa(fecha)).scalar() or 0.0)
+
+
+# ======================================================
+# 🧾 LIBRO DE CAJA (saldo acumulado por día)
+# ======================================================
+class DiaCerrado(Exception):
+    """Se intentó mover la caja de un día que ya fue cerrado."""
+
+    def __init__(self, dia: date):
+        super().__init__(f"El día {dia:%d/%m/%Y} ya está cerrado.")
+        self.dia = dia
+
+
+def registrar_caja(dia: date, ventas: float = 0.0, entradas: float = 0.0, salidas: float = 0.0):
+    """
+    Suma un movimiento al día indicado y arrastra la diferencia a todos los días
+    siguientes, para que caja_anterior/caja_dia de cada fila sean siempre el
+    saldo acumulado. Si el día no tiene fila, se crea abriendo con la caja del
+    último día anterior y su inventario (o, si no hay foto anterior, la del
+    día siguiente o el valor actual del inventario: nunca en cero).
+    Los días cerrados no se tocan: si el movimiento cae en uno (o antes de uno),
+    lanza DiaCerrado y quien llama debe hacer rollback.
+    No hace commit: lo decide quien llama.
+    """
+    tabla = LiquidacionProducto.__table__
+    previa = func.coalesce(_caja_previa(dia), 0.0)
+    inventario = func.coalesce(
+        func.nullif(_caja_previa(dia, LiquidacionProducto.inventario_total), 0),
+        func.nullif(_inventario_siguiente(dia), 0),
+        select(EstadoSistema.valor).where(EstadoSistema.clave == CLAVE_INVENTARIO).scalar_subquery(),
+        0.0,
+    )
+    db.session.execute(
+        insertar_en(tabla)
+        .values(
+            fecha=dia, caja_anterior=previa, ventas_dia=0.0, entradas=0.0, salidas=0.0,
+            caja_dia=previa, caja_total=previa, inventario_total=inventario, cerrada=False,
+        )
+        .on_conflict_do_nothing(index_elements=["fecha"])
+    )
+
+    if not (ventas or entradas or salidas):
+        return
+
+    delta = (ventas or 0.0) + (entradas or 0.0) - (salidas or 0.0)
+    del_dia = tabla.c.fecha == dia
+    cerradas = db.session.execute(
+        update(tabla)
+        .where(tabla.c.fecha >= dia)
+        .values(
+            ventas_dia=func.coalesce(tabla.c.ventas_dia, 0) + case((del_dia, ventas or 0.0), else_=0.0),
+            entradas=func.coalesce(tabla.c.entradas, 0) + case((del_dia, entradas or 0.0), else_=0.0),
+            salidas=func.coalesce(tabla.c.salidas, 0) + case((del_dia, salidas or 0.0), else_=0.0),
+            caja_anterior=func.coalesce(tabla.c.caja_anterior, 0) + case((del_dia, 0.0), else_=delta),
+            caja_dia=func.coalesce(tabla.c.caja_dia, 0) + delta,
+            caja_total=func.coalesce(tabla.c.caja_total, 0) + delta,
+        )
+        .returning(tabla.c.cerrada)
+    ).scalars().all()
+    if any(cerradas):
+        raise DiaCerrado(dia)
+
+
+HORA_CIERRE = time(20, 0)  # Desde esta hora (Chile) se puede cerrar el día en curso
+
+
+def cerrar_dia(dia: date) -> int:
+    """
+    Cierra el día y todos los anteriores: sus filas quedan congeladas y ya no
+    se recalculan. Si es el día en curso, guarda además la foto del inventario.
+    No hace commit: lo decide quien llama. Devuelve cuántas filas se cerraron.
+    """
+    registrar_caja(dia)
+    abiertas = LiquidacionProducto.cerrada.is_(False)
+    if dia == local_date():
+        db.session.execute(
+            update(LiquidacionProducto)
+            .where(LiquidacionProducto.fecha == dia, abiertas)
+            .values(inventario_total=valorizar_inventario())
+        )
+    return db.session.execute(
+        update(LiquidacionProducto)
+        .where(LiquidacionProducto.fecha <= dia, abiertas)
+        .values(cerrada=True)
+    ).rowcount
+
+
+def cerrar_rango(desde: date, hasta: date) -> tuple:
+    """
+    Completa y cierra todos los días del rango. Los días sin fila se calculan
+    con las consultas agrupadas de liquidacion_por_rango() (caja encadenada en
+    una sola pasada) y se insertan de una vez; luego se cierra hasta `hasta`.
+    Es idempotente. No hace commit. Devuelve (filas_creadas, filas_cerradas).
+    """
+    existentes = {
+        f for (f,) in db.session.query(LiquidacionProducto.fecha)
+        .filter(LiquidacionProducto.fecha >= desde, LiquidacionProducto.fecha <= hasta)
+    }
+    nuevas = [
+        {
+            "fecha": fila["fecha"],
+            "caja_anterior": fila["caja_anterior"],
+            "ventas_dia": fila["ventas_dia"],
+            "entradas": fila["entradas"],
+            "salidas": fila["salidas"],
+            "caja_dia": fila["caja_dia"],
+            "caja_total": fila["caja_total"],
+            "inventario_total": fila["inventario"],
+            "cerrada": False,
+        }
+        for fila in liquidacion_por_rango(desde, hasta)
+        if fila["fecha"] not in existentes
+    ]
+    if nuevas:
+        db.session.execute(
+            insertar_en(LiquidacionProducto.__table__).on_conflict_do_nothing(index_elements=["fecha"]),
+            nuevas,
+        )
+    return len(nuevas), cerrar_dia(hasta)
+
+
+def ultimo_dia_cerrado():
+    """Fecha del último día cerrado (o None si nunca se cerró uno)."""
+    return (
+        db.session.query(func.max(LiquidacionProducto.fecha))
+        .filter(LiquidacionProducto.cerrada.is_(True))
+        .scalar()
+    )
+
+
+def reconstruir_caja() -> int:
+    """
+    Recalcula el libro de caja desde Venta y MovimientoCaja. Los días cerrados
+    no se tocan: se parte del cierre del último; si no hay ninguno, se respeta
+    la caja de apertura del primer día registrado.
+    """
+    cierre = ultimo_dia_cerrado()
+    desde = day_range(cierre + timedelta(days=1))[0] if cierre else None
+
+    dia = dia_local(Venta.fecha)
+    consulta = db.session.query(dia, func.sum(Venta.ingreso))
+    if desde:
+        consulta = consulta.filter(Venta.fecha >= desde)
+    ventas = dict(consulta.group_by(dia))
+
+    dia = dia_local(MovimientoCaja.fecha)
+    consulta = db.session.query(
+        dia,
+        func.sum(case((MovimientoCaja.tipo == "entrada", MovimientoCaja.monto), else_=0)),
+        func.sum(case((MovimientoCaja.tipo.in_(["salida", "gasto"]), MovimientoCaja.monto), else_=0)),
     )
+    if desde:
+        consulta = consulta.filter(MovimientoCaja.fecha >= desde)
+    movimientos = {d: (float(e or 0), float(s or 0)) for d, e, s in consulta.group_by(dia)}
+
+    consulta = LiquidacionProducto.query.order_by(LiquidacionProducto.fecha)
+    if cierre:
+        congelada = LiquidacionProducto.query.filter_by(fecha=cierre).one()
+        caja = float(congelada.caja_dia or 0.0)
+        inventario = float(congelada.inventario_total or 0.0)
+        filas = {liq.fecha: liq for liq in consulta.filter(LiquidacionProducto.fecha > cierre)}
+    else:
+        filas = {liq.fecha: liq for liq in consulta}
+        caja = float(next(iter(filas.values())).caja_anterior or 0.0) if filas else 0.0
+        inventario = 0.0
 
-    # 3️⃣ Si existe, devolver su caja_dia (continuidad garantizada)
-    return float(liq_previa.caja_dia) if liq_previa else 0.0
+    for fecha in sorted(set(ventas) | set(movimientos) | set(filas)):
+        liq = filas.get(fecha)
+        if liq is None:
+            liq = LiquidacionProducto(fecha=fecha, inventario_total=inventario)
+            db.session.add(liq)
+        inventario = float(liq.inventario_total or 0.0)
+        entradas, salidas = movimientos.get(fecha, (0.0, 0.0))
+        liq.caja_anterior = caja
+        liq.ventas_dia = float(ventas.get(fecha) or 0.0)
+        liq.entradas = entradas
+        liq.salidas = salidas
+        caja = caja + liq.ventas_dia + entradas - salidas
+        liq.caja_dia = caja
+        liq.caja_total = caja
+        filas[fecha] = liq
+
+    db.session.commit()
+    return len(filas)
+
+
+# ======================================================
+# 🧮 TOTALES ACUMULADOS (EstadoSistema clave → valor)
+# ======================================================
+def leer_estado(calculos: dict) -> dict:
+    """
+    Lee varios totales de EstadoSistema en una sola consulta. Los que aún no
+    existen se calculan con su función de `calculos`, sin guardarlos: se
+    llama desde vistas de lectura, que no escriben. Los siembra el cambio
+    de día (sembrar_estado).
+    """
+    valores = {
+        e.clave: float(e.valor or 0)
+        for e in EstadoSistema.query.filter(EstadoSistema.clave.in_(list(calculos)))
+    }
+    for clave, calculo in calculos.items():
+        if clave not in valores:
+            valores[clave] = float(calculo() or 0)
+    return valores
+
+
+def sembrar_estado(calculos: dict) -> list:
+    """
+    Calcula y guarda los totales de `calculos` que aún no existen en
+    EstadoSistema; los existentes no se tocan. No hace commit.
+    Devuelve las claves sembradas.
+    """
+    existentes = {
+        c for (c,) in db.session.query(EstadoSistema.clave).filter(EstadoSistema.clave.in_(list(calculos)))
+    }
+    faltantes = [c for c in calculos if c not in existentes]
+    if faltantes:
+        db.session.execute(
+            insertar_en(EstadoSistema.__table__).on_conflict_do_nothing(index_elements=["clave"]),
+            [{"clave": c, "valor": calculos[c]()} for c in faltantes],
+        )
+    return faltantes
+
+
+def sumar_estado(deltas: dict):
+    """
+    Suma a varios totales de EstadoSistema en un solo UPDATE, en la misma
+    transacción que el cambio que los origina. Las claves que aún no existen
+    se ignoran: se calcularán completas la primera vez que se lean.
+    No hace commit: lo decide quien llama.
+    """
+    deltas = {clave: delta for clave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    db.session.execute(
+        update(EstadoSistema)
+        .where(EstadoSistema.clave.in_(list(deltas)))
+        .values(valor=func.coalesce(EstadoSistema.valor, 0) + case(deltas, value=EstadoSistema.clave, else_=0))
+    )
+
+
+def recalcular_estado(calculos: dict) -> dict:
+    """Recalcula desde cero los totales indicados y los guarda. No hace commit."""
+    valores = {clave: calculo() for clave, calculo in calculos.items()}
+    stmt = insertar_en(EstadoSistema.__table__)
+    db.session.execute(
+        stmt.on_conflict_do_update(index_elements=["clave"], set_={"valor": stmt.excluded.valor}),
+        [{"clave": c, "valor": v} for c, v in valores.items()],
+    )
+    return valores
 
 
 # ======================================================
 # 📦 INVENTARIO TOTAL (CON INTERÉS)
 # ======================================================
+CLAVE_INVENTARIO = "inventario_valor"
+
+
+def valor_con_interes(unidades, valor_unitario, interes) -> float:
+    """Valor de venta de unas unidades (precio unitario + interés)."""
+    return (unidades or 0) * (valor_unitario or 0) * (1 + (interes or 0) / 100)
+
+
+def valorizar_inventario() -> float:
+    """Valor exacto del inventario con ganancia, calculado por la base con un solo SUM."""
+    factor = 1 + cast(func.coalesce(Producto.interes, 0), db.Numeric(9, 4)) / 100
+    total = db.session.query(
+        func.round(func.coalesce(func.sum(Producto.unidades_restantes * Producto.valor_unitario * factor), 0), 2)
+    ).scalar()
+    return float(total or 0)
+
+
 def calcular_inventario_total() -> float:
-    """Calcula el valor total del inventario actual con ganancia."""
-    total_preciso = Decimal("0.00")
-    productos = Producto.query.all()
+    """
+    Valor actual del inventario con ganancia, leído del total que se mantiene
+    en EstadoSistema (una búsqueda por clave primaria). Si aún no existe,
+    se valoriza completo sin guardarlo.
+    """
+    return round(leer_estado({CLAVE_INVENTARIO: valorizar_inventario})[CLAVE_INVENTARIO], 2)
 
-    for p in productos:
-        unidades = Decimal(str(p.unidades_restantes or 0))
-        valor = Decimal(str(p.valor_unitario or 0))
-        interes = Decimal(str(p.interes or 0))
-        subtotal = unidades * valor * (Decimal("1") + interes / Decimal("100"))
-        total_preciso += subtotal
 
-    return float(total_preciso.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+def sumar_inventario(delta: float):
+    """
+    Ajusta el valor actual del inventario tras un cambio de stock o de precio.
+    Si el total aún no se inicializó no hace nada: lo siembra el cambio de día.
+    No hace commit: lo decide quien llama.
+    """
+    sumar_estado({CLAVE_INVENTARIO: delta})
+
+
+def cerrar_inventario(dia: date) -> float:
+    """
+    Guarda la foto del inventario al cierre del día en LiquidacionProducto
+    y corrige el total en curso con una valorización exacta.
+    No hace commit: lo decide quien llama.
+    """
+    valor = valorizar_inventario()
+    db.session.execute(
+        insertar_en(EstadoSistema.__table__)
+        .values(clave=CLAVE_INVENTARIO, valor=valor)
+        .on_conflict_do_update(index_elements=["clave"], set_={"valor": valor})
+    )
+    registrar_caja(dia)
+    db.session.execute(
+        update(LiquidacionProducto)
+        .where(LiquidacionProducto.fecha == dia, LiquidacionProducto.cerrada.is_(False))
+        .values(inventario_total=valor)
+    )
+    return valor
+
+
+# ======================================================
+# 📊 CONTADORES DEL PANEL (sin recorrer Venta ni MovimientoCaja)
+# ======================================================
+PANEL_PRODUCTOS = "panel_productos"
+PANEL_UNIDADES = "panel_unidades_vendidas"
+PANEL_VENDIDO = "panel_valor_vendido"
+PANEL_MOVIMIENTOS = "panel_movimientos"
+
+CONTADORES_PANEL = {
+    PANEL_PRODUCTOS: lambda: Producto.query.count(),
+    PANEL_UNIDADES: lambda: db.session.query(func.coalesce(func.sum(Venta.cantidad), 0)).scalar(),
+    PANEL_VENDIDO: lambda: db.session.query(func.coalesce(func.sum(Venta.ingreso), 0)).scalar(),
+    PANEL_MOVIMIENTOS: lambda: MovimientoCaja.query.count(),
+    CLAVE_INVENTARIO: valorizar_inventario,
+}
+
+
+def estadisticas_panel() -> dict:
+    """Totales del panel de control en una sola consulta por clave primaria."""
+    valores = leer_estado(CONTADORES_PANEL)
+    return {
+        "total_productos": int(valores[PANEL_PRODUCTOS]),
+        "total_unidades_vendidas": int(valores[PANEL_UNIDADES]),
+        "valor_total_vendido": round(valores[PANEL_VENDIDO], 2),
+        "total_movimientos": int(valores[PANEL_MOVIMIENTOS]),
+        "inventario_total": round(valores[CLAVE_INVENTARIO], 2),
+    }
 
 
 # ======================================================
@@ -118,24 +524,440 @@ def caja_base_del_dia(fecha: date) -> float:
     return float(caja_anterior + ventas + entradas - salidas)
 
 
+# ======================================================
+# 📆 LIQUIDACIÓN POR RANGO (consultas agrupadas por día)
+# ======================================================
+def liquidacion_por_rango(fecha_inicio: date, fecha_fin: date) -> list:
+    """
+    Devuelve una fila por día del rango con la misma forma que la liquidación diaria.
+    Ventas, entradas y salidas salen de un GROUP BY por día local (una consulta
+    cada una, sin importar el largo del rango) y la caja se encadena en Python:
+    los días ya liquidados se respetan y los demás parten de la caja anterior.
+    El inventario es la foto guardada al cierre de cada día (un día sin fila
+    conserva la del anterior); el día en curso usa el valor actual.
+    """
+    start, _ = day_range(fecha_inicio)
+    _, end = day_range(fecha_fin)
+
+    guardadas = {
+        liq.fecha: liq for liq in LiquidacionProducto.query.filter(
+            LiquidacionProducto.fecha >= fecha_inicio, LiquidacionProducto.fecha <= fecha_fin
+        )
+    }
+
+    dia = dia_local(Venta.fecha)
+    ventas = dict(
+        db.session.query(dia, func.sum(Venta.ingreso))
+        .filter(Venta.fecha >= start, Venta.fecha < end)
+        .group_by(dia)
+    )
+
+    dia = dia_local(MovimientoCaja.fecha)
+    es_entrada = MovimientoCaja.tipo == "entrada"
+    movimientos = {
+        d: (float(e or 0), float(s or 0)) for d, e, s in
+        db.session.query(
+            dia,
+            func.sum(case((es_entrada, MovimientoCaja.monto), else_=0)),
+            func.sum(case((MovimientoCaja.tipo.in_(["salida", "gasto"]), MovimientoCaja.monto), else_=0)),
+        )
+        .filter(MovimientoCaja.fecha >= start, MovimientoCaja.fecha < end)
+        .group_by(dia)
+    }
+
+    previa = (
+        db.session.query(LiquidacionProducto.caja_dia, LiquidacionProducto.inventario_total)
+        .filter(LiquidacionProducto.fecha < fecha_inicio)
+        .order_by(LiquidacionProducto.fecha.desc())
+        .first()
+    )
+    caja = float(previa.caja_dia or 0.0) if previa else 0.0
+    inventario = float(previa.inventario_total or 0.0) if previa else 0.0
+    hoy = local_date()
+
+    resultados = []
+    fecha = fecha_inicio
+    while fecha <= fecha_fin:
+        liq = guardadas.get(fecha)
+        if liq:
+            fila = {
+                "fecha": liq.fecha,
+                "caja_anterior": liq.caja_anterior,
+                "ventas_dia": liq.ventas_dia,
+                "entradas": liq.entradas,
+                "salidas": liq.salidas,
+                "caja_dia": liq.caja_dia,
+                "caja_total": liq.caja_total,
+                "inventario": liq.inventario_total,
+            }
+        else:
+            ventas_dia = float(ventas.get(fecha) or 0.0)
+            entradas, salidas = movimientos.get(fecha, (0.0, 0.0))
+            caja_dia = caja + ventas_dia + entradas - salidas
+            fila = {
+                "fecha": fecha,
+                "caja_anterior": caja,
+                "ventas_dia": ventas_dia,
+                "entradas": entradas,
+                "salidas": salidas,
+                "caja_dia": caja_dia,
+                "caja_total": caja_dia,
+                "inventario": inventario,
+            }
+        if fecha == hoy:
+            fila["inventario"] = calcular_inventario_total()  # El día en curso aún no tiene foto
+        caja = float(fila["caja_dia"] or 0.0)
+        inventario = float(fila["inventario"] or 0.0)
+        resultados.append(fila)
+        fecha += timedelta(days=1)
+
+    return resultados
+
+
+# ======================================================
+# 🕒 HISTORIAL DE INVENTARIO (paginado por cursor)
+# ======================================================
+HISTORIAL_POR_PAGINA = 50
+
+
+def _cursor_historial(entrada) -> str:
+    return f"{entrada.fecha.isoformat()}_{entrada.id}"
+
+
+def _leer_cursor_historial(cursor: str):
+    """(fecha, id) del cursor; ValueError si no es válido."""
+    fecha, _, entrada_id = cursor.rpartition("_")
+    return datetime.fromisoformat(fecha), int(entrada_id)
+
+
+def pagina_historial(cursor: str = None, producto_id: int = None, desde: date = None, hasta: date = None,
+                     limite: int = HISTORIAL_POR_PAGINA):
+    """
+    Una página del historial de entradas, de la más nueva a la más antigua,
+    con el producto en la misma consulta. Se pagina por (fecha, id) desde el
+    cursor que devolvió la página anterior: el costo no depende de cuántas
+    páginas haya antes. Devuelve (entradas, cursor siguiente o None).
+    """
+    consulta = (
+        HistorialInventario.query
+        .join(HistorialInventario.producto)
+        .options(contains_eager(HistorialInventario.producto))
+    )
+    if producto_id:
+        consulta = consulta.filter(HistorialInventario.producto_id == producto_id)
+    if desde:
+        consulta = consulta.filter(HistorialInventario.fecha >= day_range(desde)[0])
+    if hasta:
+        consulta = consulta.filter(HistorialInventario.fecha < day_range(hasta)[1])
+    if cursor:
+        consulta = consulta.filter(
+            tuple_(HistorialInventario.fecha, HistorialInventario.id) < tuple_(*_leer_cursor_historial(cursor))
+        )
+
+    entradas = (
+        consulta.order_by(HistorialInventario.fecha.desc(), HistorialInventario.id.desc())
+        .limit(limite + 1)
+        .all()
+    )
+    siguiente = _cursor_historial(entradas[limite - 1]) if len(entradas) > limite else None
+    return entradas[:limite], siguiente
+
+
+# ======================================================
+# 📆 CONTADORES DE VENTAS POR PRODUCTO Y DÍA
+# ======================================================
+def registrar_ventas_diarias(filas: list):
+    """
+    Suma (o resta, con valores negativos) ventas a los contadores por producto
+    y día, y a los resúmenes por día y por producto y mes. Cada fila trae
+    producto_id, dia, unidades e ingreso. No hace commit.
+    """
+    if not filas:
+        return
+    por_dia, por_mes = {}, {}
+    for f in filas:
+        u, v = por_dia.get(f["dia"], (0, 0.0))
+        por_dia[f["dia"]] = (u + f["unidades"], v + f["ingreso"])
+        clave = (f["producto_id"], f["dia"].replace(day=1))
+        u, v = por_mes.get(clave, (0, 0.0))
+        por_mes[clave] = (u + f["unidades"], v + f["ingreso"])
+
+    # Orden fijo de claves: los workers bloquean las filas siempre en el mismo orden
+    sumar_en(VentaDiaria, ["producto_id", "dia"], sorted(filas, key=lambda f: (f["producto_id"], f["dia"])))
+    sumar_en(ResumenDiario, ["dia"], [
+        {"dia": dia, "unidades": u, "ingreso": round(v, 2)} for dia, (u, v) in sorted(por_dia.items())
+    ])
+    sumar_en(VentaMensual, ["producto_id", "mes"], [
+        {"producto_id": pid, "mes": mes, "unidades": u, "ingreso": round(v, 2)}
+        for (pid, mes), (u, v) in sorted(por_mes.items())
+    ])
+
+
+def registrar_venta_diaria(producto_id: int, dia: date, cantidad: int, ingreso: float):
+    """Suma (o resta, con valores negativos) una venta al contador del día."""
+    registrar_ventas_diarias([{
+        "producto_id": producto_id,
+        "dia": dia,
+        "unidades": cantidad,
+        "ingreso": ingreso,
+    }])
+
+
+def ventas_del_dia(dia: date) -> dict:
+    """Devuelve {producto_id: VentaDiaria} del día (una sola consulta indexada)."""
+    return {v.producto_id: v for v in VentaDiaria.query.filter_by(dia=dia)}
+
+
+def reconstruir_ventas_diarias() -> int:
+    """Reconstruye la tabla de contadores desde Venta con un único GROUP BY."""
+    dia = dia_local(Venta.fecha)
+    agrupado = (
+        select(Venta.producto_id, dia, func.sum(Venta.cantidad), func.sum(Venta.ingreso))
+        .group_by(Venta.producto_id, dia)
+    )
+
+    db.session.query(VentaDiaria).delete()
+    db.session.execute(
+        VentaDiaria.__table__.insert().from_select(
+            ["producto_id", "dia", "unidades", "ingreso"], agrupado
+        )
+    )
+    reconstruir_resumenes_ventas()
+    return VentaDiaria.query.count()
+
+
+def reconstruir_resumenes_ventas() -> tuple:
+    """Reconstruye los resúmenes diario y mensual desde VentaDiaria (dos GROUP BY)."""
+    db.session.query(ResumenDiario).delete()
+    db.session.execute(
+        ResumenDiario.__table__.insert().from_select(
+            ["dia", "unidades", "ingreso"],
+            select(VentaDiaria.dia, func.sum(VentaDiaria.unidades), func.sum(VentaDiaria.ingreso))
+            .group_by(VentaDiaria.dia),
+        )
+    )
+
+    mes = primer_dia_mes(VentaDiaria.dia)
+    db.session.query(VentaMensual).delete()
+    db.session.execute(
+        VentaMensual.__table__.insert().from_select(
+            ["producto_id", "mes", "unidades", "ingreso"],
+            select(VentaDiaria.producto_id, mes, func.sum(VentaDiaria.unidades), func.sum(VentaDiaria.ingreso))
+            .group_by(VentaDiaria.producto_id, mes),
+        )
+    )
+    db.session.commit()
+    return ResumenDiario.query.count(), VentaMensual.query.count()
+
+
+# ======================================================
+# 📈 SERIES PARA GRÁFICOS (solo leen los resúmenes)
+# ======================================================
+def serie_ventas_diarias(desde: date, hasta: date) -> list:
+    """Una fila por día del rango (los días sin ventas van en cero)."""
+    filas = {
+        r.dia: r for r in ResumenDiario.query.filter(ResumenDiario.dia >= desde, ResumenDiario.dia <= hasta)
+    }
+    serie = []
+    dia = desde
+    while dia <= hasta:
+        r = filas.get(dia)
+        serie.append({
+            "dia": dia.isoformat(),
+            "unidades": r.unidades if r else 0,
+            "ingreso": round(float(r.ingreso), 2) if r else 0.0,
+        })
+        dia += timedelta(days=1)
+    return serie
+
+
+def serie_ventas_mensuales(desde: date, hasta: date, producto_id: int = None) -> list:
+    """Totales por mes entre los meses de `desde` y `hasta` (de un producto o de todos)."""
+    primero = desde.replace(day=1)
+    consulta = (
+        db.session.query(VentaMensual.mes, func.sum(VentaMensual.unidades), func.sum(VentaMensual.ingreso))
+        .filter(VentaMensual.mes >= primero, VentaMensual.mes <= hasta)
+    )
+    if producto_id is not None:
+        consulta = consulta.filter(VentaMensual.producto_id == producto_id)
+    filas = {mes: (u, v) for mes, u, v in consulta.group_by(VentaMensual.mes)}
+
+    serie = []
+    mes = primero
+    while mes <= hasta:
+        u, v = filas.get(mes, (0, 0.0))
+        serie.append({"mes": mes.strftime("%Y-%m"), "unidades": int(u or 0), "ingreso": round(float(v or 0), 2)})
+        mes = (mes + timedelta(days=32)).replace(day=1)
+    return serie
+
+
 # ======================================================
 # 🔁 RESETEAR VENTAS DIARIAS (según hora local Chile)
 # ======================================================
-def resetear_ventas_dia():
-    """Reinicia las ventas diarias si cambió el día (según hora local Chile)."""
+def resetear_ventas_dia(hoy: date = None) -> int:
+    """Reinicia en un solo UPDATE los contadores diarios de productos de otro día."""
+    hoy = hoy or local_date()
+    cambios = (
+        Producto.query
+        .filter((Producto.fecha != hoy) | (Producto.fecha.is_(None)))
+        .update(
+            {"vendidas_dia": 0, "valor_vendido_dia": 0.0, "fecha": hoy},
+            synchronize_session=False,
+        )
+    )
+    return cambios
+
+
+# ======================================================
+# 🌙 CAMBIO DE DÍA (una vez por día local, sin repetir)
+# ======================================================
+CLAVE_CAMBIO_DIA = "cambio_dia"
+_ultimo_cambio_dia = None  # 🧠 Caché por worker: evita consultar en cada request
+
+
+def cambio_de_dia(hoy: date = None) -> bool:
+    """
+    Ejecuta el cambio de día si aún no se hizo para `hoy`.
+    El UPDATE condicional del marcador bloquea la fila: si varios workers
+    llegan a la vez, solo uno lo ve pendiente y los demás no repiten nada.
+    Devuelve True si este proceso hizo el cambio.
+    """
+    hoy = hoy or local_date()
+
+    if db.session.get(EstadoSistema, CLAVE_CAMBIO_DIA) is None:
+        db.session.add(EstadoSistema(clave=CLAVE_CAMBIO_DIA, fecha=None))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Otro worker lo creó primero
+
+    cerrado = db.session.query(EstadoSistema.fecha).filter_by(clave=CLAVE_CAMBIO_DIA).scalar()
+    tomado = (
+        EstadoSistema.query
+        .filter(EstadoSistema.clave == CLAVE_CAMBIO_DIA)
+        .filter((EstadoSistema.fecha < hoy) | (EstadoSistema.fecha.is_(None)))
+        .update({"fecha": hoy}, synchronize_session=False)
+    )
+    if not tomado:
+        db.session.rollback()
+        return False
+
+    cambios = resetear_ventas_dia(hoy)
+    cerrar_inventario(cerrado or hoy - timedelta(days=1))
+    sembrar_estado(CONTADORES_PANEL)  # Las vistas de lectura no los guardan
+    db.session.commit()
+    print(f"🔄 Cambio de día {hoy}: ventas diarias reiniciadas para {cambios} productos")
+    return True
+
+
+def asegurar_cambio_de_dia():
+    """
+    Verificación barata para cada request: sin consultas si este worker ya
+    vio el día actual; si no, una lectura del marcador por clave primaria.
+    """
+    global _ultimo_cambio_dia
     hoy = local_date()
-    cambios = 0
+    if _ultimo_cambio_dia == hoy:
+        return
 
-    for producto in Producto.query.all():
-        if getattr(producto, "fecha", None) != hoy:
-            producto.vendidas_dia = 0
-            producto.valor_vendido_dia = 0
-            producto.fecha = hoy
-            cambios += 1
+    marcador = (
+        db.session.query(EstadoSistema.fecha)
+        .filter(EstadoSistema.clave == CLAVE_CAMBIO_DIA)
+        .scalar()
+    )
+    if marcador != hoy:
+        cambio_de_dia(hoy)
+    _ultimo_cambio_dia = hoy
+
+
+# ======================================================
+# 🔢 ORDEN DE PRODUCTOS (rangos dispersos)
+# ======================================================
+ORDEN_PASO = 1024  # Espacio entre productos consecutivos
+
+
+def orden_productos():
+    """Criterio de orden para listar productos (sin orden → al final)."""
+    return Producto.orden.asc().nulls_last(), Producto.id.asc()
 
-    if cambios > 0:
-        db.session.commit()
-        print(f"🔄 Ventas diarias reiniciadas para {cambios} productos ({hoy})")
+
+def rebalancear_orden():
+    """Reparte todos los rangos cada ORDEN_PASO en un solo UPDATE."""
+    posicion = func.row_number().over(order_by=orden_productos())
+    nuevos = select(Producto.id.label("id"), (posicion * ORDEN_PASO).label("orden")).subquery()
+    tabla = Producto.__table__
+    db.session.execute(
+        update(tabla).where(tabla.c.id == nuevos.c.id).values(orden=nuevos.c.orden)
+    )
+
+
+def siguiente_orden() -> int:
+    """Rango para un producto nuevo al final de la lista."""
+    ultimo = db.session.query(func.max(Producto.orden)).scalar() or 0
+    return ultimo + ORDEN_PASO
+
+
+def mover_producto(producto_id: int, posicion: int):
+    """
+    Mueve un producto a la posición indicada (1 = primero) actualizando solo su fila.
+    Si no queda espacio entre los vecinos, rebalancea una vez y reintenta.
+    """
+    posicion = max(int(posicion), 1)
+
+    for _ in range(2):
+        vecinos = (
+            db.session.query(Producto.orden)
+            .filter(Producto.id != producto_id)
+            .order_by(*orden_productos())
+            .offset(max(posicion - 2, 0))
+            .limit(2 if posicion > 1 else 1)
+            .all()
+        )
+        rangos = [v.orden for v in vecinos]
+        if None in rangos:
+            rebalancear_orden()  # Productos antiguos sin orden asignado
+            continue
+
+        if posicion == 1:
+            anterior, siguiente = 0, (rangos[0] if rangos else None)
+        else:
+            anterior = rangos[0] if rangos else None
+            siguiente = rangos[1] if len(rangos) > 1 else None
+
+        if anterior is None:
+            # Posición más allá del final → va al último lugar
+            nuevo = siguiente_orden()
+        elif siguiente is None:
+            nuevo = anterior + ORDEN_PASO
+        elif siguiente - anterior >= 2:
+            nuevo = (anterior + siguiente) // 2
+        else:
+            rebalancear_orden()
+            continue
+
+        Producto.query.filter_by(id=producto_id).update(
+            {"orden": nuevo}, synchronize_session=False
+        )
+        return nuevo
+
+    raise RuntimeError("No fue posible asignar un orden al producto.")
+
+
+def aplicar_orden(ids: list) -> int:
+    """
+    Aplica un orden completo en un solo UPDATE y deja todos los rangos
+    repartidos cada ORDEN_PASO. Los productos que no vienen en la lista
+    quedan después, conservando su orden relativo.
+    """
+    if not ids:
+        return 0
+    lugar = case({int(pid): i for i, pid in enumerate(ids)}, value=Producto.id, else_=len(ids))
+    posicion = func.row_number().over(order_by=(lugar, *orden_productos()))
+    nuevos = select(Producto.id.label("id"), (posicion * ORDEN_PASO).label("orden")).subquery()
+    tabla = Producto.__table__
+    return db.session.execute(
+        update(tabla).where(tabla.c.id == nuevos.c.id).values(orden=nuevos.c.orden)
+    ).rowcount
 
 
 # ======================================================
@@ -158,11 +980,16 @@ def _to_int(value):
 # ======================================================
 # 🎨 CLASES CSS PARA ESTADO DE PRODUCTO
 # ======================================================
-def estado_class(producto):
-    """Devuelve una clase CSS según el stock restante."""
+def estado_class(producto, reposicion=None):
+    """
+    Devuelve una clase CSS según el stock restante. Con el análisis de
+    reposición, "pocas unidades" es llegar al punto de reorden del producto;
+    sin análisis se usa el umbral fijo de 5 unidades.
+    """
+    limite = reposicion.punto_reorden if reposicion is not None else 5
     if producto.unidades_restantes <= 0:
         return "table-danger"   # 🔴 Sin stock
-    elif producto.unidades_restantes <= 5:
+    elif producto.unidades_restantes <= limite:
         return "table-warning"  # 🟡 Pocas unidades
     else:
         return "table-success"  # 🟢 Disponible
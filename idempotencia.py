@@ -0,0 +1,118 @@
+# ======================================================
+# idempotencia.py — reintentos seguros con cabecera Idempotency-Key 🇨🇱
+# ======================================================
+import json
+from datetime import timedelta
+from functools import wraps
+
+from flask import Response, flash, jsonify, make_response, request, session
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from modelos import ClaveIdempotencia
+from tiempo import hora_actual
+
+IDEMPOTENCIA_TTL = timedelta(hours=24)  # Tiempo que se recuerda cada clave
+CABECERA = "Idempotency-Key"
+
+
+def _repetir(registro):
+    """
+    Reconstruye la respuesta original guardada para la clave. Los mensajes
+    flash que dejó la vista se vuelven a mostrar (un redirect sin ellos no
+    confirmaría nada).
+    """
+    for categoria, mensaje in json.loads(registro.mensajes or "[]"):
+        flash(mensaje, categoria)
+    respuesta = Response(
+        registro.respuesta or "",
+        status=registro.status,
+        mimetype=registro.tipo_contenido,
+    )
+    if registro.location:
+        respuesta.headers["Location"] = registro.location
+    respuesta.headers["Idempotent-Replayed"] = "true"
+    return respuesta
+
+
+def _en_proceso():
+    return jsonify({
+        "success": False,
+        "error": "⏳ Esta operación aún se está procesando. Reintenta en un momento."
+    }), 409
+
+
+def idempotente(vista):
+    """
+    Si el POST trae Idempotency-Key, la primera ejecución guarda su respuesta
+    y los reintentos con la misma clave la reciben tal cual, sin escribir nada.
+    La clave se inserta en la misma transacción que la vista: si la vista hace
+    rollback, la clave desaparece y el reintento se ejecuta de nuevo.
+    """
+    @wraps(vista)
+    def wrapper(*args, **kwargs):
+        clave = (request.headers.get(CABECERA) or "").strip()
+        if request.method != "POST" or not clave:
+            return vista(*args, **kwargs)
+        if len(clave) > 100:
+            return jsonify({"success": False, "error": "Idempotency-Key demasiado larga."}), 400
+
+        ahora = hora_actual()
+        previa = (
+            db.session.query(ClaveIdempotencia, (ClaveIdempotencia.expira > ahora).label("vigente"))
+            .filter(ClaveIdempotencia.clave == clave)
+            .first()
+        )
+        if previa:
+            registro, vigente = previa
+            if vigente:
+                if registro.ruta != request.path:
+                    return jsonify({
+                        "success": False,
+                        "error": "Idempotency-Key ya usada en otra operación."
+                    }), 422
+                return _repetir(registro) if registro.status else _en_proceso()
+            db.session.delete(registro)  # Clave vencida: se reutiliza
+
+        db.session.add(ClaveIdempotencia(clave=clave, ruta=request.path, expira=ahora + IDEMPOTENCIA_TTL))
+        try:
+            db.session.flush()
+        except IntegrityError:
+            # Otro worker tomó la misma clave al mismo tiempo
+            db.session.rollback()
+            registro = db.session.get(ClaveIdempotencia, clave)
+            return _repetir(registro) if registro and registro.status else _en_proceso()
+
+        previos = len(session.get("_flashes", []))
+        respuesta = make_response(vista(*args, **kwargs))
+        mensajes = session.get("_flashes", [])[previos:]
+
+        # 💾 Guardar la respuesta solo si la clave sobrevivió (la vista no hizo rollback)
+        registro = db.session.get(ClaveIdempotencia, clave)
+        if registro is not None and not respuesta.is_streamed:
+            registro.status = respuesta.status_code
+            registro.respuesta = respuesta.get_data(as_text=True)
+            registro.tipo_contenido = respuesta.mimetype
+            registro.location = respuesta.headers.get("Location")
+            registro.mensajes = json.dumps([list(m) for m in mensajes]) if mensajes else None
+            db.session.commit()
+
+        return respuesta
+
+    return wrapper
+
+
+def purgar_claves_vencidas(lote: int = 1000) -> int:
+    """Elimina claves vencidas en lotes acotados. Devuelve cuántas borró."""
+    total = 0
+    while True:
+        ids = [
+            c for (c,) in db.session.query(ClaveIdempotencia.clave)
+            .filter(ClaveIdempotencia.expira <= hora_actual())
+            .limit(lote)
+        ]
+        if not ids:
+            return total
+        ClaveIdempotencia.query.filter(ClaveIdempotencia.clave.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        total += len(ids)
@@ -0,0 +1,65 @@
+# ======================================================
+# indice_codigos.py — índice en memoria código → producto 🇨🇱
+# Cada worker lo carga al arrancar. Los códigos no cambian ni se borran,
+# así que el índice solo crece: los productos creados en este worker se
+# agregan tras el commit y los creados en otro se aprenden en el primer
+# fallo (una consulta, una sola vez por código).
+# ======================================================
+import random
+from threading import Lock
+
+from extensions import db
+from modelos import Producto
+
+LOTE_CODIGOS = 20  # Candidatos por intento al generar un código nuevo
+
+_indice = {}
+_cargado = False
+_candado = Lock()
+
+
+def cargar_indice_codigos() -> int:
+    """Lee todos los códigos de una vez y reemplaza el índice. Devuelve cuántos cargó."""
+    global _indice, _cargado
+    nuevo = {codigo: pid for pid, codigo in db.session.query(Producto.id, Producto.codigo)}
+    with _candado:
+        _indice = nuevo
+        _cargado = True
+    return len(nuevo)
+
+
+def registrar_codigos(codigos: dict):
+    """Agrega {codigo: producto_id} de productos recién creados (llamar tras el commit)."""
+    with _candado:
+        _indice.update(codigos)
+
+
+def producto_por_codigo(codigo: str):
+    """id del producto con ese código, o None si no existe."""
+    if not _cargado:
+        cargar_indice_codigos()
+    pid = _indice.get(codigo)
+    if pid is None:
+        # Puede haberlo creado otro worker: se confirma en la base y se recuerda
+        pid = db.session.query(Producto.id).filter(Producto.codigo == codigo).scalar()
+        if pid is not None:
+            registrar_codigos({codigo: pid})
+    return pid
+
+
+def generar_codigo_unico(digitos: int = 6) -> str:
+    """
+    Código numérico libre. Los candidatos se generan por lotes: el índice
+    descarta los conocidos y un solo IN confirma el resto contra la base.
+    """
+    if not _cargado:
+        cargar_indice_codigos()
+    while True:
+        candidatos = {"".join(random.choices("0123456789", k=digitos)) for _ in range(LOTE_CODIGOS)}
+        libres = candidatos - _indice.keys()
+        if not libres:
+            continue
+        tomados = {c for (c,) in db.session.query(Producto.codigo).filter(Producto.codigo.in_(libres))}
+        libres -= tomados
+        if libres:
+            return libres.pop()
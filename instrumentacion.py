@@ -0,0 +1,119 @@
+# ======================================================
+# instrumentacion.py — consultas SQL por request (cantidad y tiempo) 🇨🇱
+# Se cuenta con los eventos del engine de SQLAlchemy. Los requests con
+# demasiadas consultas quedan como advertencia en el log; con LOG_CONSULTAS=1
+# se registran todos, y con CONSULTAS_EN_CABECERA=1 (o en modo debug) las
+# cifras van en las cabeceras X-Consultas-SQL y Server-Timing.
+# ======================================================
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from extensions import db
+
+CABECERA_CONSULTAS = "X-Consultas-SQL"
+ALERTA_CONSULTAS = 30  # Sobre esto el log lo marca como advertencia (posible N+1)
+
+_contadores = []  # Contadores abiertos con contar_consultas() (scripts de verificación)
+
+
+class ContadorConsultas:
+    """Sentencias ejecutadas y tiempo total en la base, en milisegundos."""
+
+    def __init__(self):
+        self.total = 0
+        self.ms = 0.0
+        self.sentencias = []
+
+    def __repr__(self):
+        return f"{self.total} consultas ({self.ms:.1f} ms)"
+
+
+# ======================================================
+# 🎧 EVENTOS DEL ENGINE
+# ======================================================
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+
+def _despues(conn, cursor, statement, parameters, context, executemany):
+    ms = (time.perf_counter() - conn.info["inicio_consulta"].pop()) * 1000
+    contadores = list(_contadores)
+    if has_request_context() and "consultas" in g:
+        contadores.append(g.consultas)
+    for c in contadores:
+        c.total += 1
+        c.ms += ms
+        c.sentencias.append(statement)
+
+
+def registrar_instrumentacion(app):
+    """Cuenta las consultas de cada request, las registra en el log y (opcional) en cabeceras."""
+    app.config.setdefault("CONSULTAS_EN_CABECERA", app.debug or os.environ.get("CONSULTAS_EN_CABECERA") == "1")
+    app.config.setdefault("ALERTA_CONSULTAS", ALERTA_CONSULTAS)
+    if os.environ.get("LOG_CONSULTAS") == "1":
+        app.logger.setLevel(logging.INFO)
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", _antes)
+        event.listen(db.engine, "after_cursor_execute", _despues)
+
+    def _iniciar_conteo():
+        g.consultas = ContadorConsultas()
+        g.inicio_request = time.perf_counter()
+
+    # Primero de la fila: también cuenta lo que hacen los demás before_request (cambio de día)
+    app.before_request_funcs.setdefault(None, []).insert(0, _iniciar_conteo)
+
+    @app.after_request
+    def _informar_conteo(respuesta):
+        c = g.get("consultas")
+        if c is None:
+            return respuesta
+        ms_total = (time.perf_counter() - g.inicio_request) * 1000
+
+        # Las respuestas en streaming siguen consultando después de este punto
+        sufijo = " (streaming: solo hasta el primer byte)" if respuesta.is_streamed else ""
+        mensaje = f"{request.method} {request.path} → {respuesta.status_code} | {c}{sufijo} | {ms_total:.1f} ms"
+        if c.total > app.config["ALERTA_CONSULTAS"]:
+            app.logger.warning("⚠️ Muchas consultas: %s", mensaje)
+        else:
+            app.logger.info(mensaje)
+
+        if app.config["CONSULTAS_EN_CABECERA"]:
+            respuesta.headers[CABECERA_CONSULTAS] = str(c.total)
+            respuesta.headers["Server-Timing"] = f'db;dur={c.ms:.1f};desc="{c.total} consultas", total;dur={ms_total:.1f}'
+        return respuesta
+
+
+# ======================================================
+# 🧪 AYUDAS PARA SCRIPTS DE VERIFICACIÓN
+# ======================================================
+@contextmanager
+def contar_consultas():
+    """Cuenta las consultas ejecutadas dentro del bloque (en este proceso)."""
+    contador = ContadorConsultas()
+    _contadores.append(contador)
+    try:
+        yield contador
+    finally:
+        _contadores.remove(contador)
+
+
+@contextmanager
+def max_consultas(maximo: int, descripcion: str = ""):
+    """
+    Falla (AssertionError) si el bloque ejecuta más de `maximo` consultas.
+    Uso: with max_consultas(6, "GET /"): cliente.get("/")
+    """
+    with contar_consultas() as contador:
+        yield contador
+    if contador.total > maximo:
+        detalle = "\n".join(f"    {s.strip().splitlines()[0][:120]}" for s in contador.sentencias)
+        raise AssertionError(
+            f"{descripcion or 'Bloque'}: {contador.total} consultas (máximo {maximo})\n{detalle}"
+        )
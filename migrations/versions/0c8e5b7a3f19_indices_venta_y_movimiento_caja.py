@@ -0,0 +1,52 @@
+"""Índices por fecha en venta y movimiento_caja (rangos de días)
+
+Revision ID: 0c8e5b7a3f19
+Revises: f3c6a2d98b14
+Create Date: 2026-10-18 21:12:08.640573
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c8e5b7a3f19'
+down_revision = 'f3c6a2d98b14'
+branch_labels = None
+depends_on = None
+
+# historial_inventario ya tiene (fecha, id) y (producto_id, fecha, id) desde d91f4b6e3a27
+INDICES = [
+    ('venta', 'ix_venta_fecha', ['fecha']),
+    ('venta', 'ix_venta_producto_fecha', ['producto_id', 'fecha']),
+    ('movimiento_caja', 'ix_movimiento_caja_tipo_fecha', ['tipo', 'fecha']),
+    ('movimiento_caja', 'ix_movimiento_caja_fecha', ['fecha']),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # db.create_all() en app.py pudo haberlos creado ya
+    faltantes = [
+        (tabla, nombre, columnas) for tabla, nombre, columnas in INDICES
+        if nombre not in {i['name'] for i in inspector.get_indexes(tabla)}
+    ]
+
+    if bind.dialect.name == 'postgresql':
+        # CONCURRENTLY: venta puede tener millones de filas y no se bloquean las ventas
+        # mientras se construye (debe ir fuera de la transacción de la migración)
+        with op.get_context().autocommit_block():
+            for tabla, nombre, columnas in faltantes:
+                op.create_index(nombre, tabla, columnas, unique=False, postgresql_concurrently=True)
+    else:
+        for tabla, nombre, columnas in faltantes:
+            with op.batch_alter_table(tabla, schema=None) as batch_op:
+                batch_op.create_index(nombre, columnas, unique=False)
+
+
+def downgrade():
+    for tabla, nombre, _ in reversed(INDICES):
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            batch_op.drop_index(nombre)
@@ -0,0 +1,41 @@
+"""Crear tabla venta_diaria (contadores por producto y día)
+
+Revision ID: 3b7c1e9a4d20
+Revises: 68fae1f9aee6
+Create Date: 2026-10-18 09:12:40.118204
+
+Después de aplicar: `flask reconstruir-ventas-diarias` para poblarla desde Venta.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7c1e9a4d20'
+down_revision = '68fae1f9aee6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() en app.py pudo haberla creado ya
+    if sa.inspect(op.get_bind()).has_table('venta_diaria'):
+        return
+
+    op.create_table('venta_diaria',
+        sa.Column('producto_id', sa.Integer(), nullable=False),
+        sa.Column('dia', sa.Date(), nullable=False),
+        sa.Column('unidades', sa.Integer(), nullable=False),
+        sa.Column('ingreso', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['producto_id'], ['producto.id'], ),
+        sa.PrimaryKeyConstraint('producto_id', 'dia')
+    )
+    with op.batch_alter_table('venta_diaria', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_venta_diaria_dia'), ['dia'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('venta_diaria', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_venta_diaria_dia'))
+
+    op.drop_table('venta_diaria')
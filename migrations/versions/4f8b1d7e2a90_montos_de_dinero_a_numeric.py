@@ -0,0 +1,58 @@
+"""Montos de dinero de Float a Numeric(14, 2)
+
+Revision ID: 4f8b1d7e2a90
+Revises: e7a2c9d41b56
+Create Date: 2026-10-18 16:20:13.507391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f8b1d7e2a90'
+down_revision = 'e7a2c9d41b56'
+branch_labels = None
+depends_on = None
+
+
+# tabla → (columna, nullable)
+MONTOS = {
+    'producto': [('valor_unitario', False), ('valor_vendido_dia', True)],
+    'venta': [('ingreso', False)],
+    'venta_diaria': [('ingreso', False)],
+    'movimiento_caja': [('monto', False)],
+    'liquidacion': [('entrada', True), ('salida', True), ('caja', True), ('inventario_valor', True)],
+    'liquidacion_producto': [
+        ('caja_anterior', True), ('ventas_dia', True), ('entradas', True), ('salidas', True),
+        ('caja_dia', True), ('caja_total', True), ('inventario_total', True),
+    ],
+    'estado_sistema': [('valor', True)],
+    'historial_inventario': [('valor_total', True)],
+}
+
+
+def upgrade():
+    for tabla, columnas in MONTOS.items():
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            for columna, nullable in columnas:
+                batch_op.alter_column(
+                    columna,
+                    existing_type=sa.Float(),
+                    type_=sa.Numeric(precision=14, scale=2),
+                    existing_nullable=nullable,
+                    postgresql_using=f'round({columna}::numeric, 2)',
+                )
+
+
+def downgrade():
+    for tabla, columnas in MONTOS.items():
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            for columna, nullable in columnas:
+                batch_op.alter_column(
+                    columna,
+                    existing_type=sa.Numeric(precision=14, scale=2),
+                    type_=sa.Float(),
+                    existing_nullable=nullable,
+                    postgresql_using=f'{columna}::double precision',
+                )
@@ -0,0 +1,31 @@
+"""Agregar columna mensajes a clave_idempotencia (flash de la respuesta guardada)
+
+Revision ID: 5a9d3e71c2b8
+Revises: 0c8e5b7a3f19
+Create Date: 2026-10-18 22:37:15.904211
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a9d3e71c2b8'
+down_revision = '0c8e5b7a3f19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() en app.py pudo haberla creado ya (base nueva)
+    columnas = [c['name'] for c in sa.inspect(op.get_bind()).get_columns('clave_idempotencia')]
+    if 'mensajes' in columnas:
+        return
+
+    with op.batch_alter_table('clave_idempotencia', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('mensajes', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('clave_idempotencia', schema=None) as batch_op:
+        batch_op.drop_column('mensajes')
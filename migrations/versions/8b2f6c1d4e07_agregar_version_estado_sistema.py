@@ -0,0 +1,36 @@
+"""Agregar columna version (entera) a estado_sistema para la versión de productos
+
+Revision ID: 8b2f6c1d4e07
+Revises: 5a9d3e71c2b8
+Create Date: 2026-10-18 23:48:02.517306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2f6c1d4e07'
+down_revision = '5a9d3e71c2b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() en app.py pudo haberla creado ya (base nueva)
+    columnas = [c['name'] for c in sa.inspect(op.get_bind()).get_columns('estado_sistema')]
+    if 'version' not in columnas:
+        with op.batch_alter_table('estado_sistema', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.BigInteger(), nullable=True))
+
+    # La versión de productos se guardaba en valor (Dinero): pasa a la columna entera
+    op.execute(
+        "UPDATE estado_sistema SET version = CAST(ROUND(valor) AS BIGINT), valor = 0 "
+        "WHERE clave = 'productos_version' AND version IS NULL"
+    )
+
+
+def downgrade():
+    op.execute("UPDATE estado_sistema SET valor = version WHERE clave = 'productos_version'")
+    with op.batch_alter_table('estado_sistema', schema=None) as batch_op:
+        batch_op.drop_column('version')
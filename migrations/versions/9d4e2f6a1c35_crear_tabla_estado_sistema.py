@@ -0,0 +1,33 @@
+"""Crear tabla estado_sistema (marcadores como el cambio de día)
+
+Revision ID: 9d4e2f6a1c35
+Revises: 3b7c1e9a4d20
+Create Date: 2026-10-18 10:05:12.503117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4e2f6a1c35'
+down_revision = '3b7c1e9a4d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() en app.py pudo haberla creado ya
+    if sa.inspect(op.get_bind()).has_table('estado_sistema'):
+        return
+
+    op.create_table('estado_sistema',
+        sa.Column('clave', sa.String(length=50), nullable=False),
+        sa.Column('fecha', sa.Date(), nullable=True),
+        sa.Column('valor', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('clave')
+    )
+
+
+def downgrade():
+    op.drop_table('estado_sistema')
@@ -0,0 +1,49 @@
+"""Crear tablas resumen_diario y venta_mensual (gráficos del panel)
+
+Revision ID: a6d3f0b85c17
+Revises: 4f8b1d7e2a90
+Create Date: 2026-10-18 17:45:26.880412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d3f0b85c17'
+down_revision = '4f8b1d7e2a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    # db.create_all() en app.py pudo haberlas creado ya
+    if not inspector.has_table('resumen_diario'):
+        op.create_table('resumen_diario',
+            sa.Column('dia', sa.Date(), nullable=False),
+            sa.Column('unidades', sa.Integer(), nullable=False),
+            sa.Column('ingreso', sa.Numeric(precision=14, scale=2), nullable=False),
+            sa.PrimaryKeyConstraint('dia')
+        )
+
+    if not inspector.has_table('venta_mensual'):
+        op.create_table('venta_mensual',
+            sa.Column('producto_id', sa.Integer(), nullable=False),
+            sa.Column('mes', sa.Date(), nullable=False),
+            sa.Column('unidades', sa.Integer(), nullable=False),
+            sa.Column('ingreso', sa.Numeric(precision=14, scale=2), nullable=False),
+            sa.ForeignKeyConstraint(['producto_id'], ['producto.id'], ),
+            sa.PrimaryKeyConstraint('producto_id', 'mes')
+        )
+        with op.batch_alter_table('venta_mensual', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_venta_mensual_mes'), ['mes'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('venta_mensual', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_venta_mensual_mes'))
+
+    op.drop_table('venta_mensual')
+    op.drop_table('resumen_diario')
@@ -0,0 +1,37 @@
+"""Crear tabla reposicion_producto (análisis de velocidad y reposición)
+
+Revision ID: b2e5c8a14f63
+Revises: a6d3f0b85c17
+Create Date: 2026-10-18 18:32:10.514207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e5c8a14f63'
+down_revision = 'a6d3f0b85c17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    # db.create_all() en app.py pudo haberla creado ya
+    if not inspector.has_table('reposicion_producto'):
+        op.create_table('reposicion_producto',
+            sa.Column('producto_id', sa.Integer(), nullable=False),
+            sa.Column('velocidad', sa.Float(), nullable=False),
+            sa.Column('dias_cobertura', sa.Float(), nullable=True),
+            sa.Column('punto_reorden', sa.Integer(), nullable=False),
+            sa.Column('sugerido', sa.Integer(), nullable=False),
+            sa.Column('calculado', sa.DateTime(timezone=False), nullable=True),
+            sa.ForeignKeyConstraint(['producto_id'], ['producto.id'], ),
+            sa.PrimaryKeyConstraint('producto_id')
+        )
+
+
+def downgrade():
+    op.drop_table('reposicion_producto')
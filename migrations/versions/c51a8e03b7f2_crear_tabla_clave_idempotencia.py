@@ -0,0 +1,42 @@
+"""Crear tabla clave_idempotencia (reintentos seguros de POST)
+
+Revision ID: c51a8e03b7f2
+Revises: 9d4e2f6a1c35
+Create Date: 2026-10-18 11:31:07.664029
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c51a8e03b7f2'
+down_revision = '9d4e2f6a1c35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() en app.py pudo haberla creado ya
+    if sa.inspect(op.get_bind()).has_table('clave_idempotencia'):
+        return
+
+    op.create_table('clave_idempotencia',
+        sa.Column('clave', sa.String(length=100), nullable=False),
+        sa.Column('ruta', sa.String(length=200), nullable=False),
+        sa.Column('status', sa.Integer(), nullable=True),
+        sa.Column('respuesta', sa.Text(), nullable=True),
+        sa.Column('tipo_contenido', sa.String(length=100), nullable=True),
+        sa.Column('location', sa.String(length=500), nullable=True),
+        sa.Column('expira', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('clave')
+    )
+    with op.batch_alter_table('clave_idempotencia', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_clave_idempotencia_expira'), ['expira'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('clave_idempotencia', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_clave_idempotencia_expira'))
+
+    op.drop_table('clave_idempotencia')
@@ -0,0 +1,36 @@
+"""Índices (fecha, id) y (producto_id, fecha, id) en historial_inventario
+
+Revision ID: d91f4b6e3a27
+Revises: b2e5c8a14f63
+Create Date: 2026-10-18 19:20:41.093615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd91f4b6e3a27'
+down_revision = 'b2e5c8a14f63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    existentes = {i['name'] for i in inspector.get_indexes('historial_inventario')}
+
+    # db.create_all() en app.py pudo haberlos creado ya
+    with op.batch_alter_table('historial_inventario', schema=None) as batch_op:
+        if 'ix_historial_inventario_fecha_id' not in existentes:
+            batch_op.create_index('ix_historial_inventario_fecha_id', ['fecha', 'id'], unique=False)
+        if 'ix_historial_inventario_producto_fecha_id' not in existentes:
+            batch_op.create_index(
+                'ix_historial_inventario_producto_fecha_id', ['producto_id', 'fecha', 'id'], unique=False
+            )
+
+
+def downgrade():
+    with op.batch_alter_table('historial_inventario', schema=None) as batch_op:
+        batch_op.drop_index('ix_historial_inventario_producto_fecha_id')
+        batch_op.drop_index('ix_historial_inventario_fecha_id')
@@ -0,0 +1,31 @@
+"""Agregar columna cerrada a liquidacion_producto (cierre de día)
+
+Revision ID: e7a2c9d41b56
+Revises: c51a8e03b7f2
+Create Date: 2026-10-18 15:02:44.218730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2c9d41b56'
+down_revision = 'c51a8e03b7f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() en app.py pudo haberla creado ya (base nueva)
+    columnas = [c['name'] for c in sa.inspect(op.get_bind()).get_columns('liquidacion_producto')]
+    if 'cerrada' in columnas:
+        return
+
+    with op.batch_alter_table('liquidacion_producto', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cerrada', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('liquidacion_producto', schema=None) as batch_op:
+        batch_op.drop_column('cerrada')
@@ -0,0 +1,58 @@
+"""Crear tabla inventario_archivado (saldo de entradas fuera del historial)
+
+Revision ID: f3c6a2d98b14
+Revises: d91f4b6e3a27
+Create Date: 2026-10-18 20:41:57.302118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c6a2d98b14'
+down_revision = 'd91f4b6e3a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # db.create_all() en app.py pudo haberla creado ya
+    if not inspector.has_table('inventario_archivado'):
+        op.create_table('inventario_archivado',
+            sa.Column('producto_id', sa.Integer(), nullable=False),
+            sa.Column('cantidad', sa.Integer(), nullable=False),
+            sa.Column('valor_total', sa.Numeric(precision=14, scale=2), nullable=False),
+            sa.ForeignKeyConstraint(['producto_id'], ['producto.id'], ),
+            sa.PrimaryKeyConstraint('producto_id')
+        )
+
+    # 📒 Saldo de apertura: lo que explica el stock actual (unidades_restantes
+    #    + vendidas) y el historial ya no muestra. Se parte del stock real y no
+    #    de stock_inicial: este aún suma entradas que se eliminaron a propósito
+    if bind.execute(sa.text('SELECT COUNT(*) FROM inventario_archivado')).scalar() == 0:
+        op.execute("""
+            INSERT INTO inventario_archivado (producto_id, cantidad, valor_total)
+            SELECT p.id, s.cantidad, ROUND(s.cantidad * p.valor_unitario, 2)
+            FROM producto p
+            JOIN (
+                SELECT p2.id,
+                       COALESCE(p2.unidades_restantes, 0) + COALESCE(v.cantidad, 0) - COALESCE(h.cantidad, 0)
+                           AS cantidad
+                FROM producto p2
+                LEFT JOIN (
+                    SELECT producto_id, SUM(cantidad) AS cantidad FROM venta GROUP BY producto_id
+                ) v ON v.producto_id = p2.id
+                LEFT JOIN (
+                    SELECT producto_id, SUM(cantidad) AS cantidad FROM historial_inventario GROUP BY producto_id
+                ) h ON h.producto_id = p2.id
+            ) s ON s.id = p.id
+            WHERE s.cantidad > 0
+        """)
+
+
+def downgrade():
+    op.drop_table('inventario_archivado')
@@ -2,6 +2,10 @@ from datetime import date
 from extensions import db
 from tiempo import hora_actual  # ✅ Devuelve hora chilena sin tzinfo
 
+# 💲 Montos de dinero: NUMERIC exacto en la base (sumas sin error de redondeo),
+#    se leen como float para no cambiar el resto del código ni las plantillas
+Dinero = db.Numeric(14, 2, asdecimal=False)
+
 # ======================================================
 # 🏷️ PRODUCTO
 # ======================================================
@@ -12,12 +16,12 @@ class Producto(db.Model):
     orden = db.Column(db.Integer, nullable=True)
     stock_inicial = db.Column(db.Integer, default=0)
     unidades_restantes = db.Column(db.Integer, default=0)
-    valor_unitario = db.Column(db.Float, nullable=False)
+    valor_unitario = db.Column(Dinero, nullable=False)
     interes = db.Column(db.Float, default=0)
     fecha = db.Column(db.Date, default=date.today)
 
     vendidas_dia = db.Column(db.Integer, default=0)
-    valor_vendido_dia = db.Column(db.Float, default=0.0)
+    valor_vendido_dia = db.Column(Dinero, default=0.0)
 
     # 🔥 Relación con historial — elimina todo al borrar producto
     historial_inventario = db.relationship(
@@ -35,10 +39,58 @@ class Venta(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     producto_id = db.Column(db.Integer, db.ForeignKey("producto.id"), nullable=False)
     cantidad = db.Column(db.Integer, nullable=False)
-    ingreso = db.Column(db.Float, nullable=False)
+    ingreso = db.Column(Dinero, nullable=False)
     fecha = db.Column(db.DateTime(timezone=False), default=hora_actual)  # ✅ Hora real de Chile (naive)
     producto = db.relationship("Producto", backref="ventas")
 
+    # 📑 Rangos de días: todas las ventas y las de un producto
+    __table_args__ = (
+        db.Index("ix_venta_fecha", "fecha"),
+        db.Index("ix_venta_producto_fecha", "producto_id", "fecha"),
+    )
+
+
+# ======================================================
+# 📆 VENTAS DIARIAS POR PRODUCTO (contadores)
+# ======================================================
+class VentaDiaria(db.Model):
+    """Totales vendidos por producto y día local (se reconstruye desde Venta)."""
+    producto_id = db.Column(db.Integer, db.ForeignKey("producto.id"), primary_key=True)
+    dia = db.Column(db.Date, primary_key=True, index=True)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingreso = db.Column(Dinero, nullable=False, default=0.0)
+
+
+# ======================================================
+# 📈 RESÚMENES DE VENTAS (por día y por mes)
+# ======================================================
+class ResumenDiario(db.Model):
+    """Totales vendidos de todos los productos por día local (se reconstruye desde VentaDiaria)."""
+    dia = db.Column(db.Date, primary_key=True)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingreso = db.Column(Dinero, nullable=False, default=0.0)
+
+
+class VentaMensual(db.Model):
+    """Totales vendidos por producto y mes; `mes` es el primer día del mes."""
+    producto_id = db.Column(db.Integer, db.ForeignKey("producto.id"), primary_key=True)
+    mes = db.Column(db.Date, primary_key=True, index=True)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingreso = db.Column(Dinero, nullable=False, default=0.0)
+
+
+# ======================================================
+# 🔁 REPOSICIÓN SUGERIDA (la calcula `flask analizar-reposicion`)
+# ======================================================
+class ReposicionProducto(db.Model):
+    """Velocidad de venta, días de cobertura y reposición sugerida por producto."""
+    producto_id = db.Column(db.Integer, db.ForeignKey("producto.id"), primary_key=True)
+    velocidad = db.Column(db.Float, nullable=False, default=0.0)        # Unidades por día (media móvil)
+    dias_cobertura = db.Column(db.Float, nullable=True)                 # None: no se está vendiendo
+    punto_reorden = db.Column(db.Integer, nullable=False, default=0)    # Stock que dispara la reposición
+    sugerido = db.Column(db.Integer, nullable=False, default=0)         # Unidades a pedir
+    calculado = db.Column(db.DateTime(timezone=False), default=hora_actual)
+
 
 # ======================================================
 # 💰 MOVIMIENTO DE CAJA
@@ -46,10 +98,16 @@ class Venta(db.Model):
 class MovimientoCaja(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     tipo = db.Column(db.String(20), nullable=False)
-    monto = db.Column(db.Float, nullable=False)
+    monto = db.Column(Dinero, nullable=False)
     descripcion = db.Column(db.String(255), nullable=True)
     fecha = db.Column(db.DateTime(timezone=False), default=hora_actual)  # ✅ Hora chilena exacta
 
+    # 📑 Rangos de días: por tipo (entradas / salidas del día) y sin tipo (liquidación, exportación)
+    __table_args__ = (
+        db.Index("ix_movimiento_caja_tipo_fecha", "tipo", "fecha"),
+        db.Index("ix_movimiento_caja_fecha", "fecha"),
+    )
+
 
 # ======================================================
 # 📊 LIQUIDACIÓN
@@ -57,10 +115,10 @@ class MovimientoCaja(db.Model):
 class Liquidacion(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     fecha = db.Column(db.Date, unique=True, nullable=False)
-    entrada = db.Column(db.Float, default=0.0)
-    salida = db.Column(db.Float, default=0.0)
-    caja = db.Column(db.Float, default=0.0)
-    inventario_valor = db.Column(db.Float, default=0.0)
+    entrada = db.Column(Dinero, default=0.0)
+    salida = db.Column(Dinero, default=0.0)
+    caja = db.Column(Dinero, default=0.0)
+    inventario_valor = db.Column(Dinero, default=0.0)
 
 
 # ======================================================
@@ -71,15 +129,42 @@ class LiquidacionProducto(db.Model):
     fecha = db.Column(db.Date, unique=True, nullable=False)
 
     # 💰 Caja y movimientos
-    caja_anterior = db.Column(db.Float, default=0.0)           # Caja del día anterior
-    ventas_dia = db.Column(db.Float, default=0.0)               # Total de ventas del día
-    entradas = db.Column(db.Float, default=0.0)                 # Entradas de efectivo manuales
-    salidas = db.Column(db.Float, default=0.0)                  # Salidas de efectivo (gastos, etc.)
-    caja_dia = db.Column(db.Float, default=0.0)                 # Caja actual del día
-    caja_total = db.Column(db.Float, default=0.0)               # Caja total acumulada (histórica)
+    caja_anterior = db.Column(Dinero, default=0.0)           # Caja del día anterior
+    ventas_dia = db.Column(Dinero, default=0.0)               # Total de ventas del día
+    entradas = db.Column(Dinero, default=0.0)                 # Entradas de efectivo manuales
+    salidas = db.Column(Dinero, default=0.0)                  # Salidas de efectivo (gastos, etc.)
+    caja_dia = db.Column(Dinero, default=0.0)                 # Caja actual del día
+    caja_total = db.Column(Dinero, default=0.0)               # Caja total acumulada (histórica)
     
     # 📦 Inventario
-    inventario_total = db.Column(db.Float, default=0.0)
+    inventario_total = db.Column(Dinero, default=0.0)
+
+    # 🔒 Día cerrado: sus valores ya no se recalculan
+    cerrada = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+
+# ======================================================
+# ⚙️ ESTADO DEL SISTEMA (marcadores clave → valor)
+# ======================================================
+class EstadoSistema(db.Model):
+    clave = db.Column(db.String(50), primary_key=True)
+    fecha = db.Column(db.Date, nullable=True)
+    valor = db.Column(Dinero, default=0.0)
+    version = db.Column(db.BigInteger, nullable=True)    # Contadores enteros (p. ej. productos_version)
+
+
+# ======================================================
+# 🔑 CLAVES DE IDEMPOTENCIA (reintentos seguros de POST)
+# ======================================================
+class ClaveIdempotencia(db.Model):
+    clave = db.Column(db.String(100), primary_key=True)
+    ruta = db.Column(db.String(200), nullable=False)
+    status = db.Column(db.Integer, nullable=True)              # None = aún en proceso
+    respuesta = db.Column(db.Text, nullable=True)
+    tipo_contenido = db.Column(db.String(100), nullable=True)
+    location = db.Column(db.String(500), nullable=True)
+    mensajes = db.Column(db.Text, nullable=True)              # JSON [[categoría, mensaje]] de flash()
+    expira = db.Column(db.DateTime(timezone=False), nullable=False, index=True)
 
 
 # ======================================================
@@ -89,6 +174,26 @@ class HistorialInventario(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     producto_id = db.Column(db.Integer, db.ForeignKey("producto.id"), nullable=False)
     cantidad = db.Column(db.Integer, nullable=False)
-    valor_total = db.Column(db.Float, nullable=True)
+    valor_total = db.Column(Dinero, nullable=True)
     fecha = db.Column(db.DateTime(timezone=False), default=hora_actual)  # ✅ Hora chilena real
     producto = db.relationship("Producto", back_populates="historial_inventario")
+
+    # 📑 Paginación por cursor (fecha, id), general y por producto
+    __table_args__ = (
+        db.Index("ix_historial_inventario_fecha_id", "fecha", "id"),
+        db.Index("ix_historial_inventario_producto_fecha_id", "producto_id", "fecha", "id"),
+    )
+
+
+# ======================================================
+# 🗄️ INVENTARIO ARCHIVADO (entradas que ya no están en el historial)
+# ======================================================
+class InventarioArchivado(db.Model):
+    """
+    Unidades ingresadas por producto que ya salieron de historial_inventario:
+    las que archiva `flask retencion` más el saldo de apertura de la
+    migración. Con el historial forman el libro de entradas de la conciliación.
+    """
+    producto_id = db.Column(db.Integer, db.ForeignKey("producto.id"), primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    valor_total = db.Column(Dinero, nullable=False, default=0.0)
@@ -0,0 +1,205 @@
+# ======================================================
+# recepcion.py — recepción masiva de inventario por CSV 🇨🇱
+# Una entrega completa del proveedor en un request y una transacción,
+# con un número fijo de sentencias sin importar cuántas líneas traiga.
+# ======================================================
+import csv
+import io
+
+from sqlalchemy import case, func, update
+
+from extensions import db
+from helpers import (
+    CLAVE_INVENTARIO, ORDEN_PASO, PANEL_PRODUCTOS, siguiente_orden, sumar_estado, valor_con_interes
+)
+from modelos import Producto, HistorialInventario
+from tiempo import hora_actual, local_date
+
+MAX_LINEAS_RECEPCION = 10000
+COLUMNAS = ("codigo", "cantidad", "nombre", "valor_unitario", "interes")
+
+_producto = Producto.__table__
+
+
+class RecepcionRechazada(Exception):
+    """Archivo de recepción que no se puede procesar (vacío, demasiado grande, etc.)."""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status = status
+
+
+# ======================================================
+# 📄 LECTURA DEL CSV
+# ======================================================
+def _filas_csv(texto: str):
+    """
+    Filas del CSV como dicts. Acepta ',' o ';' y encabezado opcional; sin
+    encabezado las columnas son codigo,cantidad[,nombre,valor_unitario,interes].
+    Devuelve [(número de línea, fila)].
+    """
+    texto = texto.lstrip("\ufeff")
+    try:
+        dialecto = csv.Sniffer().sniff(texto[:4096], delimiters=",;")
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(io.StringIO(texto), dialecto)
+
+    filas, columnas = [], COLUMNAS
+    for n, valores in enumerate(lector, start=1):
+        valores = [v.strip() for v in valores]
+        if not any(valores):
+            continue
+        if n == 1 and valores[0].lower() in ("codigo", "código"):
+            columnas = [v.lower().replace("ó", "o") for v in valores]
+            continue
+        filas.append((n, dict(zip(columnas, valores))))
+        if len(filas) > MAX_LINEAS_RECEPCION:
+            raise RecepcionRechazada(f"El archivo supera las {MAX_LINEAS_RECEPCION} líneas.", 413)
+    return filas
+
+
+def _numero(valor, tipo):
+    return tipo(str(valor).replace(",", "."))
+
+
+def _parsear(fila: dict) -> dict:
+    """Valida una fila; lanza ValueError con el motivo si no sirve."""
+    codigo = (fila.get("codigo") or "").strip()
+    if not codigo or len(codigo) > 50:
+        raise ValueError("Código vacío o demasiado largo.")
+    try:
+        cantidad = _numero(fila.get("cantidad") or "", float)
+    except ValueError:
+        raise ValueError("Cantidad inválida.")
+    if cantidad <= 0 or cantidad != int(cantidad):
+        raise ValueError("La cantidad debe ser un entero mayor a cero.")
+
+    nuevo = None
+    nombre = (fila.get("nombre") or "").strip().upper()
+    if nombre:
+        try:
+            nuevo = {
+                "nombre": nombre[:100],
+                "valor_unitario": _numero(fila.get("valor_unitario") or "", float),
+                "interes": _numero(fila.get("interes") or 0, float),
+            }
+        except ValueError:
+            raise ValueError("Precio o interés inválido para el producto nuevo.")
+        if nuevo["valor_unitario"] < 0:
+            raise ValueError("El precio no puede ser negativo.")
+    return {"codigo": codigo, "cantidad": int(cantidad), "nuevo": nuevo}
+
+
+# ======================================================
+# 📥 RECEPCIÓN
+# ======================================================
+def recibir_csv(texto: str) -> dict:
+    """
+    Aplica una recepción completa en la transacción actual:
+      - 1 SELECT con IN para resolver todos los códigos,
+      - 1 INSERT masivo de los productos nuevos (si los hay),
+      - 1 UPDATE con CASE para sumar el stock de todos los productos,
+      - 1 INSERT masivo del historial y 1 UPDATE de los totales del panel.
+    Las líneas inválidas se informan y no impiden aplicar las demás.
+    No hace commit.
+    """
+    filas = _filas_csv(texto)
+    if not filas:
+        raise RecepcionRechazada("El archivo no tiene líneas.")
+
+    reporte = [None] * len(filas)
+    validas = []
+    for i, (n, fila) in enumerate(filas):
+        try:
+            validas.append((i, n, _parsear(fila)))
+        except ValueError as e:
+            reporte[i] = {"linea": n, "ok": False, "codigo": fila.get("codigo"), "error": str(e)}
+
+    # 🔎 Todos los códigos en una consulta (bloqueando las filas hasta el commit)
+    codigos = {l["codigo"] for _, _, l in validas}
+    existentes = {
+        p.codigo: p for p in
+        db.session.query(Producto.id, Producto.codigo, Producto.nombre, Producto.valor_unitario, Producto.interes)
+        .filter(Producto.codigo.in_(codigos))
+        .with_for_update()
+    } if codigos else {}
+
+    # 🆕 Códigos desconocidos: se crean si la línea trae nombre y precio
+    por_crear = {}
+    for i, n, linea in validas:
+        if linea["codigo"] in existentes or linea["codigo"] in por_crear:
+            continue
+        if linea["nuevo"] is None:
+            reporte[i] = {"linea": n, "ok": False, "codigo": linea["codigo"],
+                          "error": "Producto no encontrado (agrega nombre y valor_unitario para crearlo)."}
+            continue
+        por_crear[linea["codigo"]] = linea["nuevo"]
+
+    creados = set()
+    if por_crear:
+        orden = siguiente_orden()
+        hoy = local_date()
+        nuevos = db.session.execute(
+            _producto.insert().returning(
+                _producto.c.id, _producto.c.codigo, _producto.c.nombre, _producto.c.valor_unitario, _producto.c.interes,
+                sort_by_parameter_order=True,
+            ),
+            [
+                {"codigo": codigo, "orden": orden + k * ORDEN_PASO, "stock_inicial": 0,
+                 "unidades_restantes": 0, "fecha": hoy, **datos}
+                for k, (codigo, datos) in enumerate(por_crear.items())
+            ],
+        ).all()
+        existentes.update({p.codigo: p for p in nuevos})
+        creados = set(por_crear)
+
+    aceptadas = [(i, n, l) for i, n, l in validas if reporte[i] is None and l["codigo"] in existentes]
+    if not aceptadas:
+        return _resumen(reporte, creados, 0, 0)
+
+    # 📦 Stock de todos los productos con un solo UPDATE
+    sumar = {}
+    for _, _, linea in aceptadas:
+        pid = existentes[linea["codigo"]].id
+        sumar[pid] = sumar.get(pid, 0) + linea["cantidad"]
+    cantidad = case(sumar, value=_producto.c.id)
+    stock = dict(db.session.execute(
+        update(_producto)
+        .where(_producto.c.id.in_(sumar))
+        .values(
+            unidades_restantes=func.coalesce(_producto.c.unidades_restantes, 0) + cantidad,
+            stock_inicial=func.coalesce(_producto.c.stock_inicial, 0) + cantidad,
+        )
+        .returning(_producto.c.id, _producto.c.unidades_restantes)
+    ).all())
+
+    # 🕒 Historial: una fila por línea del archivo
+    ahora = hora_actual()
+    historial, valor_inventario = [], 0.0
+    for i, n, linea in aceptadas:
+        p = existentes[linea["codigo"]]
+        valor_total = round(float(p.valor_unitario or 0) * linea["cantidad"], 2)
+        valor_inventario += valor_con_interes(linea["cantidad"], float(p.valor_unitario or 0), p.interes)
+        historial.append({"producto_id": p.id, "cantidad": linea["cantidad"],
+                          "valor_total": valor_total, "fecha": ahora})
+        reporte[i] = {
+            "linea": n, "ok": True, "codigo": linea["codigo"], "producto_id": p.id, "nombre": p.nombre,
+            "cantidad": linea["cantidad"], "valor_total": valor_total,
+            "nuevo": linea["codigo"] in creados, "stock": stock[p.id],
+        }
+    db.session.execute(HistorialInventario.__table__.insert(), historial)
+
+    sumar_estado({PANEL_PRODUCTOS: len(creados), CLAVE_INVENTARIO: round(valor_inventario, 2)})
+    return _resumen(reporte, creados, sum(sumar.values()), len(aceptadas))
+
+
+def _resumen(reporte, creados, unidades, aplicadas) -> dict:
+    return {
+        "lineas": reporte,
+        "aplicadas": aplicadas,
+        "rechazadas": sum(1 for r in reporte if not r["ok"]),
+        "productos_creados": len(creados),
+        "unidades": unidades,
+    }
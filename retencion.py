@@ -0,0 +1,93 @@
+# ======================================================
+# retencion.py — archivo y limpieza del historial de inventario 🇨🇱
+# Corre fuera de los requests (flask retencion, por cron). Las filas
+# vencidas se copian primero a un .jsonl.gz en instance/archivo/ y recién
+# después se borran, en lotes acotados con un commit por lote. Las unidades
+# borradas se suman a inventario_archivado para que la conciliación de stock
+# siga cuadrando.
+# ======================================================
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from flask import current_app
+
+from extensions import db
+from helpers import sumar_en
+from modelos import HistorialInventario, InventarioArchivado, Producto
+from tiempo import hora_actual
+
+RETENCION_HISTORIAL = timedelta(days=90)  # Lo que se conserva en la base
+LOTE_RETENCION = 1000                     # Filas por lote (una transacción corta cada uno)
+CARPETA_ARCHIVO = "archivo"               # Dentro de instance/
+
+
+def _carpeta_archivo() -> str:
+    carpeta = os.path.join(current_app.instance_path, CARPETA_ARCHIVO)
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+
+def _linea(h, codigo, nombre) -> str:
+    return json.dumps({
+        "id": h.id,
+        "producto_id": h.producto_id,
+        "codigo": codigo,
+        "nombre": nombre,
+        "cantidad": h.cantidad,
+        "valor_total": float(h.valor_total) if h.valor_total is not None else None,
+        "fecha": h.fecha.isoformat() if h.fecha else None,
+    }, ensure_ascii=False)
+
+
+def archivar_historial_vencido(retencion: timedelta = RETENCION_HISTORIAL, lote: int = LOTE_RETENCION):
+    """
+    Archiva y elimina las entradas de inventario más antiguas que `retencion`.
+    Cada lote se escribe y sincroniza a disco antes de borrarse: si el proceso
+    se corta, lo peor es que un lote quede repetido en el archivo (cada línea
+    lleva su id). Devuelve (filas archivadas, ruta del archivo o None).
+    """
+    limite = hora_actual() - retencion
+    ruta = os.path.join(
+        _carpeta_archivo(), f"historial_inventario_{hora_actual():%Y%m%d_%H%M%S}.jsonl.gz"
+    )
+    total = 0
+    ultimo_id = 0
+
+    while True:
+        filas = (
+            db.session.query(HistorialInventario, Producto.codigo, Producto.nombre)
+            .outerjoin(Producto, Producto.id == HistorialInventario.producto_id)
+            .filter(HistorialInventario.fecha < limite, HistorialInventario.id > ultimo_id)
+            .order_by(HistorialInventario.id)
+            .limit(lote)
+            .all()
+        )
+        if not filas:
+            break
+
+        # 📦 Primero al archivo (cada lote es un miembro gzip; el archivo se lee entero con gzip.open)
+        with open(ruta, "ab") as destino:
+            with gzip.GzipFile(fileobj=destino, mode="wb") as comprimido:
+                comprimido.write("".join(_linea(*f) + "\n" for f in filas).encode("utf-8"))
+            destino.flush()
+            os.fsync(destino.fileno())
+
+        # 🧹 Después se borra el mismo lote; sus unidades pasan al saldo archivado del producto
+        ids = [h.id for h, _, _ in filas]
+        archivado = {}
+        for h, _, _ in filas:
+            cantidad, valor = archivado.get(h.producto_id, (0, 0.0))
+            archivado[h.producto_id] = (cantidad + h.cantidad, valor + float(h.valor_total or 0))
+        sumar_en(InventarioArchivado, ["producto_id"], [
+            {"producto_id": pid, "cantidad": cantidad, "valor_total": round(valor, 2)}
+            for pid, (cantidad, valor) in sorted(archivado.items())
+        ])
+        HistorialInventario.query.filter(HistorialInventario.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+        total += len(ids)
+        ultimo_id = ids[-1]
+
+    return total, (ruta if total else None)
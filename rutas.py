@@ -1,9 +1,14 @@
 # ======================================================
 # rutas.py — versión FINAL (Aitana System, hora Chile 🇨🇱)
 # ======================================================
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import (
+    Blueprint, render_template, request, redirect, url_for, flash, session, jsonify,
+    Response, stream_with_context
+)
 from datetime import date, timedelta, datetime, time
-from sqlalchemy import func
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload
 from extensions import db
 from modelos import Producto, Venta, MovimientoCaja, Liquidacion, LiquidacionProducto, HistorialInventario
 from helpers import (
@@ -12,9 +17,43 @@ from helpers import (
     calcular_entradas,        # ✅ reemplaza calcular_entrada_inventario
     calcular_salidas,         # ✅ agrega esta para salidas de efectivo
     caja_base_del_dia,
+    liquidacion_por_rango,
+    asegurar_cambio_de_dia,
+    dia_local,
+    registrar_caja,
+    cerrar_dia,
+    HORA_CIERRE,
+    ultimo_dia_cerrado,
+    DiaCerrado,
+    aplicar_orden,
+    mover_producto,
+    orden_productos,
+    siguiente_orden,
+    sumar_en,
+    sumar_estado,
+    sumar_inventario,
+    estadisticas_panel,
+    CLAVE_INVENTARIO,
+    PANEL_MOVIMIENTOS,
+    PANEL_PRODUCTOS,
+    valor_con_interes,
+    ventas_del_dia,
+    pagina_historial,
+    HISTORIAL_POR_PAGINA,
+    serie_ventas_diarias,
+    serie_ventas_mensuales,
     estado_class              # ✅ para los colores de stock
 )
-import random
+from analitica import productos_por_reponer, reposicion_por_producto
+from busqueda import (
+    LIMITE_SUGERENCIAS, MIN_BUSQUEDA, buscar_productos, marcar_cambio_productos, registrar_productos
+)
+from exportar import EXPORTACIONES, csv_en_trozos, xlsx_en_trozos
+from idempotencia import idempotente
+from indice_codigos import generar_codigo_unico, producto_por_codigo, registrar_codigos
+from recepcion import RecepcionRechazada, recibir_csv
+from ventas import VentaRechazada, vender_producto, vender_lote, anular_venta, sincronizar_ndjson
+import json
 
 # ⏰ Importaciones horarias (incluye to_hora_chile para formatear fechas)
 from tiempo import hora_actual, day_range, local_date, to_hora_chile
@@ -37,6 +76,14 @@ def login_required(f):
         return f(*args, **kwargs)
     return wrapper
 
+
+def _base_ocupada():
+    """
+    Respuesta para una venta que chocó con un bloqueo de la base: nada quedó
+    guardado y el cliente reintenta con la misma Idempotency-Key.
+    """
+    return jsonify({"success": False, "error": "⏳ La base está ocupada. Reintenta en un momento."}), 503
+
 # ======================================================
 # 🌎 HORA LOCAL (Chile)
 # ======================================================
@@ -57,64 +104,44 @@ def _to_int(value):
         return 0
     return int(float(str(value).strip().replace(",", ".")))
 
-def generar_codigo_unico(modelo):
-    code = "".join(random.choices("0123456789", k=6))
-    while modelo.query.filter_by(codigo=code).first():
-        code = "".join(random.choices("0123456789", k=6))
-    return code
 
 # ======================================================
-# 🏠 INDEX — Reinicio diario real (sin depender de session)
+# 🌙 CAMBIO DE DÍA — perezoso, en el primer request tras medianoche
+# ======================================================
+@app_rutas.before_app_request
+def verificar_cambio_de_dia():
+    asegurar_cambio_de_dia()
+
+# ======================================================
+# 🏠 INDEX — Solo lectura (el cambio de día lo hace el before_request)
 # ======================================================
 @app_rutas.route("/")
 @login_required
 def index():
     hoy = local_date()  # ✅ Fecha local Chile
 
-    # 🔄 Reiniciar valores diarios si el producto tiene una fecha anterior
-    productos = Producto.query.all()
-    cambios = 0
-    for p in productos:
-        if p.fecha != hoy:
-            p.vendidas_dia = 0
-            p.valor_vendido_dia = 0.0
-            p.fecha = hoy
-            cambios += 1
-
-    if cambios > 0:
-        db.session.commit()
-        print(f"🔁 Ventas diarias reiniciadas para {cambios} productos ({hoy})")
-
-    # 🔁 Sincronizar ventas reales del día actual
-    start, end = day_range(hoy)
-    for p in productos:
-        ventas_dia = Venta.query.filter(
-            Venta.producto_id == p.id,
-            Venta.fecha >= start,
-            Venta.fecha < end
-        ).all()
-        p.vendidas_dia = sum(v.cantidad for v in ventas_dia)
-        p.valor_vendido_dia = sum(v.ingreso for v in ventas_dia)
-    db.session.commit()
+    # 📆 Ventas del día desde los contadores (una sola consulta)
+    ventas_hoy = ventas_del_dia(hoy)
 
-    # 🔢 Reordenar productos
-    productos = Producto.query.order_by(Producto.orden.asc(), Producto.id.asc()).all()
-    for idx, p in enumerate(productos, start=1):
-        if not p.orden or p.orden != idx:
-            p.orden = idx
-    db.session.commit()
+    # 🔢 Productos según su orden (se cambia con /mover_producto y /reordenar_productos)
+    productos = Producto.query.order_by(*orden_productos()).all()
 
     # 💰 Calcular precios con ganancia
     for p in productos:
         p.precio_ganancia = (p.valor_unitario or 0) * (1 + (p.interes or 0) / 100)
 
-    total_vendido = sum(p.valor_vendido_dia or 0 for p in productos)
+    total_vendido = sum(v.ingreso or 0 for v in ventas_hoy.values())
+
+    # 🔁 Punto de reorden por producto (último `flask analizar-reposicion`)
+    reposicion = reposicion_por_producto()
 
     # 🧾 Renderizar plantilla
     return render_template(
         "index.html",
         productos=productos,
+        ventas_hoy=ventas_hoy,
         total_vendido=total_vendido,
+        reposicion=reposicion,
         estado_class=estado_class
     )
 
@@ -146,9 +173,14 @@ def actualizar_producto(producto_id):
                         "success": False,
                         "error": "⚠️ El precio debe ser mayor que cero."
                     }), 400
+                anterior = valor_con_interes(producto.unidades_restantes, producto.valor_unitario, producto.interes)
                 producto.valor_unitario = round(
                     nuevo_precio / (1 + (producto.interes or 0) / 100), 2
                 )
+                sumar_inventario(
+                    valor_con_interes(producto.unidades_restantes, producto.valor_unitario, producto.interes)
+                    - anterior
+                )
             except ValueError:
                 return jsonify({
                     "success": False,
@@ -166,7 +198,10 @@ def actualizar_producto(producto_id):
                 "error": "⚠️ No se proporcionaron datos para actualizar."
             }), 400
 
+        if nuevo_nombre:
+            marcar_cambio_productos()
         db.session.commit()
+        registrar_productos([(producto.id, producto.codigo, producto.nombre)])
 
         # ✅ Éxito
         return jsonify({
@@ -185,6 +220,64 @@ def actualizar_producto(producto_id):
         }), 500
 
 
+# ======================================================
+# 🔢 MOVER UN PRODUCTO A UNA POSICIÓN
+# ======================================================
+@app_rutas.route("/mover_producto/<int:producto_id>", methods=["POST"])
+@login_required
+def mover_producto_ruta(producto_id):
+    try:
+        data = request.get_json(silent=True) or {}
+        posicion = _to_int(data.get("posicion"))
+        if posicion <= 0:
+            return jsonify({"success": False, "error": "⚠️ Posición inválida."}), 400
+
+        if not db.session.query(Producto.id).filter_by(id=producto_id).scalar():
+            return jsonify({"success": False, "error": "❌ Producto no encontrado."}), 404
+
+        mover_producto(producto_id, posicion)
+        db.session.commit()
+        return jsonify({"success": True, "id": producto_id, "posicion": posicion})
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": f"❌ Error interno: {str(e)}"}), 500
+
+
+# ======================================================
+# 🔢 APLICAR UN ORDEN COMPLETO (lista de ids)
+# ======================================================
+@app_rutas.route("/reordenar_productos", methods=["POST"])
+@login_required
+def reordenar_productos():
+    try:
+        data = request.get_json(silent=True) or {}
+        ids = [_to_int(pid) for pid in data.get("orden") or []]
+        if not ids or len(set(ids)) != len(ids):
+            return jsonify({"success": False, "error": "⚠️ Lista de productos inválida."}), 400
+
+        actualizados = aplicar_orden(ids)
+        db.session.commit()
+        return jsonify({"success": True, "actualizados": actualizados})
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": f"❌ Error interno: {str(e)}"}), 500
+
+
+# ======================================================
+# 🔍 BUSCAR PRODUCTOS (autocompletar; responde desde el índice en memoria)
+# ======================================================
+@app_rutas.route("/buscar_productos")
+@login_required
+def buscar_productos_ruta():
+    texto = request.args.get("q", "").strip()
+    limite = min(max(request.args.get("limite", LIMITE_SUGERENCIAS, type=int), 1), 50)
+    if len(texto) < MIN_BUSQUEDA:
+        return jsonify({"productos": []})
+    return jsonify({"productos": buscar_productos(texto, limite)})
+
+
 # ======================================================
 # 📋 Detalle de ventas de HOY por producto (JSON para el modal)
 # ======================================================
@@ -240,10 +333,27 @@ def eliminar_entrada_inventario(entrada_id):
     try:
         entrada = HistorialInventario.query.get_or_404(entrada_id)
 
-        # 🔁 Restaurar el stock restando la cantidad ingresada en esa entrada
+        # 🔁 Quitar la entrada completa del stock en un UPDATE condicional: si
+        #    parte ya se vendió, se rechaza (stock_inicial − vendidas debe
+        #    seguir siendo unidades_restantes, lo que revisa la conciliación)
         producto = entrada.producto
         if producto:
-            producto.unidades_restantes = max(producto.unidades_restantes - entrada.cantidad, 0)
+            tabla = Producto.__table__
+            quitada = db.session.execute(
+                update(tabla)
+                .where(tabla.c.id == producto.id, tabla.c.unidades_restantes >= entrada.cantidad)
+                .values(
+                    unidades_restantes=tabla.c.unidades_restantes - entrada.cantidad,
+                    stock_inicial=tabla.c.stock_inicial - entrada.cantidad,
+                )
+            ).rowcount
+            if not quitada:
+                db.session.rollback()
+                return jsonify({
+                    "success": False,
+                    "error": "⚠️ Parte de esta entrada ya se vendió: no se puede eliminar."
+                }), 409
+            sumar_inventario(-valor_con_interes(entrada.cantidad, producto.valor_unitario, producto.interes))
 
         db.session.delete(entrada)
         db.session.commit()
@@ -260,26 +370,42 @@ def eliminar_entrada_inventario(entrada_id):
 @app_rutas.route("/dashboard")
 @login_required
 def dashboard():
-    total_productos = Producto.query.count()
-    total_unidades_vendidas = db.session.query(func.sum(Venta.cantidad)).scalar() or 0
-    valor_total_vendido = db.session.query(func.sum(Venta.ingreso)).scalar() or 0
-    total_movimientos = MovimientoCaja.query.count()
+    # ✅ Totales mantenidos por las escrituras (una consulta, no crece con el historial)
+    estadisticas = estadisticas_panel()
     total_abonos = total_prestamos = 0.0
 
-    # ✅ Calculamos el inventario total desde helpers
-    inventario_total = calcular_inventario_total() or 0
-
     return render_template(
         "dashboard.html",
-        total_productos=total_productos,
-        total_unidades_vendidas=total_unidades_vendidas,
-        valor_total_vendido=valor_total_vendido,
-        total_movimientos=total_movimientos,
         total_abonos=total_abonos,
         total_prestamos=total_prestamos,
-        inventario_total=inventario_total  # ✅ se pasa como valor
+        por_reponer=productos_por_reponer(),
+        **estadisticas
     )
 
+
+# ======================================================
+# 📈 SERIES PARA LOS GRÁFICOS DEL PANEL (solo leen resúmenes)
+# ======================================================
+@app_rutas.route("/graficos/ventas_diarias")
+@login_required
+def grafico_ventas_diarias():
+    dias = min(max(request.args.get("dias", 30, type=int), 1), 366 * 5)
+    hasta = local_date()
+    desde = hasta - timedelta(days=dias - 1)
+    return jsonify({"success": True, "serie": serie_ventas_diarias(desde, hasta)})
+
+
+@app_rutas.route("/graficos/ventas_mensuales")
+@login_required
+def grafico_ventas_mensuales():
+    meses = min(max(request.args.get("meses", 12, type=int), 1), 12 * 10)
+    producto_id = request.args.get("producto_id", type=int)
+    hasta = local_date()
+    desde = hasta.replace(day=1)
+    for _ in range(meses - 1):
+        desde = (desde - timedelta(days=1)).replace(day=1)
+    return jsonify({"success": True, "serie": serie_ventas_mensuales(desde, hasta, producto_id)})
+
 # ======================================================
 # 🆕 NUEVO PRODUCTO — versión optimizada (rápida + AJAX)
 # ======================================================
@@ -293,11 +419,11 @@ def nuevo_producto():
             valor_unitario = float(request.form.get("valor_unitario") or 0)
             interes = float(request.form.get("interes") or 0)
             stock_inicial = int(request.form.get("stock_inicial") or 0)
-            codigo = generar_codigo_unico(Producto)
+            codigo = generar_codigo_unico()
 
             nuevo = Producto(
                 codigo=codigo,
-                orden=orden,
+                orden=siguiente_orden(),
                 nombre=nombre,
                 valor_unitario=valor_unitario,
                 interes=interes,
@@ -306,7 +432,19 @@ def nuevo_producto():
                 fecha=local_date(),
             )
             db.session.add(nuevo)
+            db.session.flush()
+            sumar_estado({
+                PANEL_PRODUCTOS: 1,
+                CLAVE_INVENTARIO: valor_con_interes(stock_inicial, valor_unitario, interes),
+            })
+
+            # 🔢 Si se indicó una posición, se ubica ahí (si no, queda al final)
+            if orden > 0:
+                mover_producto(nuevo.id, orden)
+            marcar_cambio_productos()
             db.session.commit()
+            registrar_codigos({nuevo.codigo: nuevo.id})
+            registrar_productos([(nuevo.id, nuevo.codigo, nuevo.nombre)])
 
             if stock_inicial > 0:
                 valor_total = stock_inicial * valor_unitario
@@ -349,54 +487,109 @@ def nuevo_producto():
 # ======================================================
 @app_rutas.route("/vender/<int:producto_id>", methods=["POST"])
 @login_required
+@idempotente
 def vender(producto_id):
     try:
-        producto = Producto.query.get_or_404(producto_id)
         if request.is_json:
             data = request.get_json(silent=True) or {}
             cantidad = int(float(str(data.get("cantidad", "0")).replace(",", ".")))
         else:
             cantidad = int(float(str(request.form.get("cantidad", "0")).replace(",", ".")))
-        if cantidad <= 0:
-            return jsonify({"success": False, "error": "Cantidad inválida."}), 400
-
-        valor_unitario = float(producto.valor_unitario or 0)
-        interes = float(producto.interes or 0)
-        stock = int(producto.unidades_restantes or 0)
-        if stock < cantidad:
-            return jsonify({"success": False, "error": "No hay suficiente stock."}), 400
-
-        ingreso = round(cantidad * (valor_unitario * (1 + interes / 100)), 2)
-        producto.unidades_restantes = stock - cantidad
-        producto.vendidas_dia = int(producto.vendidas_dia or 0) + cantidad
-        producto.valor_vendido_dia = round(float(producto.valor_vendido_dia or 0) + ingreso, 2)
-        db.session.add(producto)
-
-        venta = Venta(producto_id=producto.id, cantidad=cantidad, ingreso=ingreso, fecha=hora_actual())
-        db.session.add(venta)
-
-        hoy_cl = local_date()
-        liq = Liquidacion.query.filter_by(fecha=hoy_cl).first()
-        if not liq:
-            liq = Liquidacion(fecha=hoy_cl, entrada=0.0, salida=0.0, caja=0.0, inventario_valor=0.0)
-            db.session.add(liq)
-        liq.entrada = round(float(liq.entrada or 0) + ingreso, 2)
-        liq.caja = round(float(liq.caja or 0) + ingreso, 2)
+
+        # ⚛️ Stock y totales se actualizan con sentencias atómicas (ver ventas.py)
+        resultado = vender_producto(producto_id, cantidad)
         db.session.commit()
 
-        return jsonify({
-            "success": True,
-            "nombre": producto.nombre,
-            "cantidad": cantidad,
-            "monto": ingreso,
-            "stock": producto.unidades_restantes,
-            "vendidas_dia": producto.vendidas_dia,
-            "valor_vendido_dia": producto.valor_vendido_dia
-        })
+        return jsonify({"success": True, **resultado})
+    except VentaRechazada as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": e.mensaje}), e.status
+    except OperationalError:
+        db.session.rollback()
+        return _base_ocupada()
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "error": f"Ocurrió un error al vender: {str(e)}"}), 500
 
+# ======================================================
+# 🔫 VENDER POR CÓDIGO (lector de código de barras)
+# ======================================================
+@app_rutas.route("/vender_codigo", methods=["POST"])
+@login_required
+@idempotente
+def vender_codigo():
+    try:
+        data = request.get_json(silent=True) or request.form
+        codigo = str(data.get("codigo") or "").strip()
+        cantidad = int(float(str(data.get("cantidad") or "1").replace(",", ".")))
+        if not codigo:
+            return jsonify({"success": False, "error": "⚠️ Código vacío."}), 400
+
+        # ⚡ El código se resuelve en memoria: la venta es la única ida a la base
+        producto_id = producto_por_codigo(codigo)
+        if producto_id is None:
+            return jsonify({"success": False, "error": f"❌ No existe un producto con código {codigo}."}), 404
+
+        resultado = vender_producto(producto_id, cantidad)
+        db.session.commit()
+
+        return jsonify({"success": True, "producto_id": producto_id, "codigo": codigo, **resultado})
+    except VentaRechazada as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": e.mensaje}), e.status
+    except ValueError:
+        db.session.rollback()
+        return jsonify({"success": False, "error": "⚠️ Cantidad inválida."}), 400
+    except OperationalError:
+        db.session.rollback()
+        return _base_ocupada()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": f"Ocurrió un error al vender: {str(e)}"}), 500
+
+# ======================================================
+# 🧺 VENTA EN LOTE (carrito completo en una sola transacción)
+# ======================================================
+@app_rutas.route("/vender_lote", methods=["POST"])
+@login_required
+@idempotente
+def vender_lote_ruta():
+    try:
+        data = request.get_json(silent=True) or {}
+        lineas = data.get("lineas")
+        if not isinstance(lineas, list) or not lineas:
+            return jsonify({"success": False, "error": "No hay productos para vender."}), 400
+
+        resultado = vender_lote(lineas)
+        db.session.commit()
+
+        return jsonify({"success": True, **resultado})
+    except VentaRechazada as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": e.mensaje, "errores": e.errores}), e.status
+    except OperationalError:
+        db.session.rollback()
+        return _base_ocupada()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": f"Ocurrió un error al vender: {str(e)}"}), 500
+
+# ======================================================
+# 📡 SINCRONIZAR VENTAS OFFLINE (NDJSON → NDJSON)
+# ======================================================
+@app_rutas.route("/sincronizar_ventas", methods=["POST"])
+@login_required
+def sincronizar_ventas():
+    """
+    Recibe ventas registradas sin conexión, una por línea (NDJSON), y responde
+    con el resultado de cada línea a medida que se aplican los lotes.
+    """
+    def generar():
+        for resultado in sincronizar_ndjson(request.stream):
+            yield json.dumps(resultado, default=str) + "\n"
+
+    return Response(stream_with_context(generar()), mimetype="application/x-ndjson")
+
 # ======================================================
 # 🗑 ELIMINAR VENTA (desde el modal) — versión corregida con caja ajustada
 # ======================================================
@@ -404,43 +597,30 @@ def vender(producto_id):
 @login_required
 def eliminar_venta(venta_id):
     try:
-        venta = Venta.query.get_or_404(venta_id)
-        producto = venta.producto
-
-        # 🔙 Revertir inventario y totales del día
-        producto.unidades_restantes += venta.cantidad
-        producto.vendidas_dia = max(0, (producto.vendidas_dia or 0) - venta.cantidad)
-        producto.valor_vendido_dia = max(0.0, (producto.valor_vendido_dia or 0) - venta.ingreso)
+        # 🔙 Revertir inventario y totales del día de la venta (atómico)
+        resultado = anular_venta(venta_id)
 
         # 💰 Eliminar movimiento de caja (si existía)
         movimiento = MovimientoCaja.query.filter_by(
-            tipo="entrada", descripcion=f"Venta: {producto.nombre}", monto=venta.ingreso
+            tipo="entrada", descripcion=f"Venta: {resultado['nombre']}", monto=resultado["ingreso"]
         ).first()
         if movimiento:
+            registrar_caja(resultado["dia"], entradas=-movimiento.monto)
+            sumar_estado({PANEL_MOVIMIENTOS: -1})
             db.session.delete(movimiento)
 
-        # 💼 Ajustar liquidación del día actual
-        hoy = local_date()
-        liq = Liquidacion.query.filter_by(fecha=hoy).first()
-        if liq:
-            liq.entrada = max((liq.entrada or 0) - venta.ingreso, 0)
-            liq.caja = max((liq.caja or 0) - venta.ingreso, 0)
-        else:
-            # Si no hay liquidación, la creamos solo por coherencia
-            liq = Liquidacion(fecha=hoy, entrada=0.0, salida=0.0, caja=0.0)
-            db.session.add(liq)
-
-        # 🗑 Eliminar la venta
-        db.session.delete(venta)
         db.session.commit()
 
         return jsonify({
             "success": True,
-            "stock": producto.unidades_restantes,
-            "vendidas_dia": producto.vendidas_dia,
-            "valor_vendido_dia": producto.valor_vendido_dia
+            "stock": resultado["stock"],
+            "vendidas_dia": resultado["vendidas_dia"],
+            "valor_vendido_dia": resultado["valor_vendido_dia"]
         })
 
+    except VentaRechazada as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": e.mensaje}), e.status
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)})
@@ -450,6 +630,7 @@ def eliminar_venta(venta_id):
 # ======================================================
 @app_rutas.route("/caja_salida", methods=["POST"])
 @login_required
+@idempotente
 def caja_salida():
     descripcion = request.form.get("descripcion", "").strip()
     monto = float(request.form.get("monto") or 0)
@@ -467,15 +648,16 @@ def caja_salida():
     )
     db.session.add(salida)
 
-    # Actualizar o crear la liquidación del día
-    hoy = local_date()
-    liq = Liquidacion.query.filter_by(fecha=hoy).first()
-    if not liq:
-        liq = Liquidacion(fecha=hoy, entrada=0.0, salida=0.0, caja=0.0)
-        db.session.add(liq)
-
+    # Actualizar o crear la liquidación del día (upsert atómico)
     # ✅ Solo actualizamos la salida, NO tocamos la caja aquí
-    liq.salida = (liq.salida or 0) + monto
+    sumar_en(Liquidacion, ["fecha"], [{"fecha": local_date(), "salida": monto}])
+    sumar_estado({PANEL_MOVIMIENTOS: 1})
+    try:
+        registrar_caja(local_date(), salidas=monto)
+    except DiaCerrado as e:
+        db.session.rollback()
+        flash(f"🔒 {e}", "warning")
+        return redirect(url_for("app_rutas.liquidacion"))
 
     db.session.commit()
 
@@ -495,12 +677,19 @@ def eliminar_salida(salida_id):
         flash("⚠️ Solo se pueden eliminar movimientos de tipo salida.", "warning")
         return redirect(url_for("app_rutas.liquidacion"))
 
-    # Actualizamos la liquidación correspondiente
-    hoy = salida.fecha.date()
+    # Actualizamos la liquidación correspondiente (día local de la salida)
+    hoy = db.session.query(dia_local(MovimientoCaja.fecha)).filter(MovimientoCaja.id == salida.id).scalar()
     liq = Liquidacion.query.filter_by(fecha=hoy).first()
     if liq:
         liq.salida = max((liq.salida or 0) - salida.monto, 0)
         # ⚠️ No modificamos liq.caja manualmente
+    try:
+        registrar_caja(hoy, salidas=-salida.monto)
+    except DiaCerrado as e:
+        db.session.rollback()
+        flash(f"🔒 {e}", "warning")
+        return redirect(url_for("app_rutas.liquidacion"))
+    sumar_estado({PANEL_MOVIMIENTOS: -1})
     db.session.delete(salida)
     db.session.commit()
 
@@ -518,9 +707,14 @@ def detalle_ventas(fecha):
         fecha_obj = datetime.strptime(fecha, "%Y-%m-%d").date()
         start, end = day_range(fecha_obj)
 
-        ventas = Venta.query.filter(Venta.fecha >= start, Venta.fecha < end).all()
-        total_dia = db.session.query(func.coalesce(func.sum(Venta.ingreso), 0)) \
-            .filter(Venta.fecha >= start, Venta.fecha < end).scalar()
+        # 🔗 Producto en la misma consulta (la plantilla muestra su nombre por venta)
+        ventas = (
+            Venta.query.options(joinedload(Venta.producto))
+            .filter(Venta.fecha >= start, Venta.fecha < end)
+            .order_by(Venta.fecha)
+            .all()
+        )
+        total_dia = round(sum(float(v.ingreso or 0) for v in ventas), 2)
 
         return render_template(
             "detalle_ventas.html",
@@ -532,6 +726,48 @@ def detalle_ventas(fecha):
         flash(f"❌ Error cargando detalle: {e}", "danger")
         return redirect(url_for("app_rutas.liquidacion"))
 
+# ======================================================
+# 📥 EXPORTAR (CSV / XLSX en streaming)
+# ======================================================
+@app_rutas.route("/exportar/<tipo>")
+@login_required
+def exportar(tipo):
+    """
+    /exportar/<liquidacion|ventas|movimientos>?desde=YYYY-MM-DD&hasta=YYYY-MM-DD&formato=csv|xlsx
+    Las filas se van enviando a medida que se leen: la memoria no depende del rango.
+    """
+    fuente = EXPORTACIONES.get(tipo)
+    formato = request.args.get("formato", "csv")
+    if fuente is None or formato not in ("csv", "xlsx"):
+        flash("❌ Exportación no válida.", "danger")
+        return redirect(url_for("app_rutas.liquidacion"))
+
+    hoy = local_date()
+    try:
+        desde = datetime.strptime(request.args.get("desde") or hoy.isoformat(), "%Y-%m-%d").date()
+        hasta = datetime.strptime(request.args.get("hasta") or desde.isoformat(), "%Y-%m-%d").date()
+    except ValueError:
+        flash("❌ Fechas no válidas.", "danger")
+        return redirect(url_for("app_rutas.liquidacion"))
+    if desde > hasta:
+        flash("⚠️ La fecha inicial no puede ser mayor que la final.", "warning")
+        return redirect(url_for("app_rutas.liquidacion"))
+
+    encabezados, filas = fuente(desde, hasta)
+    nombre = f"{tipo}_{desde:%Y%m%d}_{hasta:%Y%m%d}.{formato}"
+    if formato == "csv":
+        cuerpo = csv_en_trozos(encabezados, filas)
+        mimetype = "text/csv"
+    else:
+        cuerpo = xlsx_en_trozos(tipo.capitalize(), encabezados, filas)
+        mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    return Response(
+        stream_with_context(cuerpo),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'},
+    )
+
 # ======================================================
 # 📤 DETALLE DE SALIDAS POR DÍA (CORREGIDO)
 # ======================================================
@@ -572,6 +808,7 @@ def detalle_salida(fecha):
 # ======================================================
 @app_rutas.route("/entrada_inventario", methods=["GET", "POST"])
 @login_required
+@idempotente
 def entrada_inventario():
     if request.method == "POST":
         try:
@@ -583,7 +820,8 @@ def entrada_inventario():
                 flash("⚠️ Debes ingresar un código de producto.", "warning")
                 return redirect(url_for("app_rutas.entrada_inventario"))
 
-            producto = Producto.query.filter_by(codigo=codigo).first()
+            producto_id = producto_por_codigo(codigo)
+            producto = db.session.get(Producto, producto_id) if producto_id else None
             if not producto:
                 flash("❌ No se encontró un producto con ese código.", "danger")
                 return redirect(url_for("app_rutas.entrada_inventario"))
@@ -595,6 +833,7 @@ def entrada_inventario():
             # 📦 Actualizar stock
             producto.unidades_restantes += cantidad
             producto.stock_inicial += cantidad
+            sumar_inventario(valor_con_interes(cantidad, producto.valor_unitario, producto.interes))
             valor_total = (producto.valor_unitario or 0) * cantidad
 
             # 🕒 Registrar historial
@@ -606,12 +845,7 @@ def entrada_inventario():
             )
             db.session.add(historial)
 
-            # 🧹 Eliminar registros antiguos (más de 90 días)
-            limite = hora_actual() - timedelta(days=90)
-            HistorialInventario.query.filter(
-                HistorialInventario.fecha < limite
-            ).delete()
-
+            # 🧹 Lo de más de 90 días lo archiva y borra `flask retencion` (fuera del request)
             db.session.commit()
 
             # ⚡ Si es una solicitud AJAX, devolver JSON
@@ -639,17 +873,113 @@ def entrada_inventario():
             flash(f"❌ Error al registrar entrada: {e}", "danger")
             return redirect(url_for("app_rutas.entrada_inventario"))
 
-    # 📋 Vista GET — mostrar inventario y últimos 90 días
+    # 📋 Vista GET — inventario y primera página del historial (el resto lo pide la página)
     productos = Producto.query.order_by(Producto.nombre.asc()).all()
-    limite = hora_actual() - timedelta(days=90)
-    historial = (
-        HistorialInventario.query
-        .filter(HistorialInventario.fecha >= limite)
-        .order_by(HistorialInventario.fecha.desc())
-        .all()
+    try:
+        filtros = _filtros_historial()
+    except ValueError:
+        flash("⚠️ Filtros de historial inválidos.", "warning")
+        return redirect(url_for("app_rutas.entrada_inventario"))
+    historial, siguiente = pagina_historial(**filtros)
+
+    return render_template(
+        "entrada_inventario.html",
+        productos=productos,
+        historial=historial,
+        siguiente=siguiente,
+        filtros=filtros,
     )
 
-    return render_template("entrada_inventario.html", productos=productos, historial=historial)
+
+def _filtros_historial() -> dict:
+    """Filtros del historial desde la query string (por defecto, los últimos 90 días)."""
+    def fecha(nombre):
+        valor = request.args.get(nombre)
+        return datetime.strptime(valor, "%Y-%m-%d").date() if valor else None
+
+    desde = fecha("desde")
+    if not desde and "desde" not in request.args:
+        desde = local_date() - timedelta(days=90)
+    return {
+        "producto_id": request.args.get("producto_id", type=int),
+        "desde": desde,
+        "hasta": fecha("hasta"),
+    }
+
+
+# ======================================================
+# 📑 HISTORIAL DE INVENTARIO (JSON, paginado por cursor)
+# ======================================================
+@app_rutas.route("/historial_inventario")
+@login_required
+def historial_inventario():
+    try:
+        filtros = _filtros_historial()
+        limite = min(max(request.args.get("limite", HISTORIAL_POR_PAGINA, type=int), 1), 200)
+        entradas, siguiente = pagina_historial(request.args.get("cursor"), limite=limite, **filtros)
+    except ValueError:
+        return jsonify({"success": False, "error": "⚠️ Filtros o cursor inválidos."}), 400
+
+    return jsonify({
+        "success": True,
+        "entradas": [{
+            "id": h.id,
+            "fecha": h.fecha.isoformat() if h.fecha else None,
+            "fecha_texto": to_hora_chile(h.fecha),
+            "producto_id": h.producto_id,
+            "codigo": h.producto.codigo,
+            "nombre": h.producto.nombre,
+            "cantidad": h.cantidad,
+            "valor_total": round(float(h.valor_total or 0), 2),
+        } for h in entradas],
+        "siguiente": siguiente,
+    })
+
+
+# ======================================================
+# 📦 RECEPCIÓN MASIVA POR CSV (codigo,cantidad[,nombre,valor_unitario,interes])
+# ======================================================
+@app_rutas.route("/entrada_inventario/csv", methods=["POST"])
+@login_required
+@idempotente
+def entrada_inventario_csv():
+    ajax = request.headers.get("X-Requested-With") == "XMLHttpRequest" or not request.files
+    try:
+        archivo = request.files.get("archivo")
+        datos = archivo.read() if archivo else request.get_data()
+        resultado = recibir_csv(datos.decode("utf-8-sig", errors="replace"))
+        creados = [l for l in resultado["lineas"] if l["ok"] and l["nuevo"]]
+        if creados:
+            marcar_cambio_productos()
+        db.session.commit()
+        registrar_codigos({l["codigo"]: l["producto_id"] for l in creados})
+        registrar_productos([(l["producto_id"], l["codigo"], l["nombre"]) for l in creados])
+    except RecepcionRechazada as e:
+        db.session.rollback()
+        if ajax:
+            return jsonify({"success": False, "error": e.mensaje}), e.status
+        flash(f"⚠️ {e.mensaje}", "warning")
+        return redirect(url_for("app_rutas.entrada_inventario"))
+    except Exception as e:
+        db.session.rollback()
+        if ajax:
+            return jsonify({"success": False, "error": str(e)}), 500
+        flash(f"❌ Error al recibir el archivo: {e}", "danger")
+        return redirect(url_for("app_rutas.entrada_inventario"))
+
+    if ajax:
+        return jsonify({"success": True, **resultado})
+
+    flash(
+        f"✅ Recepción aplicada: {resultado['aplicadas']} líneas, {resultado['unidades']} unidades, "
+        f"{resultado['productos_creados']} productos nuevos.",
+        "success",
+    )
+    for r in [r for r in resultado["lineas"] if not r["ok"]][:10]:
+        flash(f"⚠️ Línea {r['linea']} ({r.get('codigo') or '—'}): {r['error']}", "warning")
+    if resultado["rechazadas"] > 10:
+        flash(f"⚠️ … y {resultado['rechazadas'] - 10} líneas rechazadas más.", "warning")
+    return redirect(url_for("app_rutas.entrada_inventario"))
 
 
 # ======================================================
@@ -681,73 +1011,12 @@ def liquidacion():
             flash("⚠️ La fecha inicial no puede ser mayor que la final.", "warning")
             return redirect(url_for("app_rutas.liquidacion"))
 
-        resultados = []
-        total_ventas = total_entradas = total_salidas = total_caja = 0.0
-
-        fecha_actual = fi
-
-        while fecha_actual <= ff:
-            start, end = day_range(fecha_actual)
-            inventario_total = calcular_inventario_total()
-
-            # ✔ SI YA EXISTE LIQUIDACIÓN GUARDADA → SE USA
-            liq_guardada = LiquidacionProducto.query.filter_by(fecha=fecha_actual).first()
-
-            if liq_guardada:
-                resultados.append({
-                    "fecha": liq_guardada.fecha,
-                    "caja_anterior": liq_guardada.caja_anterior,
-                    "ventas_dia": liq_guardada.ventas_dia,
-                    "entradas": liq_guardada.entradas,
-                    "salidas": liq_guardada.salidas,
-                    "caja_dia": liq_guardada.caja_dia,
-                    "caja_total": liq_guardada.caja_total,
-                    "inventario": liq_guardada.inventario_total,
-                })
-
-                total_ventas += liq_guardada.ventas_dia
-                total_entradas += liq_guardada.entradas
-                total_salidas += liq_guardada.salidas
-                total_caja = liq_guardada.caja_dia
-
-                fecha_actual += timedelta(days=1)
-                continue
-
-            # ✔ SI NO EXISTE → CALCULAR
-            caja_anterior = obtener_caja_anterior(fecha_actual)
-
-            ventas_dia = db.session.query(func.coalesce(func.sum(Venta.ingreso), 0))\
-                .filter(Venta.fecha >= start, Venta.fecha < end).scalar() or 0.0
-
-            entradas = db.session.query(func.coalesce(func.sum(MovimientoCaja.monto), 0))\
-                .filter(MovimientoCaja.tipo == "entrada",
-                        MovimientoCaja.fecha >= start, MovimientoCaja.fecha < end)\
-                .scalar() or 0.0
-
-            salidas = db.session.query(func.coalesce(func.sum(MovimientoCaja.monto), 0))\
-                .filter(MovimientoCaja.tipo.in_(["salida", "gasto"]),
-                        MovimientoCaja.fecha >= start, MovimientoCaja.fecha < end)\
-                .scalar() or 0.0
-
-            caja_dia = caja_anterior + ventas_dia + entradas - salidas
-
-            resultados.append({
-                "fecha": fecha_actual,
-                "caja_anterior": caja_anterior,
-                "ventas_dia": ventas_dia,
-                "entradas": entradas,
-                "salidas": salidas,
-                "caja_dia": caja_dia,
-                "caja_total": caja_dia,
-                "inventario": inventario_total,
-            })
-
-            total_ventas += ventas_dia
-            total_entradas += entradas
-            total_salidas += salidas
-            total_caja = caja_dia
-
-            fecha_actual += timedelta(days=1)
+        resultados = liquidacion_por_rango(fi, ff)
+        total_ventas = sum(f["ventas_dia"] or 0.0 for f in resultados)
+        total_entradas = sum(f["entradas"] or 0.0 for f in resultados)
+        total_salidas = sum(f["salidas"] or 0.0 for f in resultados)
+        total_caja = resultados[-1]["caja_dia"]
+        inventario_total = resultados[-1]["inventario"]
 
         return render_template(
             "liquidacion.html",
@@ -764,90 +1033,35 @@ def liquidacion():
         )
 
     # =====================================================
-    # 🟢 GET — LIQUIDACIÓN DEL DÍA (RECALCULADA SIN DUPLICAR)
+    # 🟢 GET — LIQUIDACIÓN DEL DÍA (solo lectura)
+    # La fila del día la mantienen al día las ventas y movimientos de caja
     # =====================================================
-    start, end = day_range(hoy)
     inventario_total = calcular_inventario_total()
-
     liq = LiquidacionProducto.query.filter_by(fecha=hoy).first()
 
-    # ✔ SI YA EXISTE → ACTUALIZAR SIN DUPLICAR NADA
     if liq:
-        ventas_dia = db.session.query(func.coalesce(func.sum(Venta.ingreso), 0))\
-            .filter(Venta.fecha >= start, Venta.fecha < end).scalar() or 0.0
-
-        entradas = db.session.query(func.coalesce(func.sum(MovimientoCaja.monto), 0))\
-            .filter(MovimientoCaja.tipo == "entrada",
-                    MovimientoCaja.fecha >= start, MovimientoCaja.fecha < end)\
-            .scalar() or 0.0
-
-        salidas = db.session.query(func.coalesce(func.sum(MovimientoCaja.monto), 0))\
-            .filter(MovimientoCaja.tipo.in_(["salida", "gasto"]),
-                    MovimientoCaja.fecha >= start, MovimientoCaja.fecha < end)\
-            .scalar() or 0.0
-
-        caja_dia = liq.caja_anterior + ventas_dia + entradas - salidas
-
-        liq.ventas_dia = ventas_dia
-        liq.entradas = entradas
-        liq.salidas = salidas
-        liq.caja_dia = caja_dia
-        liq.caja_total = caja_dia
-        liq.inventario_total = inventario_total
-
-        db.session.commit()
-
         resultados = [{
-            "fecha": hoy,
+            "fecha": liq.fecha,
             "caja_anterior": liq.caja_anterior,
-            "ventas_dia": ventas_dia,
-            "entradas": entradas,
-            "salidas": salidas,
-            "caja_dia": caja_dia,
-            "caja_total": caja_dia,
-            "inventario": inventario_total,
+            "ventas_dia": liq.ventas_dia,
+            "entradas": liq.entradas,
+            "salidas": liq.salidas,
+            "caja_dia": liq.caja_dia,
+            "caja_total": liq.caja_total,
+            # 🔒 Un día cerrado muestra la foto del cierre
+            "inventario": liq.inventario_total if liq.cerrada else inventario_total,
         }]
-
     else:
-        # ✔ NO EXISTE → CREAR NORMAL
+        # ✔ Sin movimientos hoy → el día abre con la caja anterior
         caja_anterior = obtener_caja_anterior(hoy)
-
-        ventas_dia = db.session.query(func.coalesce(func.sum(Venta.ingreso), 0))\
-            .filter(Venta.fecha >= start, Venta.fecha < end).scalar() or 0.0
-
-        entradas = db.session.query(func.coalesce(func.sum(MovimientoCaja.monto), 0))\
-            .filter(MovimientoCaja.tipo == "entrada",
-                    MovimientoCaja.fecha >= start, MovimientoCaja.fecha < end)\
-            .scalar() or 0.0
-
-        salidas = db.session.query(func.coalesce(func.sum(MovimientoCaja.monto), 0))\
-            .filter(MovimientoCaja.tipo.in_(["salida", "gasto"]),
-                    MovimientoCaja.fecha >= start, MovimientoCaja.fecha < end)\
-            .scalar() or 0.0
-
-        caja_dia = caja_anterior + ventas_dia + entradas - salidas
-
-        nueva_liq = LiquidacionProducto(
-            fecha=hoy,
-            caja_anterior=caja_anterior,
-            ventas_dia=ventas_dia,
-            entradas=entradas,
-            salidas=salidas,
-            caja_dia=caja_dia,
-            caja_total=caja_dia,
-            inventario_total=inventario_total,
-        )
-        db.session.add(nueva_liq)
-        db.session.commit()
-
         resultados = [{
             "fecha": hoy,
             "caja_anterior": caja_anterior,
-            "ventas_dia": ventas_dia,
-            "entradas": entradas,
-            "salidas": salidas,
-            "caja_dia": caja_dia,
-            "caja_total": caja_dia,
+            "ventas_dia": 0.0,
+            "entradas": 0.0,
+            "salidas": 0.0,
+            "caja_dia": caja_anterior,
+            "caja_total": caja_anterior,
             "inventario": inventario_total,
         }]
 
@@ -862,10 +1076,47 @@ def liquidacion():
         total_ingresos=resultados[0]["entradas"],
         total_salida=resultados[0]["salidas"],
         caja_final=resultados[0]["caja_dia"],
-        total_paquete=inventario_total
+        total_paquete=resultados[0]["inventario"],
+        dia_cerrado=bool(liq and liq.cerrada),
+        ultimo_cierre=ultimo_dia_cerrado()
     )
 
 
+# ======================================================
+# 🔒 CERRAR DÍA (congela la liquidación)
+# ======================================================
+@app_rutas.route("/cerrar_dia", methods=["POST"])
+@login_required
+def cerrar_dia_ruta():
+    # ⚠️ Cerrar un día cierra también todos los anteriores: la fecha debe venir explícita
+    if not request.form.get("fecha"):
+        flash("❌ Indica la fecha del día a cerrar.", "danger")
+        return redirect(url_for("app_rutas.liquidacion"))
+    try:
+        dia = datetime.strptime(request.form["fecha"], "%Y-%m-%d").date()
+    except ValueError:
+        flash("❌ Fecha no válida.", "danger")
+        return redirect(url_for("app_rutas.liquidacion"))
+
+    ahora = hora_actual()
+    hoy = ahora.date()
+    if dia > hoy:
+        flash("⚠️ No se puede cerrar un día futuro.", "warning")
+        return redirect(url_for("app_rutas.liquidacion"))
+    if dia == hoy and ahora.time() < HORA_CIERRE:
+        flash(f"⚠️ El día en curso se puede cerrar desde las {HORA_CIERRE:%H:%M}.", "warning")
+        return redirect(url_for("app_rutas.liquidacion"))
+
+    cerradas = cerrar_dia(dia)
+    db.session.commit()
+
+    if cerradas:
+        flash(f"🔒 Día {dia:%d/%m/%Y} cerrado. Su liquidación ya no se recalcula.", "success")
+    else:
+        flash(f"ℹ️ El día {dia:%d/%m/%Y} ya estaba cerrado.", "info")
+    return redirect(url_for("app_rutas.liquidacion"))
+
+
 # ======================================================
 # 🔐 LOGIN Y LOGOUT
 # ======================================================
@@ -0,0 +1,494 @@
+# ======================================================
+# ventas.py — registro atómico de ventas (seguro con varios workers) 🇨🇱
+# ======================================================
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import case, cast, delete, func, literal, or_, type_coerce, update
+
+from extensions import db
+from helpers import (
+    CLAVE_INVENTARIO, PANEL_UNIDADES, PANEL_VENDIDO, DiaCerrado, dia_local, registrar_caja,
+    registrar_venta_diaria, registrar_ventas_diarias, sumar_en, sumar_estado, ultimo_dia_cerrado
+)
+from modelos import Dinero, Producto, Venta, VentaDiaria, Liquidacion, ClaveIdempotencia
+from tiempo import CHILE_TZ, hora_actual, local_date
+
+_producto = Producto.__table__
+_venta = Venta.__table__
+
+
+class VentaRechazada(Exception):
+    """Venta que no se puede aplicar (sin stock, producto inexistente, etc.)."""
+
+    def __init__(self, mensaje, status=400, errores=None):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status = status
+        self.errores = errores or []
+
+
+# ======================================================
+# 💲 INGRESO CALCULADO EN SQL (precio con ganancia)
+# ======================================================
+def ingreso_sql(cantidad):
+    """cantidad × valor_unitario × (1 + interés%), redondeado a 2 decimales en la BD."""
+    bruto = cantidad * _producto.c.valor_unitario * (1 + func.coalesce(_producto.c.interes, 0) / 100.0)
+    return type_coerce(func.round(cast(bruto, db.Numeric(18, 6)), 2), Dinero)
+
+
+# ======================================================
+# 🛒 VENDER — UPDATE condicional, sin leer-modificar-escribir
+# ======================================================
+def _agrupar_lineas(lineas) -> dict:
+    """Suma las cantidades por producto, conservando el orden de llegada."""
+    cantidades = {}
+    for linea in lineas:
+        try:
+            producto_id = int(linea["producto_id"])
+            cantidad = int(float(str(linea["cantidad"]).replace(",", ".")))
+        except (KeyError, TypeError, ValueError):
+            raise VentaRechazada("Línea de venta inválida.")
+        if cantidad <= 0:
+            raise VentaRechazada("Cantidad inválida.")
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+    return cantidades
+
+
+def vender_lote(lineas, fecha=None) -> dict:
+    """
+    Registra varias ventas (un carrito) con un número fijo de sentencias,
+    sin importar cuántas líneas traiga:
+      1. Un UPDATE condicional con CASE que valida y descuenta el stock de todos
+         los productos a la vez y devuelve (RETURNING) las cifras de cada fila.
+      2. Un INSERT masivo de las ventas.
+      3. Un upsert de los contadores diarios y otro de la liquidación del día.
+    Es todo o nada: si alguna línea no tiene stock se lanza VentaRechazada y
+    quien llama hace rollback. No hace commit.
+    """
+    cantidades = _agrupar_lineas(lineas)
+    if not cantidades:
+        raise VentaRechazada("No hay productos para vender.")
+
+    fecha = fecha or hora_actual()
+    dia = fecha.date()
+    cantidad = case(cantidades, value=_producto.c.id)
+    ingreso = ingreso_sql(cantidad)
+
+    filas = db.session.execute(
+        update(_producto)
+        .where(_producto.c.id.in_(cantidades), _producto.c.unidades_restantes >= cantidad)
+        .values(
+            unidades_restantes=_producto.c.unidades_restantes - cantidad,
+            vendidas_dia=func.coalesce(_producto.c.vendidas_dia, 0) + cantidad,
+            valor_vendido_dia=func.coalesce(_producto.c.valor_vendido_dia, 0) + ingreso,
+        )
+        .returning(
+            _producto.c.id,
+            _producto.c.nombre,
+            _producto.c.unidades_restantes,
+            ingreso.label("ingreso"),
+        )
+    ).all()
+
+    if len(filas) != len(cantidades):
+        _rechazar_lineas(cantidades, {f.id for f in filas})
+
+    por_id = {f.id: f for f in filas}
+    resultado = []
+    for producto_id, cant in cantidades.items():
+        f = por_id[producto_id]
+        resultado.append({
+            "producto_id": producto_id,
+            "nombre": f.nombre,
+            "cantidad": cant,
+            "monto": float(f.ingreso),
+            "stock": f.unidades_restantes,
+        })
+
+    db.session.execute(_venta.insert(), [
+        {"producto_id": r["producto_id"], "cantidad": r["cantidad"], "ingreso": r["monto"], "fecha": fecha}
+        for r in resultado
+    ])
+    registrar_ventas_diarias([
+        {"producto_id": r["producto_id"], "dia": dia, "unidades": r["cantidad"], "ingreso": r["monto"]}
+        for r in resultado
+    ])
+    _con_contadores_del_dia(resultado, dia)
+    total = round(sum(r["monto"] for r in resultado), 2)
+    sumar_en(Liquidacion, ["fecha"], [{"fecha": dia, "entrada": total, "caja": total}])
+    _registrar_caja(dia, ventas=total)
+    _sumar_totales(sum(r["cantidad"] for r in resultado), total)
+
+    return {"lineas": resultado, "total": total}
+
+
+def _con_contadores_del_dia(lineas: list, dia):
+    """
+    Pone en cada línea las vendidas y el valor del día desde venta_diaria,
+    la misma fuente con la que el índice pinta esas columnas (una consulta).
+    """
+    contadores = {
+        v.producto_id: v
+        for v in VentaDiaria.query.filter(
+            VentaDiaria.dia == dia, VentaDiaria.producto_id.in_([l["producto_id"] for l in lineas])
+        )
+    }
+    for linea in lineas:
+        v = contadores.get(linea["producto_id"])
+        linea["vendidas_dia"] = v.unidades if v else 0
+        linea["valor_vendido_dia"] = round(float(v.ingreso), 2) if v else 0.0
+
+
+def _registrar_caja(dia, **movimiento):
+    """Mueve el libro de caja; un día cerrado se rechaza como cualquier venta inválida."""
+    try:
+        registrar_caja(dia, **movimiento)
+    except DiaCerrado as e:
+        raise VentaRechazada(str(e), 409)
+
+
+def _sumar_totales(unidades: int, ingreso: float):
+    """Totales del panel e inventario valorizado: lo vendido sale del inventario."""
+    sumar_estado({PANEL_UNIDADES: unidades, PANEL_VENDIDO: ingreso, CLAVE_INVENTARIO: -ingreso})
+
+
+def _rechazar_lineas(cantidades: dict, aplicadas: set):
+    """Explica qué líneas fallaron (solo se consulta en el camino de error)."""
+    faltantes = [pid for pid in cantidades if pid not in aplicadas]
+    stock = dict(
+        db.session.query(Producto.id, Producto.unidades_restantes)
+        .filter(Producto.id.in_(faltantes))
+        .all()
+    )
+    errores = []
+    for pid in faltantes:
+        if pid not in stock:
+            errores.append({"producto_id": pid, "error": "Producto no encontrado."})
+        else:
+            errores.append({
+                "producto_id": pid,
+                "error": "No hay suficiente stock.",
+                "stock": stock[pid],
+            })
+
+    status = 404 if len(errores) == 1 and errores[0]["error"] == "Producto no encontrado." else 400
+    mensaje = errores[0]["error"] if len(errores) == 1 else "Hay productos sin stock suficiente."
+    raise VentaRechazada(mensaje, status, errores)
+
+
+def vender_producto(producto_id: int, cantidad: int, fecha=None) -> dict:
+    """Venta de un solo producto: un carrito de una línea."""
+    resultado = vender_lote([{"producto_id": producto_id, "cantidad": cantidad}], fecha)
+    venta = resultado["lineas"][0]
+    venta.pop("producto_id")
+    return venta
+
+
+# ======================================================
+# 🗑 ANULAR VENTA — DELETE ... RETURNING (no se revierte dos veces)
+# ======================================================
+def anular_venta(venta_id: int) -> dict:
+    """
+    Elimina la venta y revierte stock y totales de forma atómica.
+    Si dos peticiones anulan la misma venta, solo la primera la encuentra.
+    No hace commit: lo decide quien llama.
+    """
+    borrada = db.session.execute(
+        delete(_venta)
+        .where(_venta.c.id == venta_id)
+        .returning(
+            _venta.c.producto_id,
+            _venta.c.cantidad,
+            _venta.c.ingreso,
+            dia_local(_venta.c.fecha).label("dia"),
+        )
+    ).first()
+    if borrada is None:
+        raise VentaRechazada("Venta no encontrada.", 404)
+
+    cantidad, ingreso = borrada.cantidad, float(borrada.ingreso)
+    vendidas = func.coalesce(_producto.c.vendidas_dia, 0)
+    valor = func.coalesce(_producto.c.valor_vendido_dia, 0)
+    # Los contadores del día solo cuentan ventas de su día: anular una venta vieja no los toca
+    del_dia = _producto.c.fecha == borrada.dia
+
+    fila = db.session.execute(
+        update(_producto)
+        .where(_producto.c.id == borrada.producto_id)
+        .values(
+            unidades_restantes=_producto.c.unidades_restantes + cantidad,
+            vendidas_dia=case((~del_dia, _producto.c.vendidas_dia), (vendidas > cantidad, vendidas - cantidad), else_=0),
+            valor_vendido_dia=case((~del_dia, _producto.c.valor_vendido_dia), (valor > ingreso, valor - ingreso), else_=0.0),
+        )
+        .returning(
+            _producto.c.nombre,
+            _producto.c.unidades_restantes,
+        )
+    ).first()
+
+    registrar_venta_diaria(borrada.producto_id, borrada.dia, -cantidad, -ingreso)
+    sumar_en(Liquidacion, ["fecha"], [{"fecha": borrada.dia, "entrada": -ingreso, "caja": -ingreso}])
+    _registrar_caja(borrada.dia, ventas=-ingreso)
+    _sumar_totales(-cantidad, -ingreso)
+
+    resultado = {
+        "producto_id": borrada.producto_id,
+        "nombre": fila.nombre,
+        "cantidad": cantidad,
+        "ingreso": ingreso,
+        "dia": borrada.dia,
+        "stock": fila.unidades_restantes,
+    }
+    _con_contadores_del_dia([resultado], local_date())
+    return resultado
+
+
+# ======================================================
+# 📡 SINCRONIZACIÓN DE VENTAS OFFLINE (NDJSON)
+# ======================================================
+SINCRONIZACION_LOTE = 500                      # Líneas por transacción
+SINCRONIZACION_TTL = timedelta(days=30)        # Cuánto se recuerda cada clave de línea
+RUTA_SINCRONIZACION = "/sincronizar_ventas"
+PREFIJO_CLAVE_LINEA = "sync:"                  # Espacio propio, separado de las Idempotency-Key HTTP
+
+
+def _clave_guardada(clave: str) -> str:
+    """Clave con la que se guarda una línea en ClaveIdempotencia."""
+    return PREFIJO_CLAVE_LINEA + clave
+
+
+def calcular_ingreso(cantidad, valor_unitario, interes) -> float:
+    """Mismo redondeo que ingreso_sql(), pero en Python."""
+    bruto = cantidad * float(valor_unitario or 0) * (1 + float(interes or 0) / 100.0)
+    return float(
+        Decimal(repr(bruto))
+        .quantize(Decimal("0.000001"), rounding=ROUND_HALF_UP)
+        .quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    )
+
+
+def _parsear_linea(texto: str, ahora) -> dict:
+    """Valida una línea NDJSON. Lanza VentaRechazada si no sirve."""
+    try:
+        dato = json.loads(texto)
+    except ValueError:
+        raise VentaRechazada("JSON inválido.")
+    if not isinstance(dato, dict):
+        raise VentaRechazada("Se esperaba un objeto JSON.")
+
+    if dato.get("producto_id") is None and not dato.get("codigo"):
+        raise VentaRechazada("Falta producto_id o codigo.")
+    try:
+        cantidad = int(float(str(dato.get("cantidad", "0")).replace(",", ".")))
+        producto_id = int(dato["producto_id"]) if dato.get("producto_id") is not None else None
+    except (TypeError, ValueError):
+        raise VentaRechazada("Línea de venta inválida.")
+    if cantidad <= 0:
+        raise VentaRechazada("Cantidad inválida.")
+
+    fecha = ahora
+    if dato.get("fecha"):
+        try:
+            fecha = datetime.fromisoformat(str(dato["fecha"]))
+        except ValueError:
+            raise VentaRechazada("Fecha inválida.")
+        # Sin zona → hora local de Chile (la que muestra la caja)
+        fecha = fecha.replace(tzinfo=CHILE_TZ) if fecha.tzinfo is None else fecha.astimezone(CHILE_TZ)
+        if fecha > ahora + timedelta(minutes=5):
+            raise VentaRechazada("Fecha en el futuro.")
+
+    clave = str(dato["clave"]).strip()[:100 - len(PREFIJO_CLAVE_LINEA)] if dato.get("clave") else None
+    return {
+        "producto_id": producto_id,
+        "codigo": str(dato["codigo"]).strip() if dato.get("codigo") else None,
+        "cantidad": cantidad,
+        "fecha": fecha,
+        "clave": clave,
+    }
+
+
+def _por_producto(valores: dict, defecto):
+    """CASE producto.id WHEN ... THEN ... (o el valor por defecto si no hay ninguno)."""
+    if not valores:
+        return literal(defecto)
+    return case(valores, value=_producto.c.id, else_=defecto)
+
+
+def _aplicar_lote_offline(pendientes: list) -> list:
+    """
+    Aplica un bloque de líneas ya parseadas en la transacción actual:
+      - 1 SELECT (con bloqueo de filas) para resolver códigos y leer stock/precio,
+      - validación línea por línea en Python con el stock acumulado,
+      - 1 UPDATE con CASE para el stock, 1 INSERT masivo de ventas,
+      - upserts agrupados por (producto, día) y uno por día afectado.
+    Devuelve el resultado de cada línea (en el mismo orden).
+    """
+    resultados = [None] * len(pendientes)
+
+    # 🔑 Líneas ya aplicadas en una sincronización anterior (también las
+    #    guardadas sin prefijo antes de separar los espacios de claves)
+    claves = {l["clave"] for _, l in pendientes if l["clave"]}
+    vistas = set()
+    if claves:
+        guardadas = {_clave_guardada(c): c for c in claves}
+        vistas = {
+            guardadas.get(c, c) for (c,) in db.session.query(ClaveIdempotencia.clave)
+            .filter(ClaveIdempotencia.clave.in_(guardadas.keys() | claves),
+                    ClaveIdempotencia.ruta == RUTA_SINCRONIZACION)
+        }
+
+    ids = {l["producto_id"] for _, l in pendientes if l["producto_id"] is not None}
+    codigos = {l["codigo"] for _, l in pendientes if l["producto_id"] is None}
+    productos = (
+        db.session.query(
+            Producto.id, Producto.codigo, Producto.unidades_restantes,
+            Producto.valor_unitario, Producto.interes,
+        )
+        .filter(or_(Producto.id.in_(ids), Producto.codigo.in_(codigos)))
+        .with_for_update()
+        .all()
+    )
+    por_id = {p.id: p for p in productos}
+    id_por_codigo = {p.codigo: p.id for p in productos}
+    stock = {p.id: p.unidades_restantes or 0 for p in productos}
+
+    hoy = local_date()
+    cierre = ultimo_dia_cerrado()
+    aceptadas = []
+    for i, (n, linea) in enumerate(pendientes):
+        if linea["clave"] in vistas:
+            resultados[i] = {"linea": n, "ok": True, "duplicada": True, "clave": linea["clave"]}
+            continue
+        if cierre and linea["fecha"].date() <= cierre:
+            resultados[i] = {"linea": n, "ok": False, "error": "El día ya está cerrado."}
+            continue
+        pid = linea["producto_id"] if linea["producto_id"] is not None else id_por_codigo.get(linea["codigo"])
+        if pid not in por_id:
+            resultados[i] = {"linea": n, "ok": False, "error": "Producto no encontrado."}
+            continue
+        if stock[pid] < linea["cantidad"]:
+            resultados[i] = {"linea": n, "ok": False, "error": "No hay suficiente stock.", "stock": stock[pid]}
+            continue
+
+        stock[pid] -= linea["cantidad"]
+        p = por_id[pid]
+        ingreso = calcular_ingreso(linea["cantidad"], p.valor_unitario, p.interes)
+        aceptadas.append((i, n, pid, linea, ingreso))
+        if linea["clave"]:
+            vistas.add(linea["clave"])  # La misma clave repetida dentro del lote
+
+    if not aceptadas:
+        return resultados
+
+    # 📦 Stock y contadores de hoy: un solo UPDATE para todos los productos
+    descontar, unidades_hoy, valor_hoy = {}, {}, {}
+    for _, _, pid, linea, ingreso in aceptadas:
+        descontar[pid] = descontar.get(pid, 0) + linea["cantidad"]
+        if linea["fecha"].date() == hoy:
+            unidades_hoy[pid] = unidades_hoy.get(pid, 0) + linea["cantidad"]
+            valor_hoy[pid] = round(valor_hoy.get(pid, 0.0) + ingreso, 2)
+
+    cantidad = case(descontar, value=_producto.c.id)
+    actualizados = db.session.execute(
+        update(_producto)
+        .where(_producto.c.id.in_(descontar), _producto.c.unidades_restantes >= cantidad)
+        .values(
+            unidades_restantes=_producto.c.unidades_restantes - cantidad,
+            vendidas_dia=func.coalesce(_producto.c.vendidas_dia, 0) + _por_producto(unidades_hoy, 0),
+            valor_vendido_dia=func.coalesce(_producto.c.valor_vendido_dia, 0) + _por_producto(valor_hoy, 0.0),
+        )
+    ).rowcount
+    if actualizados != len(descontar):
+        raise VentaRechazada("El stock cambió durante la sincronización; reintenta el lote.", 409)
+
+    venta_ids = db.session.execute(
+        _venta.insert().returning(_venta.c.id, sort_by_parameter_order=True),
+        [
+            {"producto_id": pid, "cantidad": linea["cantidad"], "ingreso": ingreso, "fecha": linea["fecha"]}
+            for _, _, pid, linea, ingreso in aceptadas
+        ],
+    ).scalars().all()
+
+    # 📆 Totales agrupados por (producto, día) y por día
+    por_producto_dia, por_dia = {}, {}
+    for _, _, pid, linea, ingreso in aceptadas:
+        dia = linea["fecha"].date()
+        u, v = por_producto_dia.get((pid, dia), (0, 0.0))
+        por_producto_dia[(pid, dia)] = (u + linea["cantidad"], round(v + ingreso, 2))
+        por_dia[dia] = round(por_dia.get(dia, 0.0) + ingreso, 2)
+
+    registrar_ventas_diarias([
+        {"producto_id": pid, "dia": dia, "unidades": u, "ingreso": v}
+        for (pid, dia), (u, v) in por_producto_dia.items()
+    ])
+    sumar_en(Liquidacion, ["fecha"], [
+        {"fecha": dia, "entrada": total, "caja": total} for dia, total in por_dia.items()
+    ])
+    for dia in sorted(por_dia):
+        _registrar_caja(dia, ventas=por_dia[dia])
+    _sumar_totales(sum(linea["cantidad"] for _, _, _, linea, _ in aceptadas), sum(por_dia.values()))
+
+    # 🔑 Recordar las claves aplicadas para que un reenvío no duplique
+    expira = hora_actual() + SINCRONIZACION_TTL
+    filas_clave = []
+    for (i, n, pid, linea, ingreso), venta_id in zip(aceptadas, venta_ids):
+        resultados[i] = {
+            "linea": n, "ok": True, "venta_id": venta_id, "producto_id": pid,
+            "cantidad": linea["cantidad"], "monto": ingreso,
+        }
+        if linea["clave"]:
+            resultados[i]["clave"] = linea["clave"]
+            filas_clave.append({
+                "clave": _clave_guardada(linea["clave"]), "ruta": RUTA_SINCRONIZACION, "status": 200,
+                "respuesta": json.dumps(resultados[i]), "tipo_contenido": "application/json",
+                "expira": expira,
+            })
+    if filas_clave:
+        db.session.execute(ClaveIdempotencia.__table__.insert(), filas_clave)
+
+    return resultados
+
+
+def sincronizar_ndjson(flujo, tamano_lote: int = SINCRONIZACION_LOTE):
+    """
+    Lee un flujo NDJSON de ventas registradas sin conexión y las aplica en
+    transacciones de `tamano_lote` líneas. Genera un resultado por línea.
+    Cada línea: {"producto_id" | "codigo", "cantidad", "fecha" (ISO), "clave" (opcional)}.
+    """
+    def procesar(bloque):
+        ahora = hora_actual()
+        resultados, pendientes = {}, []
+        for n, texto in bloque:
+            try:
+                pendientes.append((n, _parsear_linea(texto, ahora)))
+            except VentaRechazada as e:
+                resultados[n] = {"linea": n, "ok": False, "error": e.mensaje}
+
+        if pendientes:
+            try:
+                for r in _aplicar_lote_offline(pendientes):
+                    resultados[r["linea"]] = r
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                mensaje = e.mensaje if isinstance(e, VentaRechazada) else f"Error al aplicar el lote: {e}"
+                for n, _ in pendientes:
+                    resultados[n] = {"linea": n, "ok": False, "error": mensaje}
+
+        for n, _ in bloque:
+            yield resultados[n]
+
+    bloque = []
+    for n, texto in enumerate(flujo, start=1):
+        if isinstance(texto, bytes):
+            texto = texto.decode("utf-8", errors="replace")
+        if not texto.strip():
+            continue
+        bloque.append((n, texto))
+        if len(bloque) >= tamano_lote:
+            yield from procesar(bloque)
+            bloque = []
+    if bloque:
+        yield from procesar(bloque)
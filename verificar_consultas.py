@@ -0,0 +1,110 @@
+# ======================================================
+# verificar_consultas.py — Consultas por vista: GET sin escrituras 🇨🇱
+# y con un máximo de consultas fijo (un N+1 lo hace crecer con los datos)
+# Uso: python verificar_consultas.py   (usa una base SQLite temporal)
+# ======================================================
+import os
+import sys
+import tempfile
+
+# ⚠️ Nunca apuntar a Neon: se fuerza una base local desechable
+_tmp = tempfile.mkdtemp(prefix="aitana_verif_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'verificacion.db')}"
+
+from app import app, db
+from helpers import CONTADORES_PANEL, ORDEN_PASO
+from instrumentacion import contar_consultas, max_consultas
+from modelos import EstadoSistema, Producto
+from tiempo import local_date
+
+print("===============================================")
+print("   🔎 VERIFICACIÓN DE CONSULTAS POR VISTA")
+print("===============================================")
+
+PRODUCTOS = 50
+
+# Máximo de consultas por vista con la base ya en uso (contadores del panel
+# sembrados por el cambio de día). No depende de cuántos productos o ventas haya.
+hoy = local_date().isoformat()
+PRESUPUESTOS = {
+    "/": 3,
+    "/dashboard": 2,
+    "/liquidacion": 4,
+    "/entrada_inventario": 2,
+    "/historial_inventario": 1,
+    f"/detalle_ventas/{hoy}": 1,
+    f"/detalle_salida/{hoy}": 1,
+    "/detalle_ventas_producto/1": 2,
+    "/graficos/ventas_diarias": 1,
+    "/graficos/ventas_mensuales": 1,
+}
+
+fallos = 0
+
+with app.app_context():
+    for i in range(PRODUCTOS):
+        db.session.add(Producto(
+            codigo=f"{i:06d}",
+            nombre=f"PRODUCTO {i}",
+            orden=(i + 1) * ORDEN_PASO,
+            valor_unitario=100 + i,
+            interes=20,
+            stock_inicial=10,
+            unidades_restantes=10,
+            fecha=local_date(),
+        ))
+    db.session.commit()
+
+# Los requests van fuera del app_context de arriba: cada uno con su propia
+# sesión, como en producción (lo que una vista no guarde se pierde)
+cliente = app.test_client()
+with cliente.session_transaction() as sesion:
+    sesion["usuario"] = app.config["VALID_USER"]
+
+cliente.get("/")  # Calentamiento: el primer request del día hace el cambio de día
+for i in range(1, PRODUCTOS + 1):  # Día con movimientos en todos los productos
+    cliente.post(f"/vender/{i}", json={"cantidad": 1})
+    cliente.post("/entrada_inventario", data={"codigo": f"{i - 1:06d}", "cantidad": "2"})
+cliente.post("/caja_salida", data={"monto": "5", "descripcion": "VERIFICACION"})
+
+for ruta, maximo in PRESUPUESTOS.items():
+    try:
+        with max_consultas(maximo, f"GET {ruta}") as contador:
+            respuesta = cliente.get(ruta)
+    except AssertionError as e:
+        print(f"\n🔹 GET {ruta}\n  ❌ {e}")
+        fallos += 1
+        continue
+
+    verbos = [s.lstrip().split(None, 1)[0].upper() for s in contador.sentencias]
+    escrituras = [v for v in verbos if v in ("INSERT", "UPDATE", "DELETE")]
+    print(f"\n🔹 GET {ruta}  → HTTP {respuesta.status_code} | {contador.total}/{maximo} consultas | {len(escrituras)} escrituras")
+    if respuesta.status_code != 200 or escrituras:
+        print(f"  ❌ Se esperaban HTTP 200 y 0 escrituras: {escrituras}")
+        fallos += 1
+    else:
+        print("  ✅ Vista de solo lectura dentro del presupuesto.")
+
+# Sin contadores sembrados (base recién migrada): las vistas los calculan sin guardarlos
+with app.app_context():
+    EstadoSistema.query.filter(EstadoSistema.clave.in_(list(CONTADORES_PANEL))).delete(synchronize_session=False)
+    db.session.commit()
+for ruta in ("/dashboard", "/liquidacion"):
+    with contar_consultas() as contador:
+        respuesta = cliente.get(ruta)
+    verbos = [s.lstrip().split(None, 1)[0].upper() for s in contador.sentencias]
+    escrituras = [v for v in verbos if v in ("INSERT", "UPDATE", "DELETE")]
+    print(f"\n🔹 GET {ruta} sin contadores → HTTP {respuesta.status_code} | {len(escrituras)} escrituras")
+    if respuesta.status_code != 200 or escrituras:
+        print(f"  ❌ Se esperaban HTTP 200 y 0 escrituras: {escrituras}")
+        fallos += 1
+    else:
+        print("  ✅ Calcula los contadores sin escribir.")
+
+print("===============================================")
+if fallos:
+    print(f"  ❌ Verificación con {fallos} fallo(s).")
+    print("===============================================")
+    sys.exit(1)
+print("  ✅ Verificación completada correctamente.")
+print("===============================================")
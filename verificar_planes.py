@@ -0,0 +1,166 @@
+# ======================================================
+# verificar_planes.py — Planes de las consultas calientes (EXPLAIN) 🇨🇱
+# Uso: python verificar_planes.py   (usa una base SQLite temporal)
+#      PLANES_DATABASE_URL=postgresql://localhost/aitana_planes python verificar_planes.py
+# Siembra ventas, movimientos e historial, ejecuta las vistas y funciones
+# que filtran por rangos de días, captura su SQL real y falla si algún plan
+# recorre completa venta, movimiento_caja o historial_inventario.
+# ======================================================
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# ⚠️ Nunca apuntar a Neon: base local desechable (SQLite o un PostgreSQL local vacío)
+_url = os.environ.get("PLANES_DATABASE_URL", "")
+if "neon.tech" in _url:
+    sys.exit("❌ PLANES_DATABASE_URL debe ser una base local desechable, no Neon.")
+if not _url:
+    _tmp = tempfile.mkdtemp(prefix="aitana_planes_")
+    _url = f"sqlite:///{os.path.join(_tmp, 'planes.db')}"
+os.environ["DATABASE_URL"] = _url
+
+from sqlalchemy import event
+
+from app import app, db
+from helpers import ORDEN_PASO, caja_base_del_dia, calcular_entradas, calcular_salidas
+from modelos import HistorialInventario, MovimientoCaja, Producto, Venta
+from tiempo import local_date
+
+PRODUCTOS = 200
+VENTAS = 60000
+MOVIMIENTOS = 6000
+HISTORIAL = 12000
+DIAS = 120
+
+TABLAS = re.compile(r"\b(venta|movimiento_caja|historial_inventario)\b")
+POSTGRES = _url.startswith("postgres")
+# SQLite: "SCAN venta" (con o sin índice) = recorrido completo; PostgreSQL: "Seq Scan on venta"
+RECORRIDO = re.compile(
+    r"Seq Scan on (venta|movimiento_caja|historial_inventario)\b" if POSTGRES
+    else r"^SCAN (venta|movimiento_caja|historial_inventario)\b"
+)
+
+print("===============================================")
+print("   🧭 VERIFICACIÓN DE PLANES DE CONSULTA")
+print("===============================================")
+
+hoy = local_date()
+inicio = datetime.combine(hoy - timedelta(days=DIAS - 1), datetime.min.time())
+
+with app.app_context():
+    db.session.execute(Producto.__table__.insert(), [{
+        "codigo": f"P{i:05d}", "nombre": f"PLAN {i}", "orden": i * ORDEN_PASO, "valor_unitario": 1000,
+        "interes": 20, "stock_inicial": 10 ** 6, "unidades_restantes": 10 ** 6, "fecha": hoy,
+    } for i in range(1, PRODUCTOS + 1)])
+    db.session.execute(Venta.__table__.insert(), [{
+        "producto_id": n % PRODUCTOS + 1, "cantidad": 1, "ingreso": 1200,
+        "fecha": inicio + timedelta(minutes=n * DIAS * 1440 // VENTAS),
+    } for n in range(VENTAS)])
+    db.session.execute(MovimientoCaja.__table__.insert(), [{
+        "tipo": ("entrada", "salida", "gasto")[n % 3], "monto": 500, "descripcion": "PLAN",
+        "fecha": inicio + timedelta(minutes=n * DIAS * 1440 // MOVIMIENTOS),
+    } for n in range(MOVIMIENTOS)])
+    db.session.execute(HistorialInventario.__table__.insert(), [{
+        "producto_id": n % PRODUCTOS + 1, "cantidad": 5, "valor_total": 5000,
+        "fecha": inicio + timedelta(minutes=n * DIAS * 1440 // HISTORIAL),
+    } for n in range(HISTORIAL)])
+    db.session.commit()
+    motor = db.engine
+    with motor.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")  # Estadísticas reales: el planificador elige como en producción
+    print(f"\n  📦 {VENTAS} ventas, {MOVIMIENTOS} movimientos, {HISTORIAL} entradas de inventario ({DIAS} días)")
+
+cliente = app.test_client()
+with cliente.session_transaction() as sesion:
+    sesion["usuario"] = app.config["VALID_USER"]
+cliente.get("/")  # Calentamiento: el primer request del día hace el cambio de día
+
+semana = hoy - timedelta(days=6)
+
+
+def _historial_siguiente():
+    primera = cliente.get("/historial_inventario").get_json()
+    return cliente.get(f"/historial_inventario?cursor={primera['siguiente']}")
+
+
+def _caja_del_dia():
+    with app.app_context():
+        calcular_entradas(hoy)
+        calcular_salidas(hoy)
+        caja_base_del_dia(hoy)
+
+
+CASOS = [
+    ("Detalle de ventas del día", lambda: cliente.get(f"/detalle_ventas/{hoy}")),
+    ("Ventas de hoy de un producto", lambda: cliente.get("/detalle_ventas_producto/1")),
+    ("Salidas del día", lambda: cliente.get(f"/detalle_salida/{hoy}")),
+    ("Entradas, salidas y caja base del día", _caja_del_dia),
+    ("Liquidación por rango (7 días)",
+     lambda: cliente.post("/liquidacion", data={"fecha_inicio": semana, "fecha_fin": hoy})),
+    ("Exportar ventas del día", lambda: cliente.get(f"/exportar/ventas?desde={hoy}&hasta={hoy}")),
+    ("Exportar movimientos de la semana", lambda: cliente.get(f"/exportar/movimientos?desde={semana}&hasta={hoy}")),
+    ("Historial de inventario (primera página)", lambda: cliente.get("/entrada_inventario")),
+    ("Historial de inventario (página siguiente)", _historial_siguiente),
+    ("Historial de un producto", lambda: cliente.get("/historial_inventario?producto_id=1")),
+]
+
+capturadas = []
+
+
+def _capturar(conn, cursor, statement, parameters, context, executemany):
+    if not executemany and statement.lstrip().upper().startswith("SELECT") and TABLAS.search(statement):
+        capturadas.append((statement, parameters))
+
+
+def _plan(conn, statement, parameters) -> list:
+    if POSTGRES:
+        return [f[0] for f in conn.exec_driver_sql("EXPLAIN " + statement, parameters)]
+    return [f[-1] for f in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+
+
+fallos = 0
+
+for nombre, ejecutar in CASOS:
+    capturadas.clear()
+    event.listen(motor, "before_cursor_execute", _capturar)
+    try:
+        respuesta = ejecutar()
+        if respuesta is not None:
+            respuesta.get_data()  # Las exportaciones consultan mientras se transmiten
+    finally:
+        event.remove(motor, "before_cursor_execute", _capturar)
+
+    print(f"\n🔹 {nombre} → {len(capturadas)} consultas sobre tablas grandes")
+    if respuesta is not None and respuesta.status_code != 200:
+        print(f"  ❌ HTTP {respuesta.status_code}")
+        fallos += 1
+        continue
+    if not capturadas:
+        print("  ❌ No se capturó ninguna consulta (¿cambió la vista?)")
+        fallos += 1
+        continue
+
+    with motor.connect() as conn:
+        if POSTGRES:
+            conn.exec_driver_sql("SET enable_seqscan = off")  # Solo queda Seq Scan si ningún índice sirve
+        for statement, parameters in capturadas:
+            plan = _plan(conn, statement, parameters)
+            recorridos = [linea for linea in plan if RECORRIDO.search(linea.strip())]
+            consulta = " ".join(statement.split())[:100]
+            if recorridos:
+                fallos += 1
+                print(f"  ❌ {consulta}…")
+                for linea in plan:
+                    print(f"       {linea}")
+            else:
+                print(f"  ✅ {consulta}…")
+
+print("===============================================")
+if fallos:
+    print(f"  ❌ Verificación con {fallos} fallo(s).")
+    print("===============================================")
+    sys.exit(1)
+print("  ✅ Ninguna consulta caliente recorre tablas completas.")
+print("===============================================")